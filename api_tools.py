@@ -0,0 +1,92 @@
+"""
+Client side of our FastAPI tool endpoints, shared by the Retell and Vapi collectors.
+
+Requests go through http_client's pooled clients. Every tool has a blocking method and an
+`*_async` variant that takes the same arguments. Subclasses must set `self.api_url`.
+"""
+
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+import http_client
+
+
+class ApiToolsMixin:
+    api_url: str
+
+    def _post_api(self, path: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            resp = http_client.request("POST", f"{self.api_url}{path}", json=payload)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            logger.error(f"{action} failed: {e}")
+            return {"status": 500, "error": str(e)}
+
+    async def _post_api_async(self, path: str, action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            resp = await http_client.arequest("POST", f"{self.api_url}{path}", json=payload)
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            logger.error(f"{action} failed: {e}")
+            return {"status": 500, "error": str(e)}
+
+    def lookup_patient(self, resident_id: Optional[str] = None, resident_name: Optional[str] = None,
+                       date_of_birth: Optional[str] = None, contact_name: Optional[str] = None) -> Dict[str, Any]:
+        return self._post_api("/lookup_patient", "Patient lookup", {
+            "resident_id": resident_id, "resident_name": resident_name,
+            "date_of_birth": date_of_birth, "contact_name": contact_name
+        })
+
+    async def lookup_patient_async(self, resident_id: Optional[str] = None, resident_name: Optional[str] = None,
+                                   date_of_birth: Optional[str] = None, contact_name: Optional[str] = None) -> Dict[str, Any]:
+        return await self._post_api_async("/lookup_patient", "Patient lookup", {
+            "resident_id": resident_id, "resident_name": resident_name,
+            "date_of_birth": date_of_birth, "contact_name": contact_name
+        })
+
+    def process_payment(self, resident_id: str, payment_method: str, amount: float) -> Dict[str, Any]:
+        return self._post_api("/process_payment", "Payment processing", {
+            "resident_id": resident_id, "payment_method": payment_method, "amount": amount
+        })
+
+    async def process_payment_async(self, resident_id: str, payment_method: str, amount: float) -> Dict[str, Any]:
+        return await self._post_api_async("/process_payment", "Payment processing", {
+            "resident_id": resident_id, "payment_method": payment_method, "amount": amount
+        })
+
+    def schedule_reminder_call(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
+        return self._post_api("/reminder_call", "Reminder call scheduling", {
+            "contact_name": contact_name, "resident_id": resident_id, "schedule_time": schedule_time
+        })
+
+    async def schedule_reminder_call_async(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
+        return await self._post_api_async("/reminder_call", "Reminder call scheduling", {
+            "contact_name": contact_name, "resident_id": resident_id, "schedule_time": schedule_time
+        })
+
+    def reschedule_call(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
+        return self._post_api("/reschedule_call", "Call rescheduling", {
+            "contact_name": contact_name, "resident_id": resident_id, "schedule_time": schedule_time
+        })
+
+    async def reschedule_call_async(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
+        return await self._post_api_async("/reschedule_call", "Call rescheduling", {
+            "contact_name": contact_name, "resident_id": resident_id, "schedule_time": schedule_time
+        })
+
+    def send_sms(self, contact_number: str, contact_name: str, resident_name: str,
+                 balance: float, due_date: str, facility_name: str) -> Dict[str, Any]:
+        return self._post_api("/send_sms", "SMS sending", {
+            "contact_number": contact_number, "contact_name": contact_name, "resident_name": resident_name,
+            "balance": balance, "due_date": due_date, "facility_name": facility_name
+        })
+
+    async def send_sms_async(self, contact_number: str, contact_name: str, resident_name: str,
+                             balance: float, due_date: str, facility_name: str) -> Dict[str, Any]:
+        return await self._post_api_async("/send_sms", "SMS sending", {
+            "contact_number": contact_number, "contact_name": contact_name, "resident_name": resident_name,
+            "balance": balance, "due_date": due_date, "facility_name": facility_name
+        })
@@ -1,41 +1,77 @@
 import os
+import asyncio
 import datetime
-from typing import Optional, Dict, Any
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 import json
+from collections import Counter
 from loguru import logger
-import psycopg2
-from psycopg2.extras import RealDictCursor
 from twilio.rest import Client
 from dotenv import load_dotenv
-import pytz
-from fuzzywuzzy import fuzz
-from dateutil.parser import parse
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+import repository
+import patient_cache
+import pronunciation
+import patient_search
+import caller_index
+import name_matching
+import call_completion
+import rate_limiter
+from call_log_writer import call_log_writer, ensure_call_id_index
+import webhook_queue
+import webhook_dedup
+import sms_dispatch
+import sms_jobs
+import tcpa
+import http_client
+from google_calendar import calendar
+from calendar_availability import (availability, calendar_sync, confirm_slot, ensure_hold_table, freebusy, is_free_in,
+                                   release_slot, reserve_slot)
+from dob_normalizer import normalize_dob, dob_matches
 
 load_dotenv()
 
-app = FastAPI(title="Debt Collection API")
-
-# Database configuration
-db_config = {
-    "dbname": os.getenv("DB_NAME", "debt_collection"),
-    "user": os.getenv("DB_USER", "user"),
-    "password": os.getenv("DB_PASSWORD", "password"),
-    "host": os.getenv("DB_HOST", "localhost")
-}
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await repository.open_pool()
+    await patient_search.ensure_search_indexes()
+    await webhook_dedup.ensure_event_key_index()
+    await ensure_hold_table()
+    await ensure_call_id_index()
+    await http_client.open_async_client()
+    listener = asyncio.create_task(patient_cache.listen_for_invalidations())
+    index_build = asyncio.create_task(caller_index.rebuild())
+    calendar_refresh = asyncio.create_task(calendar.refresh_loop())
+    calendar_sync_task = asyncio.create_task(calendar_sync.run())
+    webhook_consumers = webhook_queue.WebhookConsumerPool(webhook_queue.outbox, handle_webhook_batch)
+    app.state.webhook_consumers = webhook_consumers
+    webhook_consumers.start()
+    sms_senders = sms_jobs.SmsJobRunner(sms_jobs.store, sms_dispatcher, record_sms_reminder)
+    app.state.sms_senders = sms_senders
+    sms_senders.start()
+    yield
+    await sms_senders.stop()
+    await webhook_consumers.stop()
+    calendar_sync_task.cancel()
+    calendar_refresh.cancel()
+    index_build.cancel()
+    listener.cancel()
+    await asyncio.to_thread(call_log_writer.close)
+    sms_dispatcher.close()
+    await http_client.aclose()
+    await asyncio.to_thread(http_client.close)
+    await repository.close_pool()
+
+app = FastAPI(title="Debt Collection API", lifespan=lifespan)
 
 # Twilio configuration
 twilio_client = Client(os.getenv("TWILIO_SID"), os.getenv("TWILIO_AUTH_TOKEN"))
 twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
+sms_dispatcher = sms_dispatch.SmsDispatcher(twilio_client, twilio_phone)
 
-# Google Calendar configuration
-SCOPES = ['https://www.googleapis.com/auth/calendar']
-GOOGLE_CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+MAX_LOOKUP_LIMIT = 50
 
 # Models for request validation
 class PatientLookupRequest(BaseModel):
@@ -43,6 +79,7 @@ class PatientLookupRequest(BaseModel):
     resident_name: Optional[str] = None
     date_of_birth: Optional[str] = None
     contact_name: Optional[str] = None
+    limit: conint(ge=1, le=MAX_LOOKUP_LIMIT) = 5
 
 class PaymentRequest(BaseModel):
     resident_id: str
@@ -61,12 +98,17 @@ class SMSRequest(BaseModel):
     balance: float
     due_date: str
     facility_name: str
+    resident_id: Optional[str] = None
+
+class BulkSMSRequest(BaseModel):
+    recipients: List[SMSRequest]
 
 class WebhookRequest(BaseModel):
     event_type: str
     call_id: str
     data: Dict[str, Any]
     metadata: dict
+    event_id: Optional[str] = None
 
 class ConversationNotesRequest(BaseModel):
     call_id: str
@@ -81,6 +123,15 @@ class AppointmentRequest(BaseModel):
     duration_minutes: int
     title: str
     description: Optional[str] = None
+    call_id: Optional[str] = None
+
+class BulkAppointmentRequest(BaseModel):
+    appointments: List[AppointmentRequest]
+
+class FreeSlotsRequest(BaseModel):
+    count: int = 3
+    duration_minutes: int = 30
+    after: Optional[str] = None
 
 class VerifyToolRequest(BaseModel):
     resident_fname: str
@@ -89,34 +140,21 @@ class VerifyToolRequest(BaseModel):
     resident_id: str
     metadata: Optional[Dict[str, Any]] = None
 
-def is_tcp_compliant(phone: str) -> bool:
-    now = datetime.datetime.now(pytz.timezone("US/Mountain"))
-    hour = now.hour
-    return 8 <= hour < 21
+def require_tcpa_window(phone: Optional[str], at: Optional[datetime.datetime] = None):
+    """403 unless `phone` may be contacted at `at` (default now) in its local calling window."""
+    if not tcpa.is_allowed(phone, at):
+        next_time = tcpa.next_allowed_time(phone, at)
+        raise HTTPException(status_code=403, detail=f"Not TCPA compliant; next allowed time {next_time.isoformat()}")
 
-def connect_db():
-    try:
-        conn = psycopg2.connect(**db_config, cursor_factory=RealDictCursor)
-        return conn
-    except Exception as e:
-        logger.error(f"Database connection failed: {e}")
-        raise HTTPException(status_code=500, detail="Database connection error")
+async def contact_numbers(resident_ids: List[str]) -> Dict[str, Optional[str]]:
+    rows = await repository.get_patients_by_ids(resident_ids)
+    return {str(row["resident_id"]): row["contact_number"] for row in rows}
 
-def get_google_calendar_service():
+def parse_schedule_time(value: str) -> Optional[datetime.datetime]:
     try:
-        creds = None
-        if os.path.exists('token.json'):
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-        if not creds or not creds.valid:
-            flow = InstalledAppFlow.from_client_secrets_file(GOOGLE_CREDENTIALS_FILE, SCOPES)
-            creds = flow.run_local_server(port=0)
-            with open('token.json', 'w') as token:
-                token.write(creds.to_json())
-        return build('calendar', 'v3', credentials=creds)
-    except Exception as e:
-        logger.error(f"Google Calendar authentication failed: {e}")
-        raise HTTPException(status_code=500, detail="Google Calendar authentication error")
-
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
 
 from fastapi import Request
 # @app.post("/verify_resident_tool_debug")
@@ -140,13 +178,29 @@ from fastapi import Request
 #     }
     
     
-import inflect
-from dateutil.parser import parse
 class RetellFunctionRequest(BaseModel):
     name: str
     call: dict
     args: dict
 
+class BatchVerifyRecord(BaseModel):
+    resident_id: str
+    resident_fname: str
+    resident_lname: str
+    resident_dob: Optional[str] = None
+
+class BatchVerifyRequest(BaseModel):
+    records: List[BatchVerifyRecord]
+
+def verification_message(name_match: bool, dob_match: bool) -> str:
+    if name_match and dob_match:
+        return "Verification successful"
+    return (
+        f"Verification failed: {'Incorrect name' if not name_match else ''}"
+        f"{' and ' if not name_match and not dob_match else ''}"
+        f"{'Incorrect DOB' if not dob_match else ''}"
+    )
+
 @app.post("/verify_resident_tool")
 async def verify_resident_tool(request: RetellFunctionRequest):
     """
@@ -172,17 +226,7 @@ async def verify_resident_tool(request: RetellFunctionRequest):
             )
 
         # Query patients table
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT resident_first_name, resident_last_name, date_of_birth,
-                   balance, due_date, payer_desc, facility_name
-            FROM patients
-            WHERE resident_id = %s
-        """, (resident_id,))
-        patient = cur.fetchone()
-        cur.close()
-        conn.close()
+        patient = await patient_cache.get_patient_for_verification(resident_id)
 
         if not patient:
             logger.error(f"Resident not found: {resident_id}")
@@ -191,7 +235,7 @@ async def verify_resident_tool(request: RetellFunctionRequest):
         # Normalize stored and provided inputs
         stored_fname = (patient["resident_first_name"] or "").strip().lower()
         stored_lname = (patient["resident_last_name"] or "").strip().lower()
-        stored_dob = patient["date_of_birth"].strftime("%Y-%m-%d") if patient["date_of_birth"] else ""
+        stored_dob = patient["date_of_birth"]
         provided_fname = resident_fname.lower()
         provided_lname = resident_lname.lower()
         provided_dob = resident_dob
@@ -201,29 +245,15 @@ async def verify_resident_tool(request: RetellFunctionRequest):
         logger.info(f"Against stored: fname='{stored_fname}', lname='{stored_lname}', dob='{stored_dob}'")
 
         # Fuzzy matching for names (threshold: 75%)
-        fname_score = fuzz.ratio(provided_fname, stored_fname) if stored_fname and provided_fname else 0
-        lname_score = fuzz.ratio(provided_lname, stored_lname) if stored_lname and provided_lname else 0
-        name_match = (fname_score >= 75 or lname_score >= 75) or (not stored_fname and not stored_lname)
+        fname_score = name_matching.name_score(provided_fname, stored_fname)
+        lname_score = name_matching.name_score(provided_lname, stored_lname)
+        name_match = name_matching.is_name_match(fname_score, lname_score, stored_fname, stored_lname)
 
-        # Parse and compare DOB
-        dob_match = False
-        try:
-            provided_dob_date = parse(provided_dob, fuzzy=True).date()
-            stored_dob_date = parse(stored_dob, fuzzy=True).date() if stored_dob else None
-            dob_match = provided_dob_date == stored_dob_date if stored_dob_date else False
-        except ValueError as e:
-            logger.warning(f"Invalid DOB format - provided: {provided_dob}, stored: {stored_dob}. Error: {str(e)}")
-            dob_match = False
-
-        # Convert due_date to humanized pronunciation
-        p = inflect.engine()
-        due_date_pronunciation = ""
-        if patient["due_date"]:
-            due_date = patient["due_date"]
-            day = p.number_to_words(p.ordinal(due_date.day)).replace("-", " ")
-            month = due_date.strftime("%B")
-            year = p.number_to_words(due_date.year).replace("-", " ")
-            due_date_pronunciation = f"{day} {month}, {year}"
+        # Parse and compare DOB against the stored date directly
+        provided_dob_date = normalize_dob(provided_dob)
+        if provided_dob_date is None:
+            logger.warning(f"Invalid DOB format - provided: {provided_dob}")
+        dob_match = bool(stored_dob) and provided_dob_date == stored_dob
 
         # Prepare verification result
         is_verified = name_match and dob_match
@@ -231,11 +261,7 @@ async def verify_resident_tool(request: RetellFunctionRequest):
             "status": 200,
             "resident_id": resident_id,
             "is_verified": is_verified,
-            "message": "Verification successful" if is_verified else (
-                f"Verification failed: {'Incorrect name' if not name_match else ''}"
-                f"{' and ' if not name_match and not dob_match else ''}"
-                f"{'Incorrect DOB' if not dob_match else ''}"
-            ),
+            "message": verification_message(name_match, dob_match),
             "details": {
                 "fname_score": fname_score,
                 "lname_score": lname_score,
@@ -248,7 +274,8 @@ async def verify_resident_tool(request: RetellFunctionRequest):
             result.update({
                 "due_balance": float(patient["balance"]),
                 "due_date": patient["due_date"].strftime("%Y-%m-%d") if patient["due_date"] else "",
-                "due_date_pronunciation": due_date_pronunciation,
+                "due_date_pronunciation": patient["due_date_pronunciation"],
+                "due_balance_pronunciation": patient["balance_pronunciation"],
                 "payer_desc": patient["payer_desc"] or "",
                 "facility_name": patient["facility_name"] or ""
             })
@@ -266,22 +293,135 @@ async def verify_resident_tool(request: RetellFunctionRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
+def suggest_resident_ids(records: List[BatchVerifyRecord], results: List[Dict[str, Any]], rows: List[Dict[str, Any]]):
+    """
+    Add a "suggested_resident_id" to results whose name does not fit their resident_id: the batch
+    resident whose full name scores highest against the provided one (a swapped or mistyped id).
+    """
+    mismatched = [i for i, result in enumerate(results) if not result["found"] or not result["details"]["name_match"]]
+    if not mismatched or not rows:
+        return
+    matrix = name_matching.score_matrix(
+        [f"{records[i].resident_fname} {records[i].resident_lname}" for i in mismatched],
+        [f"{row['resident_first_name'] or ''} {row['resident_last_name'] or ''}" for row in rows]
+    )
+    for query, column in enumerate(matrix.argmax(axis=1)):
+        i, row, score = mismatched[query], rows[column], int(matrix[query, column])
+        if score >= name_matching.NAME_MATCH_THRESHOLD and str(row["resident_id"]) != records[i].resident_id:
+            results[i]["suggested_resident_id"] = str(row["resident_id"])
+            results[i]["suggested_score"] = score
+
+@app.post("/verify_residents_batch")
+async def verify_residents_batch(request: BatchVerifyRequest):
+    """
+    Bulk name/DOB verification for pre-campaign data-quality sweeps.
+    Stored rows are fetched in one query and names are scored as whole arrays with rapidfuzz.
+    Records without a DOB cannot be fully verified: a name match alone is reported as "partial".
+    Records whose name does not fit their resident_id (or whose id is unknown) are scored against every
+    resident in the batch as one score matrix, and the best match is suggested as the likely intended id.
+    """
+    records = request.records
+    if not records:
+        return {"status": 200, "results": []}
+
+    try:
+        rows = await repository.get_patients_by_ids(list({r.resident_id for r in records}))
+        rows_by_id = {str(row["resident_id"]): row for row in rows}
+        stored = [rows_by_id.get(r.resident_id) for r in records]
+
+        stored_fnames = [row["resident_first_name"] if row else None for row in stored]
+        stored_lnames = [row["resident_last_name"] if row else None for row in stored]
+        fname_scores = name_matching.score_pairs([r.resident_fname for r in records], stored_fnames)
+        lname_scores = name_matching.score_pairs([r.resident_lname for r in records], stored_lnames)
+
+        results = []
+        for i, (record, row) in enumerate(zip(records, stored)):
+            if row is None:
+                results.append({"resident_id": record.resident_id, "found": False, "is_verified": False,
+                                "verification": "failed", "message": "Resident not found"})
+                continue
+            fname_score, lname_score = int(fname_scores[i]), int(lname_scores[i])
+            name_match = name_matching.is_name_match(fname_score, lname_score, stored_fnames[i], stored_lnames[i])
+            dob_match = None
+            if record.resident_dob:
+                dob_match = dob_matches(record.resident_dob, row["date_of_birth"])
+            if name_match and dob_match:
+                verification, message = "verified", verification_message(True, True)
+            elif name_match and dob_match is None:
+                verification, message = "partial", "Name matched; no DOB provided"
+            else:
+                verification, message = "failed", verification_message(name_match, dob_match is not False)
+            results.append({
+                "resident_id": record.resident_id,
+                "found": True,
+                "is_verified": verification == "verified",
+                "verification": verification,
+                "message": message,
+                "details": {"fname_score": fname_score, "lname_score": lname_score, "dob_match": dob_match,
+                            "name_match": name_match}
+            })
+
+        suggest_resident_ids(records, results, rows)
+        counts = Counter(result["verification"] for result in results)
+        return {
+            "status": 200,
+            "verified": counts["verified"],
+            "partial": counts["partial"],
+            "failed": counts["failed"],
+            "results": results
+        }
+    except Exception as e:
+        logger.error(f"Batch verification failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.post("/identify_caller")
+async def identify_caller(request: RetellFunctionRequest):
+    """
+    Handle Retell custom function call to identify an inbound caller from a spoken name and optional DOB.
+    Answers from the in-memory caller index; falls back to the trigram DB search while the index is loading.
+    """
+    logger.info(f"Received Retell function call: {request.name}")
+    args = request.args
+    caller_name = args.get("caller_name", "").strip()
+    caller_dob = args.get("caller_dob", "").strip()
+    if not caller_name:
+        raise HTTPException(status_code=400, detail="Missing required field: caller_name")
+    try:
+        limit = int(args.get("limit", 5))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid limit")
+    limit = max(1, min(limit, MAX_LOOKUP_LIMIT))
+
+    date_of_birth = None
+    if caller_dob:
+        date_of_birth = normalize_dob(caller_dob)
+        if date_of_birth is None:
+            raise HTTPException(status_code=400, detail="Invalid caller_dob")
+
+    try:
+        if caller_index.caller_index.ready:
+            matches = caller_index.search(caller_name, date_of_birth=date_of_birth, limit=limit)
+            rows = await repository.get_patients_by_ids([m["resident_id"] for m in matches]) if matches else []
+            rows_by_id = {str(row["resident_id"]): row for row in rows}
+            candidates = [{**rows_by_id[m["resident_id"]], "score": m["score"]} for m in matches if m["resident_id"] in rows_by_id]
+        else:
+            candidates = await patient_search.search_patients(resident_name=caller_name, date_of_birth=date_of_birth, limit=limit)
+
+        return {
+            "status": 200,
+            "is_identified": bool(candidates),
+            "candidates": [format_lookup_candidate(patient) for patient in candidates]
+        }
+    except Exception as e:
+        logger.error(f"Caller identification failed: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.post("/save_conversation_notes")
-def save_conversation_notes(request: ConversationNotesRequest):
+async def save_conversation_notes(request: ConversationNotesRequest):
     try:
         phi_data = encrypt_data(json.dumps({"resident_id": request.resident_id}))
         
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO conversation_notes (call_id, resident_id, notes, phi_data, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING note_id
-        """, (request.call_id, request.resident_id, request.notes, phi_data, datetime.datetime.now()))
-        note_id = cur.fetchone()["note_id"]
-        conn.commit()
-        cur.close()
-        conn.close()
+        note_id = await repository.insert_conversation_note(request.call_id, request.resident_id, request.notes, phi_data)
 
         logger.info(f"Conversation notes saved: note_id={note_id} for call_id={request.call_id}")
         return {"status": 200, "note_id": note_id, "message": "Notes saved successfully"}
@@ -292,58 +432,34 @@ def save_conversation_notes(request: ConversationNotesRequest):
 @app.post("/schedule_appointment")
 async def schedule_appointment(request: AppointmentRequest):
     try:
-        start_time = datetime.datetime.fromisoformat(request.start_time)
+        try:
+            start_time = datetime.datetime.fromisoformat(request.start_time)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid start_time")
         end_time = start_time + datetime.timedelta(minutes=request.duration_minutes)
 
-        if not is_tcp_compliant(request.contact_email):
-            raise HTTPException(status_code=403, detail="Not TCPA compliant")
-
-        service = get_google_calendar_service()
-        events_result = service.events().list(
-            calendarId='primary',
-            timeMin=start_time.isoformat(),
-            timeMax=end_time.isoformat(),
-            singleEvents=True,
-            orderBy='startTime'
-        ).execute()
-        events = events_result.get('items', [])
-        if events:
+        numbers = await contact_numbers([request.resident_id])
+        require_tcpa_window(numbers.get(request.resident_id), start_time)
+
+        await wait_for_calendar_sync()
+        hold_id = await reserve_slot(start_time, end_time)
+        if hold_id is None:
             raise HTTPException(status_code=409, detail="Time slot not available")
 
-        event = {
-            'summary': request.title,
-            'description': request.description or f"Follow-up call for resident {request.resident_id}",
-            'start': {
-                'dateTime': start_time.isoformat(),
-                'timeZone': 'US/Mountain'
-            },
-            'end': {
-                'dateTime': end_time.isoformat(),
-                'timeZone': 'US/Mountain'
-            },
-            'attendees': [{'email': request.contact_email}],
-            'reminders': {
-                'useDefault': False,
-                'overrides': [
-                    {'method': 'email', 'minutes': 24 * 60},
-                    {'method': 'email', 'minutes': 60}
-                ]
-            }
-        }
-        event = service.events().insert(calendarId='primary', body=event, sendUpdates='all').execute()
-
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO appointments (call_id, resident_id, google_event_id, start_time, end_time, title, description, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING appointment_id
-        """, (request.call_id, request.resident_id, event['id'], start_time, end_time, 
-              request.title, request.description, datetime.datetime.now()))
-        appointment_id = cur.fetchone()["appointment_id"]
-        conn.commit()
-        cur.close()
-        conn.close()
+        event = appointment_event(request, start_time, end_time)
+        try:
+            event = await calendar.run(
+                lambda service, body=event: service.events().insert(calendarId='primary', body=body, sendUpdates='all').execute()
+            )
+        except Exception:
+            await release_slot(hold_id)
+            raise
+        await confirm_slot(hold_id, event)
+
+        appointment_id = await repository.insert_appointment(
+            request.call_id, request.resident_id, event['id'], start_time, end_time,
+            request.title, request.description
+        )
 
         logger.info(f"Appointment scheduled: appointment_id={appointment_id}, google_event_id={event['id']}")
         return {
@@ -361,43 +477,196 @@ async def schedule_appointment(request: AppointmentRequest):
         logger.error(f"Appointment scheduling failed: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+def appointment_event(request: AppointmentRequest, start_time: datetime.datetime,
+                      end_time: datetime.datetime) -> Dict[str, Any]:
+    return {
+        'summary': request.title,
+        'description': request.description or f"Follow-up call for resident {request.resident_id}",
+        'start': {
+            'dateTime': start_time.isoformat(),
+            'timeZone': 'US/Mountain'
+        },
+        'end': {
+            'dateTime': end_time.isoformat(),
+            'timeZone': 'US/Mountain'
+        },
+        'attendees': [{'email': request.contact_email}],
+        'reminders': {
+            'useDefault': False,
+            'overrides': [
+                {'method': 'email', 'minutes': 24 * 60},
+                {'method': 'email', 'minutes': 60}
+            ]
+        }
+    }
+
+@app.post("/schedule_appointments_bulk")
+async def schedule_appointments_bulk(request: BulkAppointmentRequest):
+    """
+    Book many appointments per calendar round trip: one freebusy query for the whole range, a hold per
+    slot (reserve_slot), batched events().insert calls, then one transaction for the appointments rows.
+    Records with an unparseable start_time come back as "invalid" without failing the batch.
+    """
+    await wait_for_calendar_sync()
+    appointments = request.appointments
+    if not appointments:
+        return {"status": 200, "scheduled": 0, "results": []}
+    results, slots = [], []
+    for appointment in appointments:
+        result = {"resident_id": appointment.resident_id, "start_time": appointment.start_time,
+                  "status": "conflict", "appointment_id": None, "google_event_id": None, "error": None}
+        results.append(result)
+        try:
+            start_time = datetime.datetime.fromisoformat(appointment.start_time)
+        except ValueError:
+            # Rejected like a 400 for this record only; the rest of the batch goes ahead
+            result.update(status="invalid", error="Invalid start_time")
+            slots.append(None)
+            continue
+        slots.append((start_time, start_time + datetime.timedelta(minutes=appointment.duration_minutes)))
+    valid = [slot for slot in slots if slot]
+    if not valid:
+        return {"status": 200, "scheduled": 0, "counts": dict(Counter(r["status"] for r in results)), "results": results}
+
+    pending, holds = [], []
+    try:
+        busy_starts, busy_ends = await freebusy(min(start for start, _ in valid), max(end for _, end in valid))
+        numbers = await contact_numbers(list({appointment.resident_id for appointment in appointments}))
+
+        for index, (appointment, slot) in enumerate(zip(appointments, slots)):
+            if slot is None:
+                continue
+            start_time, end_time = slot
+            if not tcpa.is_allowed(numbers.get(appointment.resident_id), start_time):
+                results[index]["status"] = "not_compliant"
+                continue
+            if not is_free_in(busy_starts, busy_ends, start_time, end_time):
+                continue
+            hold_id = await reserve_slot(start_time, end_time)  # also rejects overlaps within this batch
+            if hold_id is None:
+                continue
+            holds.append(hold_id)
+            pending.append((index, appointment, start_time, end_time, hold_id))
+
+        responses = await calendar.run_batch(lambda service: [
+            service.events().insert(calendarId='primary', body=appointment_event(appointment, start_time, end_time),
+                                    sendUpdates='all')
+            for _, appointment, start_time, end_time, _ in pending
+        ])
+    except Exception as e:
+        for hold_id in holds:
+            await release_slot(hold_id)
+        logger.error(f"Bulk appointment scheduling failed: {e}")
+        raise HTTPException(status_code=500, detail="Failed to schedule appointments")
+
+    booked = []
+    for (index, appointment, start_time, end_time, hold_id), (event, error) in zip(pending, responses):
+        if error is not None:
+            await release_slot(hold_id)
+            results[index].update(status="failed", error=str(error))
+            logger.error(f"Google Calendar insert failed for resident {appointment.resident_id}: {error}")
+            continue
+        await confirm_slot(hold_id, event)
+        results[index].update(status="scheduled", google_event_id=event['id'])
+        booked.append((index, (appointment.call_id, appointment.resident_id, event['id'], start_time, end_time,
+                               appointment.title, appointment.description)))
+
+    try:
+        appointment_ids = await repository.insert_appointments([row for _, row in booked])
+    except Exception as e:
+        logger.error(f"Failed to record {len(booked)} appointments "
+                     f"(google_event_ids={[row[2] for _, row in booked]}): {e}")
+        raise HTTPException(status_code=500, detail="Appointments created but not recorded")
+    for (index, _), appointment_id in zip(booked, appointment_ids):
+        results[index]["appointment_id"] = appointment_id
+
+    logger.info(f"Bulk scheduling: {len(booked)}/{len(appointments)} appointments booked")
+    return {
+        "status": 200,
+        "scheduled": len(booked),
+        "counts": dict(Counter(result["status"] for result in results)),
+        "results": results
+    }
+
+async def wait_for_calendar_sync(timeout: float = 10.0):
+    try:
+        await asyncio.wait_for(calendar_sync.ready.wait(), timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Calendar availability not loaded yet")
+
+def spoken_slot(slot: datetime.datetime) -> str:
+    # Portable 12-hour clock (strftime's %-I is glibc-only)
+    return f"{slot.strftime('%A, %B %d')} at {slot.hour % 12 or 12}:{slot.minute:02d} {'AM' if slot.hour < 12 else 'PM'}"
+
+@app.post("/next_free_slots")
+async def next_free_slots(request: FreeSlotsRequest):
+    try:
+        await wait_for_calendar_sync()
+        try:
+            after = datetime.datetime.fromisoformat(request.after) if request.after else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid after")
+        slots = availability.next_free_slots(min(request.count, 20), request.duration_minutes, after)
+        return {
+            "status": 200,
+            "slots": [
+                {"start_time": slot.isoformat(), "spoken": spoken_slot(slot)}
+                for slot in slots
+            ]
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error(f"Free slot lookup failed: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+def format_lookup_candidate(patient: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "resident_id": patient["resident_id"],
+        "resident_name": f"{patient['resident_first_name']} {patient['resident_last_name']}",
+        "contact_name": f"{patient['contact_first_name']} {patient['contact_last_name']}",
+        "contact_number": patient["contact_number"],
+        "balance": float(patient["balance"]),
+        "balance_pronunciation": pronunciation.spoken_amount(patient["balance"]),
+        "due_date": patient["due_date"].strftime("%B %d") if patient["due_date"] else "",
+        "due_date_pronunciation": pronunciation.spoken_date(patient["due_date"]),
+        "facility_name": patient["facility_name"],
+        "facility_code": patient["facility_code"],
+        "payer_desc": patient["payer_desc"],
+        "score": round(float(patient["score"]), 4)
+    }
+
 @app.post("/lookup_patient")
 async def lookup_patient(request: PatientLookupRequest):
     if not (request.resident_id or request.resident_name or request.date_of_birth or request.contact_name):
         raise HTTPException(status_code=400, detail="At least one of resident_id, resident_name, date_of_birth, or contact_name required")
 
+    date_of_birth = None
+    if request.date_of_birth:
+        date_of_birth = normalize_dob(request.date_of_birth)
+        if date_of_birth is None:
+            raise HTTPException(status_code=400, detail="Invalid date_of_birth")
+
     try:
-        conn = connect_db()
-        cur = conn.cursor()
-        query = """
-            SELECT resident_id, resident_first_name, resident_last_name, contact_first_name, contact_last_name, contact_number,
-                   balance, due_date, facility_name, facility_code, payer_desc
-            FROM patients
-            WHERE (%(resident_id)s IS NULL OR resident_id = %(resident_id)s)
-            AND (%(resident_name)s IS NULL OR (resident_first_name || ' ' || resident_last_name) ILIKE %(resident_name)s)
-            AND (%(date_of_birth)s IS NULL OR date_of_birth = %(date_of_birth)s)
-            AND (%(contact_name)s IS NULL OR (contact_first_name || ' ' || contact_last_name) ILIKE %(contact_name)s)
-        """
-        cur.execute(query, request.dict())
-        patient = cur.fetchone()
-        cur.close()
-        conn.close()
+        candidates = await patient_search.search_patients(
+            resident_id=request.resident_id,
+            resident_name=request.resident_name,
+            date_of_birth=date_of_birth,
+            contact_name=request.contact_name,
+            limit=request.limit
+        )
 
-        if not patient:
+        if not candidates:
             raise HTTPException(status_code=404, detail="Patient not found")
-        
+
+        # Best match stays at the top level for existing callers; all ranked matches are in "candidates"
         return {
             "status": 200,
-            "resident_id": patient["resident_id"],
-            "resident_name": f"{patient['resident_first_name']} {patient['resident_last_name']}",
-            "contact_name": f"{patient['contact_first_name']} {patient['contact_last_name']}",
-            "contact_number": patient["contact_number"],
-            "balance": float(patient["balance"]),
-            "due_date": patient["due_date"].strftime("%B %d"),
-            "facility_name": patient["facility_name"],
-            "facility_code": patient["facility_code"],
-            "payer_desc": patient["payer_desc"]
+            **format_lookup_candidate(candidates[0]),
+            "candidates": [format_lookup_candidate(patient) for patient in candidates]
         }
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Patient lookup failed: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -408,17 +677,7 @@ async def process_payment(request: PaymentRequest):
         raise HTTPException(status_code=400, detail="Invalid payment method")
 
     try:
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO payments (resident_id, amount, payment_method, payment_date)
-            VALUES (%s, %s, %s, %s)
-            RETURNING payment_id
-        """, (request.resident_id, request.amount, request.payment_method, datetime.datetime.now()))
-        payment_id = cur.fetchone()["payment_id"]
-        conn.commit()
-        cur.close()
-        conn.close()
+        payment_id = await repository.insert_payment(request.resident_id, request.amount, request.payment_method)
 
         logger.info(f"Payment processed: {payment_id} for resident {request.resident_id}")
         return {"status": 200, "payment_id": payment_id, "message": f"Payment of {request.amount} processed via {request.payment_method}"}
@@ -429,23 +688,17 @@ async def process_payment(request: PaymentRequest):
 @app.post("/reminder_call")
 async def schedule_reminder_call(request: ScheduleRequest):
     try:
-        if not is_tcp_compliant(request.resident_id):
-            raise HTTPException(status_code=403, detail="Not TCPA compliant")
-        
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO reminders (resident_id, contact_name, reminder_type, schedule_time, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING reminder_id
-        """, (request.resident_id, request.contact_name, "call", request.schedule_time, datetime.datetime.now()))
-        reminder_id = cur.fetchone()["reminder_id"]
-        conn.commit()
-        cur.close()
-        conn.close()
+        numbers = await contact_numbers([request.resident_id])
+        require_tcpa_window(numbers.get(request.resident_id), parse_schedule_time(request.schedule_time))
+
+        reminder_id = await repository.insert_reminder(
+            request.contact_name, "call", request.schedule_time, resident_id=request.resident_id
+        )
 
         logger.info(f"Reminder call scheduled: {reminder_id} for {request.contact_name}")
         return {"status": 200, "reminder_id": reminder_id, "message": f"Reminder call scheduled for {request.schedule_time}"}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Reminder call scheduling failed: {e}")
         raise HTTPException(status_code=500, detail="Scheduling error")
@@ -453,107 +706,180 @@ async def schedule_reminder_call(request: ScheduleRequest):
 @app.post("/reschedule_call")
 async def reschedule_call(request: ScheduleRequest):
     try:
-        if not is_tcp_compliant(request.resident_id):
-            raise HTTPException(status_code=403, detail="Not TCPA compliant")
-        
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO reminders (resident_id, contact_name, reminder_type, schedule_time, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING reminder_id
-        """, (request.resident_id, request.contact_name, "call", request.schedule_time, datetime.datetime.now()))
-        reminder_id = cur.fetchone()["reminder_id"]
-        conn.commit()
-        cur.close()
-        conn.close()
+        numbers = await contact_numbers([request.resident_id])
+        require_tcpa_window(numbers.get(request.resident_id), parse_schedule_time(request.schedule_time))
+
+        reminder_id = await repository.insert_reminder(
+            request.contact_name, "call", request.schedule_time, resident_id=request.resident_id
+        )
 
         logger.info(f"Call rescheduled: {reminder_id} for {request.contact_name}")
         return {"status": 200, "reminder_id": reminder_id, "message": f"Call rescheduled for {request.schedule_time}"}
+    except HTTPException as e:
+        raise e
     except Exception as e:
         logger.error(f"Call rescheduling failed: {e}")
         raise HTTPException(status_code=500, detail="Scheduling error")
 
+def sms_body(request: SMSRequest) -> str:
+    message = f"Healthcare Corporation reminds you about {request.resident_name}'s ${request.balance} due by {request.due_date} at {request.facility_name}. Visit www.hcprovo.com."
+    return f"{message} This is an attempt to collect a debt."
+
 @app.post("/send_sms")
 async def send_sms(request: SMSRequest):
-    if not is_tcp_compliant(request.contact_number):
-        raise HTTPException(status_code=403, detail="Not TCPA compliant")
+    require_tcpa_window(request.contact_number)
+
+    result = await sms_dispatcher.send(sms_dispatch.SmsMessage(request.contact_number, sms_body(request)))
+    if result["status"] == "rate_limited":
+        raise HTTPException(status_code=429, detail="SMS rate limit exceeded")
+    if result["status"] != "sent":
+        raise HTTPException(status_code=500, detail="SMS sending error")
 
-    message = f"Healthcare Corporation reminds you about {request.resident_name}'s ${request.balance} due by {request.due_date} at {request.facility_name}. Visit www.hcprovo.com."
     try:
-        msg = twilio_client.messages.create(
-            body=f"{message} This is an attempt to collect a debt.",
-            from_=twilio_phone,
-            to=request.contact_number
-        )
-        logger.info(f"SMS sent to {request.contact_number}, ID: {msg.sid}")
-
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO reminders (contact_name, reminder_type, schedule_time, created_at)
-            VALUES (%s, %s, %s, %s)
-            RETURNING reminder_id
-        """, (request.contact_name, "sms", datetime.datetime.now().isoformat(), datetime.datetime.now()))
-        reminder_id = cur.fetchone()["reminder_id"]
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        return {"status": 200, "message_id": msg.sid, "message": "SMS sent successfully"}
+        await repository.insert_reminder(request.contact_name, "sms", datetime.datetime.now().isoformat(), request.resident_id)
     except Exception as e:
-        logger.error(f"SMS failed: {e}")
-        raise HTTPException(status_code=500, detail="SMS sending error")
+        # The message is already out; report the bookkeeping failure rather than failing the request
+        logger.error(f"SMS {result['message_id']} sent but its reminder was not recorded: {e}")
+    return {"status": 200, "message_id": result["message_id"], "message": "SMS sent successfully"}
+
+@app.post("/send_sms_bulk", status_code=202)
+async def send_sms_bulk(request: BulkSMSRequest):
+    """
+    Queue many SMS as one background job and return its id; the job drains at the Twilio rate limit and
+    its per-recipient status is available from /sms_jobs/{job_id}. Recipients outside their TCPA calling
+    window are recorded as blocked up front (and re-checked when their message is sent).
+    """
+    allowed = tcpa.allowed_mask([recipient.contact_number for recipient in request.recipients])
+    messages = [
+        sms_dispatch.SmsMessage(recipient.contact_number, sms_body(recipient), recipient.contact_name, recipient.resident_id)
+        for recipient in request.recipients
+    ]
+    blocked = {index: "Not TCPA compliant" for index in range(len(messages)) if not allowed[index]}
+    try:
+        job_id = await asyncio.to_thread(sms_jobs.store.create, messages, blocked)
+    except Exception as e:
+        logger.error(f"Failed to queue bulk SMS job: {e}")
+        raise HTTPException(status_code=500, detail="SMS job not accepted")
+
+    logger.info(f"Queued bulk SMS job {job_id}: {len(messages) - len(blocked)} messages ({len(blocked)} blocked)")
+    return {"status": 202, "job_id": job_id, "queued": len(messages) - len(blocked), "blocked": len(blocked)}
+
+@app.get("/sms_jobs/{job_id}")
+async def get_sms_job(job_id: str):
+    job = await asyncio.to_thread(sms_jobs.store.job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="SMS job not found")
+    return job
+
+async def record_sms_reminder(message: sms_dispatch.SmsMessage, message_id: str):
+    await repository.insert_reminder(message.contact_name, "sms", datetime.datetime.now().isoformat(), message.resident_id)
 
 @app.post("/webhook")
 async def webhook(request: WebhookRequest):
-    try:
-        safe_data = {
-            "call_id": request.call_id,
-            "event_type": request.event_type,
-            "timestamp": datetime.datetime.now(),
-            "call_duration": request.data.get("duration"),
-            "call_status": request.data.get("status"),
-            "action_items": request.data.get("actionItems", []),
-            "consent_obtained": request.metadata.get("consent", False) if request.metadata else False
-        }
+    payload = request.dict()
+    payload["event_key"] = webhook_dedup.event_key(request.call_id, request.event_type, request.event_id, payload)
+    return await enqueue_webhook("generic", request.call_id, request.event_type, payload)
+
+@app.post("/webhook/retell")
+async def retell_webhook(payload: Dict[str, Any]):
+    event = call_completion.parse_retell_event(payload)
+    if not event or not event["call_id"]:
+        return {"status": 200}
+    event["event_key"] = webhook_dedup.event_key(event["call_id"], event["event_type"], event["event_id"], payload)
+    return await enqueue_webhook("retell", event["call_id"], event["event_type"], event)
 
-        phi_data = None
-        if request.metadata and request.metadata.get("store_phi"):
-            phi_data = encrypt_data(json.dumps({
-                "resident_id": request.metadata.get("resident_id"),
-                "contact_info": request.metadata.get("contact_number")
-            }))
-
-        conn = connect_db()
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO call_events (
-                call_id, 
-                event_type, 
-                safe_data,
-                phi_data,
-                received_at
-            ) VALUES (%s, %s, %s, %s, %s)
-        """, (
-            request.call_id,
-            request.event_type,
-            json.dumps(safe_data),
-            phi_data,
-            datetime.datetime.now()
-        ))
-        conn.commit()
-        cur.close()
-        conn.close()
-
-        if request.event_type == "call.ended":
-            await process_call_outcome(safe_data)
-
-        logger.info(f"Processed {request.event_type} for call {request.call_id}")
+@app.post("/webhook/vapi")
+async def vapi_webhook(payload: Dict[str, Any]):
+    event = call_completion.parse_vapi_event(payload)
+    if not event or not event["call_id"]:
         return {"status": 200}
+    event["event_key"] = webhook_dedup.event_key(event["call_id"], event["event_type"], event["event_id"], payload)
+    return await enqueue_webhook("vapi", event["call_id"], event["event_type"], event)
+
+async def enqueue_webhook(source: str, call_id: str, event_type: str, payload: Dict[str, Any]):
+    key = payload["event_key"]
+    if not webhook_dedup.seen_keys.add(key):
+        logger.info(f"Ignoring duplicate {source} webhook {key}")
+        return {"status": 200, "duplicate": True}
+    try:
+        await asyncio.to_thread(webhook_queue.outbox.enqueue, source, call_id, event_type, payload)
     except Exception as e:
-        logger.error(f"Webhook error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        webhook_dedup.seen_keys.discard(key)
+        logger.error(f"Failed to enqueue {source} webhook for call {call_id}: {e}")
+        raise HTTPException(status_code=500, detail="Webhook not accepted")
+    return {"status": 200}
+
+def webhook_event_data(payload: Dict[str, Any], received_at: datetime.datetime):
+    """Split a generic webhook into the call_events safe_data dict and encrypted PHI (or None)."""
+    data, metadata = payload["data"], payload.get("metadata") or {}
+    safe_data = {
+        "call_id": payload["call_id"],
+        "event_type": payload["event_type"],
+        "timestamp": received_at,
+        "call_duration": data.get("duration"),
+        "call_status": data.get("status"),
+        "action_items": data.get("actionItems", []),
+        "consent_obtained": metadata.get("consent", False)
+    }
+    phi_data = None
+    if metadata.get("store_phi"):
+        phi_data = encrypt_data(json.dumps({
+            "resident_id": metadata.get("resident_id"),
+            "contact_info": metadata.get("contact_number")
+        }))
+    return safe_data, phi_data
+
+async def handle_webhook_batch(events: List[webhook_queue.QueuedEvent]):
+    """
+    Webhook consumer: one multi-row call_events insert for the batch, then completion/outcome processing
+    for the events that were new (redeliveries hit the event_key unique index and are skipped).
+    Only the provider's end-of-call event completes a call; Retell's later call_analyzed is just stored.
+    """
+    rows, outcomes, completions = [], [], []
+    for event in events:
+        received_at = datetime.datetime.fromtimestamp(event.received_at)
+        key = event.payload.get("event_key")
+        if event.source == "generic":
+            safe_data, phi_data = webhook_event_data(event.payload, received_at)
+            rows.append((event.call_id, event.event_type, json.dumps(safe_data, default=str), phi_data, received_at, key))
+            if event.event_type == "call.ended":
+                outcomes.append((key, safe_data))
+        else:
+            details = {"provider": event.source, **event.payload["details"]}
+            rows.append((event.call_id, event.event_type, json.dumps(details, default=str), None, received_at, key))
+            if event.event_type in call_completion.COMPLETION_EVENT_TYPES:
+                completions.append((key, event.payload))
+
+    inserted = await repository.insert_call_events(rows)
+    # Each worker dedups in its own memory, so a provider retry accepted by another worker can sit in the
+    # same batch as the original: the key is inserted once, and only its first copy is processed
+    unclaimed = set(inserted)
+
+    def claim(key: Optional[str]) -> bool:
+        if key is None:
+            return True
+        if key in unclaimed:
+            unclaimed.discard(key)
+            return True
+        return False
+
+    completions = [completion for key, completion in completions if claim(key)]
+    outcomes = [outcome for key, outcome in outcomes if claim(key)]
+    duplicates = sum(row[5] is not None for row in rows) - len(inserted)
+    # The call_events rows are committed, so a redelivery would be skipped: handle failures per event, not by retrying
+    for completion in completions:
+        try:
+            await call_completion.record_call_completion(completion["call_id"], completion["phone"], completion["cost"],
+                                                         completion["transcript"], status=completion["status"])
+        except Exception as e:
+            logger.error(f"Failed to record completion of call {completion['call_id']}: {e}")
+        outcomes.append(completion)
+    for outcome in outcomes:
+        try:
+            await process_call_outcome(outcome)
+        except Exception as e:
+            logger.error(f"Outcome processing failed for call {outcome['call_id']}: {e}")
+    logger.info(f"Processed {len(events)} webhook events ({duplicates} duplicates skipped)")
 
 def encrypt_data(data: str) -> str:
     encrypted_data = data
@@ -565,13 +891,7 @@ async def process_call_outcome(data: dict):
 @app.get("/call_logs")
 async def get_call_logs():
     try:
-        conn = psycopg2.connect(**db_config, cursor_factory=RealDictCursor)
-        cur = conn.cursor()
-        cur.execute("SELECT call_id, phone, type, cost, created_at FROM call_logs ORDER BY created_at DESC LIMIT 100")
-        logs = cur.fetchall()
-        cur.close()
-        conn.close()
-        return logs
+        return await repository.recent_call_logs()
     except Exception as e:
         logger.error(f"Failed to fetch call logs: {e}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -579,13 +899,7 @@ async def get_call_logs():
 @app.get("/reminders")
 async def get_reminders():
     try:
-        conn = psycopg2.connect(**db_config, cursor_factory=RealDictCursor)
-        cur = conn.cursor()
-        cur.execute("SELECT reminder_id, contact_name, reminder_type, schedule_time, created_at FROM reminders ORDER BY created_at DESC LIMIT 100")
-        reminders = cur.fetchall()
-        cur.close()
-        conn.close()
-        return reminders
+        return await repository.recent_reminders()
     except Exception as e:
         logger.error(f"Failed to fetch reminders: {e}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -593,17 +907,39 @@ async def get_reminders():
 @app.get("/payments")
 async def get_payments():
     try:
-        conn = psycopg2.connect(**db_config, cursor_factory=RealDictCursor)
-        cur = conn.cursor()
-        cur.execute("SELECT payment_id, resident_id, amount, payment_method, payment_date FROM payments ORDER BY payment_date DESC LIMIT 100")
-        payments = cur.fetchall()
-        cur.close()
-        conn.close()
-        return payments
+        return await repository.recent_payments()
     except Exception as e:
         logger.error(f"Failed to fetch payments: {e}")
         raise HTTPException(status_code=500, detail="Database error")
 
+@app.get("/db_pool_stats")
+async def get_db_pool_stats():
+    return repository.pool_stats()
+
+@app.get("/patient_cache_stats")
+async def get_patient_cache_stats():
+    return patient_cache.verification_cache.stats()
+
+@app.get("/call_log_writer_stats")
+async def get_call_log_writer_stats():
+    return call_log_writer.stats()
+
+@app.get("/webhook_queue_stats")
+async def get_webhook_queue_stats():
+    return {**await app.state.webhook_consumers.stats(), "dedup": webhook_dedup.seen_keys.stats()}
+
+@app.get("/sms_job_stats")
+async def get_sms_job_stats():
+    return await app.state.sms_senders.stats()
+
+@app.get("/availability_stats")
+async def get_availability_stats():
+    return availability.stats()
+
+@app.get("/rate_limit_stats")
+async def get_rate_limit_stats():
+    return await asyncio.to_thread(rate_limiter.stats)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
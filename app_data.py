@@ -0,0 +1,17 @@
+"""
+Location of the API's persistent local state: the webhook outbox, the call_logs spill file and
+the shared rate-limit buckets.
+
+These files back durability guarantees, so they must not live in a temp directory (often tmpfs,
+or cleaned on reboot). APP_DATA_DIR defaults to data/ next to the code; point it at a persistent
+volume in deployment. Each file can still be overridden by its own env var.
+"""
+
+import os
+
+APP_DATA_DIR = os.getenv("APP_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+
+def data_path(name: str) -> str:
+    os.makedirs(APP_DATA_DIR, exist_ok=True)
+    return os.path.join(APP_DATA_DIR, name)
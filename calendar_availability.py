@@ -0,0 +1,405 @@
+"""
+Local index of busy calendar time, kept in step with Google Calendar by an incremental sync feed.
+
+CalendarSync does one full events().list from CALENDAR_SYNC_LOOKBACK_HOURS ago onward, then polls
+with the returned syncToken so each round only transfers changed events (a 410 from Google
+triggers a fresh full sync); blocks that have ended are pruned. Busy time from calendar events plus
+holds is kept as sorted, disjoint blocks, so is_free() is a binary search, O(log n), and adding or
+removing an event only re-merges the blocks it touches.
+
+Booking is two-phase. reserve_slot() checks and holds a slot before the slow events().insert
+call: first in the local index, then in the appointment_holds table, whose exclusion constraint
+on the slot's time range makes the hold atomic across uvicorn workers. confirm_slot() turns the
+hold into the real event; release_slot() drops it on failure. Holds expire after
+AVAILABILITY_HOLD_TTL, so a crashed request cannot block a slot forever.
+"""
+
+import asyncio
+import bisect
+import datetime
+import heapq
+import os
+import threading
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg
+import pytz
+from googleapiclient.errors import HttpError
+from loguru import logger
+
+import repository
+from db_pool import db_config
+from google_calendar import calendar
+
+CALENDAR_ID = os.getenv("CALENDAR_ID", "primary")
+CALENDAR_TIMEZONE = pytz.timezone(os.getenv("CALENDAR_TIMEZONE", "US/Mountain"))
+CALENDAR_SYNC_INTERVAL = float(os.getenv("CALENDAR_SYNC_INTERVAL", 30))
+AVAILABILITY_HOLD_TTL = float(os.getenv("AVAILABILITY_HOLD_TTL", 120))
+BUSINESS_HOURS = (int(os.getenv("BUSINESS_HOURS_START", 9)), int(os.getenv("BUSINESS_HOURS_END", 17)))
+SLOT_STEP_MINUTES = int(os.getenv("SLOT_STEP_MINUTES", 30))
+SLOT_SEARCH_DAYS = int(os.getenv("SLOT_SEARCH_DAYS", 60))
+CALENDAR_SYNC_LOOKBACK_HOURS = float(os.getenv("CALENDAR_SYNC_LOOKBACK_HOURS", 24))
+# A confirmed booking keeps its database hold until every worker's sync has seen the event
+CONFIRMED_HOLD_TTL = float(os.getenv("CONFIRMED_HOLD_TTL", CALENDAR_SYNC_INTERVAL * 2 + 60))
+
+HOLD_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS appointment_holds (
+        hold_id TEXT PRIMARY KEY,
+        slot TSTZRANGE NOT NULL,
+        expires_at TIMESTAMPTZ NOT NULL,
+        EXCLUDE USING gist (slot WITH &&)
+    )
+    """
+]
+
+Interval = Tuple[datetime.datetime, datetime.datetime]
+
+
+def to_utc(value: datetime.datetime) -> datetime.datetime:
+    """Naive datetimes are calendar-local time (matching the timeZone sent with inserted events)."""
+    if value.tzinfo is None:
+        value = CALENDAR_TIMEZONE.localize(value)
+    return value.astimezone(pytz.utc)
+
+
+def _parse_event_time(value: Dict[str, str]) -> datetime.datetime:
+    if "dateTime" in value:
+        return to_utc(datetime.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")))
+    # All-day event
+    return to_utc(datetime.datetime.combine(datetime.date.fromisoformat(value["date"]), datetime.time()))
+
+
+def merge_intervals(intervals: List[Interval]) -> Tuple[List[datetime.datetime], List[datetime.datetime]]:
+    """Merge intervals into sorted, disjoint blocks, returned as parallel (starts, ends) lists."""
+    starts, ends = [], []
+    for start, end in sorted(intervals):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+        else:
+            starts.append(start)
+            ends.append(end)
+    return starts, ends
+
+
+def is_free_in(starts: List[datetime.datetime], ends: List[datetime.datetime],
+               start: datetime.datetime, end: datetime.datetime) -> bool:
+    """O(log n) check that [start, end) overlaps none of the merged blocks from merge_intervals()."""
+    i = bisect.bisect_right(starts, start) - 1
+    if i >= 0 and ends[i] > start:
+        return False
+    return i + 1 >= len(starts) or starts[i + 1] >= end
+
+
+async def freebusy(start: datetime.datetime, end: datetime.datetime,
+                   calendar_id: str = CALENDAR_ID) -> Tuple[List[datetime.datetime], List[datetime.datetime]]:
+    """Busy blocks between start and end from one freebusy query, merged for is_free_in()."""
+    result = await calendar.run(lambda service: service.freebusy().query(body={
+        "timeMin": to_utc(start).isoformat(),
+        "timeMax": to_utc(end).isoformat(),
+        "items": [{"id": calendar_id}]
+    }).execute())
+    busy = result["calendars"].get(calendar_id, {}).get("busy", [])
+    return merge_intervals([(_parse_event_time({"dateTime": block["start"]}), _parse_event_time({"dateTime": block["end"]}))
+                            for block in busy])
+
+
+def _round_up_to_slot(value: datetime.datetime) -> datetime.datetime:
+    """Round up to the next SLOT_STEP_MINUTES boundary, in calendar-local time."""
+    local = value.astimezone(CALENDAR_TIMEZONE)
+    floor = local.replace(minute=local.minute - local.minute % SLOT_STEP_MINUTES, second=0, microsecond=0)
+    if floor < local:
+        floor = CALENDAR_TIMEZONE.normalize(floor + datetime.timedelta(minutes=SLOT_STEP_MINUTES))
+    return floor
+
+
+def _merge_groups(intervals: Dict[str, Interval]) -> Tuple[List[datetime.datetime], List[datetime.datetime],
+                                                        List[Dict[str, Interval]]]:
+    """Like merge_intervals(), but each block also keeps the keyed intervals it was merged from."""
+    starts, ends, members = [], [], []
+    for key, (start, end) in sorted(intervals.items(), key=lambda item: item[1]):
+        if ends and start <= ends[-1]:
+            ends[-1] = max(ends[-1], end)
+            members[-1][key] = (start, end)
+        else:
+            starts.append(start)
+            ends.append(end)
+            members.append({key: (start, end)})
+    return starts, ends, members
+
+
+class AvailabilityIndex:
+    """
+    Busy time as sorted, disjoint blocks in parallel lists. Each block remembers the intervals
+    (calendar events and holds) it was merged from, so adding or removing one interval only
+    re-merges the blocks it touches: a bisect to find them plus one slice replacement. Holds
+    expire lazily off a heap ordered by expiry.
+    """
+
+    def __init__(self, hold_ttl: float = AVAILABILITY_HOLD_TTL):
+        self.hold_ttl = hold_ttl
+        self._intervals: Dict[str, Interval] = {}  # event id or "hold:<hold id>" -> interval
+        self._holds: Dict[str, datetime.datetime] = {}  # hold id -> expires_at
+        self._hold_expiry: List[Tuple[datetime.datetime, str]] = []
+        self._starts: List[datetime.datetime] = []
+        self._ends: List[datetime.datetime] = []
+        self._members: List[Dict[str, Interval]] = []
+        self._lock = threading.RLock()
+
+    def _add(self, key: str, start: datetime.datetime, end: datetime.datetime):
+        self._remove(key)
+        if end <= start:
+            return
+        self._intervals[key] = (start, end)
+        # Blocks that overlap or touch [start, end) are merged with it
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        members = {key: (start, end)}
+        if lo < hi:
+            start, end = min(start, self._starts[lo]), max(end, self._ends[hi - 1])
+            for block in self._members[lo:hi]:
+                members.update(block)
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+        self._members[lo:hi] = [members]
+
+    def _remove(self, key: str):
+        interval = self._intervals.pop(key, None)
+        if interval is None:
+            return
+        i = bisect.bisect_right(self._starts, interval[0]) - 1
+        members = self._members[i]
+        del members[key]
+        starts, ends, groups = _merge_groups(members)
+        self._starts[i:i + 1] = starts
+        self._ends[i:i + 1] = ends
+        self._members[i:i + 1] = groups
+
+    def _expire_holds(self):
+        now = datetime.datetime.now(pytz.utc)
+        while self._hold_expiry and self._hold_expiry[0][0] <= now:
+            expires_at, hold_id = heapq.heappop(self._hold_expiry)
+            if self._holds.get(hold_id) == expires_at:
+                del self._holds[hold_id]
+                self._remove(f"hold:{hold_id}")
+
+    @staticmethod
+    def _event_interval(event: Dict[str, Any]) -> Optional[Interval]:
+        if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+            return None
+        return _parse_event_time(event["start"]), _parse_event_time(event["end"])
+
+    def apply_events(self, events: List[Dict[str, Any]], replace: bool = False):
+        """Add, move or remove Google Calendar events (as returned by events().list/insert)."""
+        with self._lock:
+            if replace:
+                # Full sync: regroup everything once instead of merging event by event
+                intervals = {key: interval for key, interval in self._intervals.items() if key.startswith("hold:")}
+                for event in events:
+                    interval = self._event_interval(event)
+                    if interval:
+                        intervals[event["id"]] = interval
+                self._intervals = intervals
+                self._starts, self._ends, self._members = _merge_groups(intervals)
+                return
+            for event in events:
+                interval = self._event_interval(event)
+                if interval:
+                    self._add(event["id"], *interval)
+                else:
+                    self._remove(event["id"])
+
+    def prune(self, before: datetime.datetime):
+        """Forget busy blocks that ended before `before`; they can never conflict again."""
+        with self._lock:
+            count = bisect.bisect_left(self._ends, before)
+            for block in self._members[:count]:
+                for key in block:
+                    self._intervals.pop(key, None)
+            del self._starts[:count], self._ends[:count], self._members[:count]
+
+    def is_free(self, start: datetime.datetime, end: datetime.datetime) -> bool:
+        start, end = to_utc(start), to_utc(end)
+        with self._lock:
+            self._expire_holds()
+            return is_free_in(self._starts, self._ends, start, end)
+
+    def reserve(self, start: datetime.datetime, end: datetime.datetime) -> Optional[str]:
+        """Atomically check and hold [start, end) in this index. Returns a hold id, or None if the slot is taken."""
+        start, end = to_utc(start), to_utc(end)
+        with self._lock:
+            self._expire_holds()
+            if not is_free_in(self._starts, self._ends, start, end):
+                return None
+            hold_id = uuid.uuid4().hex
+            expires_at = datetime.datetime.now(pytz.utc) + datetime.timedelta(seconds=self.hold_ttl)
+            self._holds[hold_id] = expires_at
+            heapq.heappush(self._hold_expiry, (expires_at, hold_id))
+            self._add(f"hold:{hold_id}", start, end)
+            return hold_id
+
+    def release(self, hold_id: str):
+        with self._lock:
+            if self._holds.pop(hold_id, None):
+                self._remove(f"hold:{hold_id}")
+
+    def confirm(self, hold_id: str, event: Dict[str, Any]):
+        """Replace a hold with the event that was created for it."""
+        with self._lock:
+            self.release(hold_id)
+            self.apply_events([event])
+
+    def next_free_slots(self, count: int, duration_minutes: int = 30,
+                        after: Optional[datetime.datetime] = None) -> List[datetime.datetime]:
+        """The next `count` free slots of `duration_minutes` within business hours, as calendar-local datetimes."""
+        duration = datetime.timedelta(minutes=duration_minutes)
+        step = datetime.timedelta(minutes=SLOT_STEP_MINUTES)
+        candidate = _round_up_to_slot(to_utc(after) if after else datetime.datetime.now(pytz.utc))
+        horizon = candidate + datetime.timedelta(days=SLOT_SEARCH_DAYS)
+        slots: List[datetime.datetime] = []
+        with self._lock:
+            self._expire_holds()
+            while len(slots) < count and candidate < horizon:
+                day = candidate.date()
+                day_start = CALENDAR_TIMEZONE.localize(datetime.datetime.combine(day, datetime.time(BUSINESS_HOURS[0])))
+                day_end = CALENDAR_TIMEZONE.localize(datetime.datetime.combine(day, datetime.time(BUSINESS_HOURS[1])))
+                if candidate.weekday() >= 5 or candidate + duration > day_end:
+                    next_day = day + datetime.timedelta(days=1)
+                    candidate = CALENDAR_TIMEZONE.localize(datetime.datetime.combine(next_day, datetime.time(BUSINESS_HOURS[0])))
+                    continue
+                if candidate < day_start:
+                    candidate = day_start
+                    continue
+                start = candidate.astimezone(pytz.utc)
+                i = bisect.bisect_right(self._starts, start) - 1
+                if i >= 0 and self._ends[i] > start:
+                    candidate = _round_up_to_slot(self._ends[i])  # inside a busy block: skip past it
+                elif i + 1 < len(self._starts) and self._starts[i + 1] < start + duration:
+                    candidate = _round_up_to_slot(self._ends[i + 1])  # next block starts too soon
+                else:
+                    slots.append(candidate)
+                    candidate = CALENDAR_TIMEZONE.normalize(candidate + step)
+        return slots
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"events": len(self._intervals) - len(self._holds), "holds": len(self._holds),
+                    "busy_blocks": len(self._starts)}
+
+
+def _sync_cutoff() -> datetime.datetime:
+    return datetime.datetime.now(pytz.utc) - datetime.timedelta(hours=CALENDAR_SYNC_LOOKBACK_HOURS)
+
+
+class CalendarSync:
+    def __init__(self, index: AvailabilityIndex, calendar_id: str = CALENDAR_ID,
+                 interval: float = CALENDAR_SYNC_INTERVAL):
+        self.index = index
+        self.calendar_id = calendar_id
+        self.interval = interval
+        self.sync_token: Optional[str] = None
+        self.ready = asyncio.Event()
+
+    def _list_all(self, sync_token: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        service = calendar.service()
+        events, page_token = [], None
+        while True:
+            params = {"calendarId": self.calendar_id, "singleEvents": True, "maxResults": 2500}
+            if sync_token:
+                params["syncToken"] = sync_token
+            else:
+                # Full syncs only fetch the recent past onward, not the calendar's whole history
+                params["timeMin"] = _sync_cutoff().isoformat()
+            if page_token:
+                params["pageToken"] = page_token
+            result = service.events().list(**params).execute()
+            events.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return events, result.get("nextSyncToken")
+
+    async def sync_once(self):
+        full = self.sync_token is None
+        try:
+            events, token = await asyncio.to_thread(self._list_all, self.sync_token)
+        except HttpError as e:
+            if e.resp.status != 410:
+                raise
+            logger.warning("Calendar sync token expired; doing a full sync")
+            self.sync_token = None
+            full = True
+            events, token = await asyncio.to_thread(self._list_all, None)
+        self.index.apply_events(events, replace=full)
+        self.index.prune(_sync_cutoff())
+        self.sync_token = token
+        self.ready.set()
+        if full or events:
+            logger.info(f"Calendar {'full' if full else 'incremental'} sync: {len(events)} events")
+
+    async def run(self):
+        while True:
+            try:
+                await self.sync_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Calendar sync failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+availability = AvailabilityIndex()
+calendar_sync = CalendarSync(availability)
+
+
+async def ensure_hold_table():
+    """Create appointment_holds (whose exclusion constraint makes holds atomic across workers). Fails startup on error."""
+    async with await psycopg.AsyncConnection.connect(**db_config, autocommit=True) as conn:
+        for statement in HOLD_DDL:
+            await conn.execute(statement)
+
+
+async def reserve_slot(start: datetime.datetime, end: datetime.datetime) -> Optional[str]:
+    """
+    Hold [start, end) for booking. The local index rejects known conflicts without a round trip;
+    the appointment_holds row then makes the hold atomic across every worker and process.
+    Returns a hold id, or None if the slot is taken.
+    """
+    hold_id = availability.reserve(start, end)
+    if hold_id is None:
+        return None
+    try:
+        async with repository.connection() as conn:
+            await conn.execute("DELETE FROM appointment_holds WHERE expires_at < now()")
+            await conn.execute("""
+                INSERT INTO appointment_holds (hold_id, slot, expires_at)
+                VALUES (%s, tstzrange(%s, %s, '[)'), now() + make_interval(secs => %s))
+            """, (hold_id, to_utc(start), to_utc(end), availability.hold_ttl))
+    except psycopg.errors.ExclusionViolation:
+        availability.release(hold_id)
+        return None
+    except Exception:
+        availability.release(hold_id)
+        raise
+    return hold_id
+
+
+async def confirm_slot(hold_id: str, event: Dict[str, Any]):
+    """Record the created event locally and keep the database hold until all workers have synced it."""
+    availability.confirm(hold_id, event)
+    try:
+        async with repository.connection() as conn:
+            await conn.execute("UPDATE appointment_holds SET expires_at = now() + make_interval(secs => %s) WHERE hold_id = %s",
+                               (CONFIRMED_HOLD_TTL, hold_id))
+    except Exception as e:
+        logger.warning(f"Could not extend appointment hold {hold_id}: {e}")
+
+
+async def release_slot(hold_id: str):
+    availability.release(hold_id)
+    try:
+        async with repository.connection() as conn:
+            await conn.execute("DELETE FROM appointment_holds WHERE hold_id = %s", (hold_id,))
+    except Exception as e:
+        # The hold still expires on its own after AVAILABILITY_HOLD_TTL
+        logger.warning(f"Could not release appointment hold {hold_id}: {e}")
@@ -0,0 +1,183 @@
+"""
+Webhook-driven call completion.
+
+Provider webhooks (/webhook/retell, /webhook/vapi) call record_call_completion, which queues the
+call_logs row (written once per call_id) and NOTIFYs CALL_COMPLETED_CHANNEL. Anything waiting on a call
+(e.g. the campaign dialer, which runs in its own process) uses a CompletionTracker, which LISTENs for
+those notifications and falls back to polling the provider with exponential backoff in case an
+event is missed.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+import psycopg
+from loguru import logger
+
+import repository
+from call_log_writer import call_log_writer
+from db_pool import db_config, CALL_COMPLETED_CHANNEL
+
+FINAL_STATUSES = ("completed", "failed")
+# The one provider event per call that records its completion. Retell also sends call_analyzed for the
+# same call later; that one is stored in call_events but must not complete (and NOTIFY) the call again.
+COMPLETION_EVENT_TYPES = ("call_ended", "end-of-call-report")
+
+
+def backoff_intervals(initial: float = 5.0, maximum: float = 120.0, factor: float = 2.0) -> Iterator[float]:
+    interval = initial
+    while True:
+        yield interval
+        interval = min(interval * factor, maximum)
+
+
+def poll_until_final(get_status: Callable[[], Optional[str]], timeout: float = 1800,
+                     initial_interval: float = 5.0, max_interval: float = 120.0) -> str:
+    """
+    Blocking fallback for scripts: poll `get_status` (returning "completed", "failed" or anything else
+    for "still running") with exponential backoff. Returns the final status or "timeout".
+    """
+    deadline = time.monotonic() + timeout
+    for interval in backoff_intervals(initial_interval, max_interval):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return "timeout"
+        time.sleep(min(interval, remaining))
+        status = get_status()
+        if status in FINAL_STATUSES:
+            return status
+
+
+async def record_call_completion(call_id: str, phone: Optional[str], cost: Optional[float],
+                                 transcript: Optional[str], status: str = "completed", call_type: str = "outbound"):
+    """Queue the call_logs row (written once per call_id by call_log_writer) and notify waiters."""
+    call_log_writer.write(call_id, phone, cost, transcript, call_type=call_type)
+    async with repository.connection() as conn:
+        await conn.execute("SELECT pg_notify(%s, %s)",
+                           (CALL_COMPLETED_CHANNEL, json.dumps({"call_id": call_id, "status": status})))
+    logger.success(f"Recorded completion of call {call_id} ({status})")
+
+
+class CompletionTracker:
+    def __init__(self, recent_size: int = 10000):
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # Completions that arrive before anyone registered for them (event raced the create-call response)
+        self._recent: "OrderedDict[str, str]" = OrderedDict()
+        self._recent_size = recent_size
+        self._listener: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._listener is None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+
+    def resolve(self, call_id: str, status: str):
+        future = self._waiters.pop(call_id, None)
+        if future is not None and not future.done():
+            future.set_result(status)
+            return
+        self._recent[call_id] = status
+        while len(self._recent) > self._recent_size:
+            self._recent.popitem(last=False)
+
+    async def _listen(self):
+        while True:
+            try:
+                conn = await psycopg.AsyncConnection.connect(**db_config, autocommit=True)
+                async with conn:
+                    await conn.execute(f"LISTEN {CALL_COMPLETED_CHANNEL}")
+                    logger.info(f"Listening for call completions on '{CALL_COMPLETED_CHANNEL}'")
+                    async for notify in conn.notifies():
+                        try:
+                            event = json.loads(notify.payload)
+                            self.resolve(event["call_id"], event.get("status", "completed"))
+                        except (ValueError, KeyError) as e:
+                            logger.warning(f"Ignoring malformed call completion payload {notify.payload!r}: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Call completion listener failed: {e}")
+                await asyncio.sleep(5)
+
+    async def wait(self, call_id: str, poll: Callable[[], Awaitable[Optional[str]]], timeout: float = 1800,
+                   initial_interval: float = 30.0, max_interval: float = 300.0) -> Tuple[str, str]:
+        """
+        Wait for `call_id` to finish. Returns (status, source) where source is "webhook" or "poll";
+        status is "completed", "failed" or "timeout". `poll` is only used when no event arrived in time.
+        """
+        if call_id in self._recent:
+            return self._recent.pop(call_id), "webhook"
+        future = self._waiters.setdefault(call_id, asyncio.get_running_loop().create_future())
+        deadline = time.monotonic() + timeout
+        try:
+            for interval in backoff_intervals(initial_interval, max_interval):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return "timeout", "poll"
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), timeout=min(interval, remaining)), "webhook"
+                except asyncio.TimeoutError:
+                    pass
+                try:
+                    status = await poll()
+                except Exception as e:
+                    logger.warning(f"Fallback status poll failed for {call_id}: {e}")
+                    continue
+                if status in FINAL_STATUSES:
+                    logger.warning(f"No webhook for call {call_id}; completion detected by polling")
+                    return status, "poll"
+        finally:
+            self._waiters.pop(call_id, None)
+
+
+def parse_retell_event(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Normalize a Retell call_ended / call_analyzed webhook. Other events return None."""
+    if payload.get("event") not in ("call_ended", "call_analyzed"):
+        return None
+    call = payload.get("call") or {}
+    call_cost = call.get("call_cost") or {}
+    return {
+        "call_id": call.get("call_id"),
+        "event_type": payload["event"],
+        "event_id": None,  # Retell sends no delivery id; retries carry an identical body
+        "phone": call.get("to_number"),
+        "cost": call_cost.get("combined_cost"),
+        "transcript": call.get("transcript"),
+        "status": "failed" if call.get("call_status") == "error" else "completed",
+        "details": {
+            "call_status": call.get("call_status"),
+            "disconnection_reason": call.get("disconnection_reason"),
+            "call_analysis": call.get("call_analysis"),
+            "recording_url": call.get("recording_url")
+        }
+    }
+
+
+def parse_vapi_event(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Normalize a Vapi end-of-call-report webhook. Other message types return None."""
+    message = payload.get("message") or {}
+    if message.get("type") != "end-of-call-report":
+        return None
+    call = message.get("call") or {}
+    artifact = message.get("artifact") or {}
+    return {
+        "call_id": call.get("id"),
+        "event_type": "end-of-call-report",
+        "event_id": str(message["timestamp"]) if message.get("timestamp") else None,
+        "phone": (call.get("customer") or {}).get("number"),
+        "cost": message.get("cost"),
+        "transcript": artifact.get("transcript") or message.get("transcript"),
+        "status": "completed",
+        "details": {
+            "ended_reason": message.get("endedReason"),
+            "analysis": message.get("analysis"),
+            "recording_url": message.get("recordingUrl")
+        }
+    }
@@ -0,0 +1,226 @@
+"""
+Background, batched writer for call_logs.
+
+write() only appends to an in-memory queue, so the call path never waits on Postgres. A daemon
+thread drains the queue and flushes when CALL_LOG_BATCH_SIZE records are buffered or
+CALL_LOG_FLUSH_INTERVAL seconds have passed, with one multi-row INSERT per batch. call_logs has a
+unique index on call_id (see ensure_call_id_index) and rows whose call_id is already logged are
+skipped with ON CONFLICT, so concurrent writers (API workers, the dialer) and replays are harmless.
+Failed flushes are retried with backoff; if the database stays down the batch is appended to a local
+JSONL spill file, which is replayed once the database is reachable again. A replay file left behind
+by a process that died mid-replay is picked up when the next writer starts. The spill file lives
+under APP_DATA_DIR (see app_data.py). Remaining records are flushed (or spilled) at interpreter exit.
+"""
+
+import atexit
+import contextlib
+import datetime
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from psycopg2.extras import execute_values
+
+import repository
+from app_data import data_path
+from db_pool import db_pool
+
+CALL_LOG_BATCH_SIZE = int(os.getenv("CALL_LOG_BATCH_SIZE", 200))
+CALL_LOG_FLUSH_INTERVAL = float(os.getenv("CALL_LOG_FLUSH_INTERVAL", 2.0))
+CALL_LOG_MAX_RETRIES = int(os.getenv("CALL_LOG_MAX_RETRIES", 3))
+CALL_LOG_SPILL_PATH = os.getenv("CALL_LOG_SPILL_PATH") or data_path("call_logs_spill.jsonl")
+
+CALL_ID_INDEX_DDL = [
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS call_logs_call_id_idx ON call_logs (call_id)"
+]
+
+INSERT_SQL = """
+    INSERT INTO call_logs (call_id, phone, type, cost, transcript, created_at)
+    SELECT DISTINCT ON (v.call_id) v.call_id, v.phone, v.type, v.cost, v.transcript, v.created_at
+    FROM (VALUES %s) AS v (call_id, phone, type, cost, transcript, created_at)
+    ON CONFLICT (call_id) DO NOTHING
+"""
+INSERT_TEMPLATE = "(%(call_id)s, %(phone)s, %(type)s, %(cost)s::numeric, %(transcript)s, %(created_at)s::timestamp)"
+
+
+async def ensure_call_id_index():
+    """
+    Create the unique call_logs(call_id) index INSERT_SQL's ON CONFLICT relies on. Raises on failure,
+    e.g. when duplicate call_ids logged before the index existed have to be cleaned up first.
+    """
+    await repository.apply_ddl(CALL_ID_INDEX_DDL)
+    logger.info("call_logs call_id index is in place")
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _remove(path: str):
+    # Two starting writers can both pick up the same orphan; replaying it twice is harmless (ON CONFLICT)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(path)
+
+
+class CallLogWriter:
+    def __init__(self, batch_size: int = CALL_LOG_BATCH_SIZE, flush_interval: float = CALL_LOG_FLUSH_INTERVAL,
+                 max_retries: int = CALL_LOG_MAX_RETRIES, spill_path: str = CALL_LOG_SPILL_PATH):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.spill_path = spill_path
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"queued": 0, "written": 0, "batches": 0, "retries": 0, "spilled": 0, "replayed": 0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="call-log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def write(self, call_id: str, phone: Optional[str], cost: Optional[float], transcript: Optional[str],
+              call_type: str = "outbound", created_at: Optional[datetime.datetime] = None):
+        """Queue one call_logs row. Never blocks on the database."""
+        if self._thread is None or not self._thread.is_alive():
+            self.start()
+        self._queue.put({
+            "call_id": call_id,
+            "phone": phone,
+            "type": call_type,
+            "cost": cost,
+            "transcript": transcript,
+            "created_at": (created_at or datetime.datetime.now()).isoformat()
+        })
+        with self._lock:
+            self._stats["queued"] += 1
+
+    def close(self, timeout: float = 30.0):
+        """Flush everything still buffered and stop the writer thread."""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def _run(self):
+        self._replay_spill(orphans=True)
+        batch: List[Dict[str, Any]] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if record is None:
+                    self._flush(batch)
+                    return
+                batch.append(record)
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                else:
+                    # Idle: retry anything spilled while the database was down
+                    self._replay_spill()
+                deadline = time.monotonic() + self.flush_interval
+
+    def _insert(self, records: List[Dict[str, Any]]):
+        with db_pool.connection() as conn, conn.cursor() as cur:
+            execute_values(cur, INSERT_SQL, records, template=INSERT_TEMPLATE, page_size=len(records))
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        if not batch:
+            return
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._insert(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f"Writing {len(batch)} call logs failed ({e}); spilling to {self.spill_path}")
+                    self._spill(batch)
+                    return
+                with self._lock:
+                    self._stats["retries"] += 1
+                delay = 2 ** attempt
+                logger.warning(f"Writing {len(batch)} call logs failed ({e}); retrying in {delay}s")
+                time.sleep(delay)
+        with self._lock:
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+        self._replay_spill()
+
+    def _spill(self, batch: List[Dict[str, Any]], count: bool = True):
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in batch))
+            f.flush()
+            os.fsync(f.fileno())
+        if count:
+            with self._lock:
+                self._stats["spilled"] += len(batch)
+
+    def _orphaned_replays(self) -> List[str]:
+        """Replay files whose process is gone (it died mid-replay); live processes' files are left alone."""
+        orphans = []
+        for path in glob.glob(f"{glob.escape(self.spill_path)}.*.replay"):
+            pid = path[len(self.spill_path) + 1:-len(".replay")]
+            if pid.isdigit() and int(pid) != os.getpid() and _pid_alive(int(pid)):
+                continue
+            orphans.append(path)
+        return orphans
+
+    def _replay_spill(self, orphans: bool = False):
+        paths = self._orphaned_replays() if orphans else []
+        if os.path.exists(self.spill_path):
+            # Claim the file atomically so concurrent writers (other processes) don't replay it twice
+            claimed = f"{self.spill_path}.{os.getpid()}.replay"
+            try:
+                os.replace(self.spill_path, claimed)
+                paths.append(claimed)
+            except FileNotFoundError:
+                pass
+        for path in paths:
+            self._replay_file(path)
+
+    def _replay_file(self, path: str):
+        try:
+            with open(path, encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            # Another starting writer took this orphan first
+            return
+        try:
+            for start in range(0, len(records), self.batch_size):
+                self._insert(records[start:start + self.batch_size])
+        except Exception as e:
+            logger.error(f"Replaying spilled call logs failed ({e}); keeping them for the next attempt")
+            self._spill(records, count=False)
+            _remove(path)
+            return
+        _remove(path)
+        with self._lock:
+            self._stats["replayed"] += len(records)
+            self._stats["written"] += len(records)
+        logger.info(f"Replayed {len(records)} spilled call logs")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "buffered": self._queue.qsize()}
+
+
+call_log_writer = CallLogWriter()
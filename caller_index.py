@@ -0,0 +1,240 @@
+"""
+In-memory index for identifying inbound callers by spoken name (and optionally DOB).
+
+Built from patients at startup and kept current through patient_cache's change notifications.
+Candidates come from a DOB bucket when a DOB is given, otherwise from Soundex/Metaphone postings
+(falling back to trigram postings for misspellings), and are ranked by trigram Dice similarity
+plus phonetic agreement against both the resident and the contact name.
+"""
+
+import asyncio
+import datetime
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Set
+
+import jellyfish
+from loguru import logger
+
+import repository
+import patient_cache
+
+MAX_CANDIDATES = 2000
+CALLER_INDEX_REBUILD_DEBOUNCE = float(os.getenv("CALLER_INDEX_REBUILD_DEBOUNCE", 2.0))  # seconds
+
+_NON_ALPHA = re.compile(r"[^a-z]+")
+
+
+class CallerRecord(NamedTuple):
+    resident_id: str
+    resident_name: str
+    contact_name: str
+    date_of_birth: Optional[datetime.date]
+    resident_grams: FrozenSet[str]
+    contact_grams: FrozenSet[str]
+    phonetic_keys: FrozenSet[str]
+
+
+def normalize_name(name: Optional[str]) -> str:
+    return _NON_ALPHA.sub(" ", (name or "").lower()).strip()
+
+
+def name_ngrams(name: str) -> FrozenSet[str]:
+    # Same padding scheme as pg_trgm: two leading spaces and one trailing space per word
+    grams = set()
+    for word in name.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def phonetic_keys(name: str) -> FrozenSet[str]:
+    keys = set()
+    for word in name.split():
+        keys.add(f"S:{jellyfish.soundex(word)}")
+        keys.add(f"M:{jellyfish.metaphone(word)}")
+    return frozenset(keys)
+
+
+def _dice(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _make_record(row: Dict[str, Any]) -> CallerRecord:
+    resident_name = normalize_name(f"{row['resident_first_name'] or ''} {row['resident_last_name'] or ''}")
+    contact_name = normalize_name(f"{row['contact_first_name'] or ''} {row['contact_last_name'] or ''}")
+    return CallerRecord(
+        resident_id=str(row["resident_id"]),
+        resident_name=resident_name,
+        contact_name=contact_name,
+        date_of_birth=row["date_of_birth"],
+        resident_grams=name_ngrams(resident_name),
+        contact_grams=name_ngrams(contact_name),
+        phonetic_keys=phonetic_keys(resident_name) | phonetic_keys(contact_name)
+    )
+
+
+class CallerIndex:
+    def __init__(self):
+        self._records: Dict[str, CallerRecord] = {}
+        self._by_dob: Dict[datetime.date, Set[str]] = defaultdict(set)
+        self._by_phonetic: Dict[str, Set[str]] = defaultdict(set)
+        self._by_ngram: Dict[str, Set[str]] = defaultdict(set)
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def add(self, record: CallerRecord):
+        self.remove(record.resident_id)
+        self._records[record.resident_id] = record
+        if record.date_of_birth:
+            self._by_dob[record.date_of_birth].add(record.resident_id)
+        for key in record.phonetic_keys:
+            self._by_phonetic[key].add(record.resident_id)
+        for gram in record.resident_grams | record.contact_grams:
+            self._by_ngram[gram].add(record.resident_id)
+
+    def remove(self, resident_id: str):
+        record = self._records.pop(resident_id, None)
+        if record is None:
+            return
+        if record.date_of_birth:
+            self._by_dob[record.date_of_birth].discard(resident_id)
+        for key in record.phonetic_keys:
+            self._by_phonetic[key].discard(resident_id)
+        for gram in record.resident_grams | record.contact_grams:
+            self._by_ngram[gram].discard(resident_id)
+
+    def _candidates(self, grams: FrozenSet[str], keys: FrozenSet[str]) -> Set[str]:
+        hits = Counter()
+        for key in keys:
+            hits.update(self._by_phonetic.get(key, ()))
+        if not hits:
+            # Nothing sounds alike; fall back to spelling overlap
+            for gram in grams:
+                hits.update(self._by_ngram.get(gram, ()))
+        return {resident_id for resident_id, _ in hits.most_common(MAX_CANDIDATES)}
+
+    def search(self, name: str, date_of_birth: Optional[datetime.date] = None,
+               limit: int = 5, min_score: float = 0.3) -> List[Dict[str, Any]]:
+        """Rank patients whose resident or contact name sounds/looks like `name`."""
+        query = normalize_name(name)
+        if not query:
+            return []
+        grams = name_ngrams(query)
+        keys = phonetic_keys(query)
+        if date_of_birth:
+            candidates = self._by_dob.get(date_of_birth, set())
+        else:
+            candidates = self._candidates(grams, keys)
+
+        results = []
+        for resident_id in candidates:
+            record = self._records[resident_id]
+            phonetic = len(keys & record.phonetic_keys) / len(keys) if keys else 0.0
+            resident_score = _dice(grams, record.resident_grams)
+            contact_score = _dice(grams, record.contact_grams)
+            matched_on = "resident" if resident_score >= contact_score else "contact"
+            score = 0.7 * max(resident_score, contact_score) + 0.3 * phonetic
+            if score >= min_score:
+                results.append({"resident_id": resident_id, "score": round(score, 4), "matched_on": matched_on})
+        results.sort(key=lambda r: r["score"], reverse=True)
+        return results[:limit]
+
+
+caller_index = CallerIndex()
+_rebuild_lock = asyncio.Lock()
+_rebuild_requested = False
+_rebuild_task: Optional[asyncio.Task] = None
+# Residents changed while a rebuild was in flight; re-applied to the new index after the swap
+_changed_during_rebuild: Set[str] = set()
+
+
+def _build_index(rows: List[Dict[str, Any]]) -> CallerIndex:
+    index = CallerIndex()
+    for row in rows:
+        index.add(_make_record(row))
+    index.ready = True
+    return index
+
+
+async def rebuild():
+    """
+    Load every patient into a fresh index and swap it in. The CPU-heavy part (normalization,
+    n-grams, phonetic keys) runs on a worker thread, so the event loop keeps serving requests
+    from the current index until the new one replaces it in a single assignment.
+    """
+    global caller_index
+    async with _rebuild_lock:
+        started_at = time.monotonic()
+        _changed_during_rebuild.clear()
+        rows = await repository.fetch_all("""
+            SELECT resident_id, resident_first_name, resident_last_name,
+                   contact_first_name, contact_last_name, date_of_birth
+            FROM patients
+        """)
+        index = await asyncio.to_thread(_build_index, rows)
+        caller_index = index
+        changed = list(_changed_during_rebuild)
+        _changed_during_rebuild.clear()
+        logger.info(f"Caller index built: {len(index)} patients in {time.monotonic() - started_at:.2f}s")
+    if changed:
+        await refresh(changed)
+
+
+async def _debounced_rebuild():
+    global _rebuild_requested
+    while _rebuild_requested:
+        await asyncio.sleep(CALLER_INDEX_REBUILD_DEBOUNCE)
+        _rebuild_requested = False
+        await rebuild()
+
+
+def request_rebuild():
+    """Schedule a full rebuild; a burst of requests (e.g. one NOTIFY per imported file) is coalesced into one."""
+    global _rebuild_requested, _rebuild_task
+    _rebuild_requested = True
+    if _rebuild_task is None or _rebuild_task.done():
+        _rebuild_task = asyncio.get_running_loop().create_task(_debounced_rebuild())
+        _rebuild_task.add_done_callback(lambda t: t.cancelled() or not t.exception() or
+                                        logger.error(f"Caller index rebuild failed: {t.exception()}"))
+
+
+async def refresh(resident_ids: Optional[List[str]] = None):
+    """Reload the given residents into the index with one query (removing deleted ones); None rebuilds everything."""
+    if resident_ids is None:
+        request_rebuild()
+        return
+    if _rebuild_lock.locked():
+        _changed_during_rebuild.update(resident_ids)
+    rows = await repository.fetch_all("""
+        SELECT resident_id, resident_first_name, resident_last_name,
+               contact_first_name, contact_last_name, date_of_birth
+        FROM patients
+        WHERE resident_id = ANY(%s)
+    """, (list(resident_ids),))
+    records = [_make_record(row) for row in rows]
+    found = {record.resident_id for record in records}
+    for record in records:
+        caller_index.add(record)
+    for resident_id in resident_ids:
+        if resident_id not in found:
+            caller_index.remove(resident_id)
+
+
+def _on_patient_changed(resident_ids: Optional[List[str]]):
+    task = asyncio.get_running_loop().create_task(refresh(resident_ids))
+    task.add_done_callback(lambda t: t.cancelled() or not t.exception() or
+                           logger.error(f"Caller index refresh failed: {t.exception()}"))
+
+
+patient_cache.on_patient_changed(_on_patient_changed)
+
+
+def search(name: str, date_of_birth: Optional[datetime.date] = None, limit: int = 5) -> List[Dict[str, Any]]:
+    return caller_index.search(name, date_of_birth=date_of_birth, limit=limit)
@@ -0,0 +1,192 @@
+"""
+Process-wide psycopg2 connection pool and shared database settings.
+
+Synchronous callers (the import and collector scripts) borrow connections from here instead of
+opening a fresh connection per operation; the async FastAPI handlers use repository.py.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+import psycopg2
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor
+from loguru import logger
+from dotenv import load_dotenv
+
+load_dotenv()
+
+db_config = {
+    "dbname": os.getenv("DB_NAME", "debt_collection"),
+    "user": os.getenv("DB_USER", "user"),
+    "password": os.getenv("DB_PASSWORD", "password"),
+    "host": os.getenv("DB_HOST", "localhost"),
+    "port": int(os.getenv("DB_PORT", 5432))
+}
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 2))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 20))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 10))  # seconds to wait for a free connection
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 5000))
+DB_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_HEALTH_CHECK_INTERVAL", 30))  # seconds idle before re-checking
+
+# NOTIFY channel for patients row changes; payload is newline-separated resident_ids (kept under
+# PATIENT_CHANGED_MAX_PAYLOAD bytes, Postgres caps payloads at 8000), or empty for "everything changed"
+PATIENT_CHANGED_CHANNEL = "patient_changed"
+PATIENT_CHANGED_MAX_PAYLOAD = 7900
+# NOTIFY channel for finished calls; payload is JSON {"call_id", "status"}
+CALL_COMPLETED_CHANNEL = "call_completed"
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection became free within the configured timeout."""
+
+
+class DatabasePool:
+    def __init__(self, min_size: int = DB_POOL_MIN_SIZE, max_size: int = DB_POOL_MAX_SIZE,
+                 timeout: float = DB_POOL_TIMEOUT, statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS,
+                 health_check_interval: float = DB_HEALTH_CHECK_INTERVAL, **connect_kwargs):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.statement_timeout_ms = statement_timeout_ms
+        self.health_check_interval = health_check_interval
+        self.connect_kwargs = connect_kwargs
+        self._pool = None
+        # ThreadedConnectionPool raises instead of waiting when exhausted; the semaphore makes callers queue
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._last_used: Dict[int, float] = {}
+        self._in_use = 0
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "checkout_time_total": 0.0,
+            "checkout_time_max": 0.0
+        }
+
+    def open(self):
+        with self._lock:
+            if self._pool is not None:
+                return
+            self._pool = pool.ThreadedConnectionPool(
+                self.min_size,
+                self.max_size,
+                options=f"-c statement_timeout={self.statement_timeout_ms}",
+                **self.connect_kwargs
+            )
+        logger.info(f"Database pool opened (min={self.min_size}, max={self.max_size})")
+
+    def close(self):
+        with self._lock:
+            if self._pool is None:
+                return
+            self._pool.closeall()
+            self._pool = None
+            self._last_used.clear()
+        logger.info("Database pool closed")
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if self._is_healthy(conn):
+            return conn
+        logger.warning("Discarding broken pooled database connection")
+        with self._lock:
+            self._stats["health_check_failures"] += 1
+            self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+        return self._pool.getconn()
+
+    def _record(self, wait_time: float, checkout_time: float):
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["wait_time_total"] += wait_time
+            self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+            self._stats["checkout_time_total"] += checkout_time
+            self._stats["checkout_time_max"] = max(self._stats["checkout_time_max"], checkout_time)
+
+    @contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Borrow a connection for the duration of the block.
+        Commits on success, rolls back on error, and always returns the connection to the pool.
+        """
+        if self._pool is None:
+            self.open()
+
+        requested_at = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._stats["timeouts"] += 1
+            logger.error(f"Timed out after {self.timeout}s waiting for a database connection")
+            raise PoolTimeoutError("Timed out waiting for a database connection")
+        try:
+            conn = self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+        acquired_at = time.monotonic()
+        with self._lock:
+            self._in_use += 1
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            raise
+        finally:
+            discard = discard or bool(conn.closed)
+            with self._lock:
+                self._in_use -= 1
+                if discard:
+                    self._last_used.pop(id(conn), None)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=discard)
+            self._slots.release()
+            self._record(acquired_at - requested_at, time.monotonic() - acquired_at)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            checkouts = self._stats["checkouts"]
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "checkouts": checkouts,
+                "timeouts": self._stats["timeouts"],
+                "health_check_failures": self._stats["health_check_failures"],
+                "wait_ms_avg": round(self._stats["wait_time_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_ms_max": round(self._stats["wait_time_max"] * 1000, 3),
+                "checkout_ms_avg": round(self._stats["checkout_time_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+                "checkout_ms_max": round(self._stats["checkout_time_max"] * 1000, 3)
+            }
+
+
+db_pool = DatabasePool(**db_config, cursor_factory=RealDictCursor)
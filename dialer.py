@@ -0,0 +1,280 @@
+"""
+Campaign dialer: places outbound calls for a list of patients concurrently.
+
+Calls are spread over one or more voice providers (Retell, Vapi); each new call goes to the provider
+with the most free capacity. Each contact takes one of `max_concurrent_calls` slots from dial until
+the call ends. Dials are
+spaced `dial_interval` seconds apart (pacing for our caller ID), and two calls to the same
+contact number are at least `per_number_interval` seconds apart; a contact waits out its number's
+spacing (state "scheduled") before taking a slot, so only the short global spacing is spent holding one. A slot is released when the
+provider webhook reports the call ended (via CALL_COMPLETED_CHANNEL); polling with
+exponential backoff only kicks in if that event does not arrive.
+
+Contacts are only dialed inside their local TCPA calling window (see tcpa.py). The whole list is
+scored up front; contacts outside their window wait (state "scheduled") until it opens without
+holding a slot, and the window is re-checked right before each dial.
+
+Usage:
+    python dialer.py --facility-code HMELKO --max-concurrent-calls 25
+    python dialer.py --providers retell:20,vapi:10
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from call_log_writer import call_log_writer, ensure_call_id_index
+from db_pool import db_pool
+import call_completion
+import http_client
+import pronunciation
+import repository
+import tcpa
+from voice_providers import CallRequest, ProviderRouter, RetellProvider, VoiceProvider, build_providers
+
+DIALER_MAX_CONCURRENT_CALLS = int(os.getenv("DIALER_MAX_CONCURRENT_CALLS", 20))
+DIALER_DIAL_INTERVAL = float(os.getenv("DIALER_DIAL_INTERVAL", 1.0))
+DIALER_PER_NUMBER_INTERVAL = float(os.getenv("DIALER_PER_NUMBER_INTERVAL", 300))
+DIALER_POLL_INTERVAL = float(os.getenv("DIALER_POLL_INTERVAL", 30))  # first fallback poll; doubles up to DIALER_MAX_POLL_INTERVAL
+DIALER_MAX_POLL_INTERVAL = float(os.getenv("DIALER_MAX_POLL_INTERVAL", 300))
+DIALER_MAX_CALL_DURATION = float(os.getenv("DIALER_MAX_CALL_DURATION", 1800))
+
+FINAL_STATES = ("completed", "failed", "timeout")
+
+
+def load_campaign_patients(facility_code: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Patients with an outstanding balance and a contact number, optionally for one facility."""
+    query = """
+        SELECT resident_id, resident_first_name, resident_last_name, contact_first_name, contact_last_name,
+               contact_number, date_of_birth, balance, due_date, facility_name, facility_code, payer_desc
+        FROM patients
+        WHERE balance > 0 AND contact_number IS NOT NULL AND contact_number <> ''
+    """
+    params: List[Any] = []
+    if facility_code:
+        query += " AND facility_code = %s"
+        params.append(facility_code)
+    query += " ORDER BY resident_id"
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    with db_pool.connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        return cur.fetchall()
+
+
+class CampaignDialer:
+    def __init__(self, providers: Optional[Sequence[VoiceProvider]] = None,
+                 max_concurrent_calls: int = DIALER_MAX_CONCURRENT_CALLS,
+                 dial_interval: float = DIALER_DIAL_INTERVAL,
+                 per_number_interval: float = DIALER_PER_NUMBER_INTERVAL,
+                 poll_interval: float = DIALER_POLL_INTERVAL,
+                 max_call_duration: float = DIALER_MAX_CALL_DURATION,
+                 agent_id: Optional[str] = None, workflow_id: Optional[str] = None):
+        if providers is None:
+            providers = [RetellProvider(agent_id=agent_id, workflow_id=workflow_id,
+                                        max_concurrent_calls=max_concurrent_calls)]
+        self.router = ProviderRouter(providers)
+        self.max_concurrent_calls = min(max_concurrent_calls, self.router.capacity)
+        self.dial_interval = dial_interval
+        self.per_number_interval = per_number_interval
+        self.poll_interval = poll_interval
+        self.max_call_duration = max_call_duration
+        # resident_id -> {"state", "provider", "call_id", "contact_number", "error", "not_before", "queued_at",
+        #                 "started_at", "ended_at"}
+        self.calls: Dict[str, Dict[str, Any]] = {}
+        self._last_dial_at = float("-inf")
+        self._last_dial_by_number: Dict[str, float] = {}
+        self._pacing_lock: Optional[asyncio.Lock] = None
+        self._started_at: Optional[float] = None
+        self.tracker = call_completion.CompletionTracker()
+
+    def _number_wait(self, contact_number: str) -> float:
+        return self._last_dial_by_number.get(contact_number, float("-inf")) + self.per_number_interval - time.monotonic()
+
+    async def _wait_for_number(self, call: Dict[str, Any], contact_number: str):
+        """Wait out this number's spacing since its last dial, without holding a slot."""
+        delay = self._number_wait(contact_number)
+        while delay > 0:
+            call["state"] = "scheduled"
+            await asyncio.sleep(delay)
+            call["state"] = "queued"
+            delay = self._number_wait(contact_number)
+
+    async def _reserve_dial(self, contact_number: str) -> bool:
+        """
+        Wait for the global dial spacing, then record a dial of `contact_number` if it may still be dialed:
+        its number spacing and calling window are re-checked, since either can change while a call waits
+        for a slot. Returns False, recording nothing, if it may not.
+        """
+        async with self._pacing_lock:
+            global_wait = self._last_dial_at + self.dial_interval - time.monotonic()
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+            if self._number_wait(contact_number) > 0 or not tcpa.is_allowed(contact_number):
+                return False
+            self._last_dial_at = self._last_dial_by_number[contact_number] = time.monotonic()
+            return True
+
+    def _call_request(self, patient: Dict[str, Any]) -> CallRequest:
+        return CallRequest(
+            contact_name=patient["contact_first_name"] or patient["contact_last_name"] or "",
+            contact_number=str(patient["contact_number"]),
+            resident_id=str(patient["resident_id"]),
+            facility_name=patient["facility_name"] or "",
+            resident_fname=patient["resident_first_name"] or "",
+            resident_lname=patient["resident_last_name"] or "",
+            balance=float(patient["balance"]),
+            due_date=pronunciation.spoken_date(patient["due_date"]),
+            payer_desc=patient["payer_desc"] or ""
+        )
+
+    async def wait_for_completion(self, provider: VoiceProvider, call_id: str) -> Tuple[str, str]:
+        """Wait for the provider's end-of-call webhook, polling it with backoff as a fallback. Returns (state, source)."""
+        return await self.tracker.wait(call_id, lambda: provider.get_call_status(call_id), timeout=self.max_call_duration,
+                                       initial_interval=self.poll_interval, max_interval=DIALER_MAX_POLL_INTERVAL)
+
+    async def finish_call(self, provider: VoiceProvider, call: Dict[str, Any]):
+        """Record a call whose webhook never arrived: fetch transcript/cost and write call_logs."""
+        details = await provider.fetch_call_details(call["call_id"])
+        if not details:
+            return
+        await call_completion.record_call_completion(call["call_id"], call["contact_number"], details.cost,
+                                                     details.transcript)
+
+    async def _wait_for_calling_window(self, call: Dict[str, Any]):
+        delay = call["not_before"] - time.time()
+        if delay > 0:
+            call["state"] = "scheduled"
+            await asyncio.sleep(delay)
+            call["state"] = "queued"
+
+    async def _dial(self, patient: Dict[str, Any], slots: asyncio.Semaphore):
+        call = self.calls[str(patient["resident_id"])]
+        try:
+            await self._dial_contact(patient, call, slots)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # One contact's error (bad data, provider outage) must not abort the rest of the campaign
+            logger.error(f"Call to resident {patient['resident_id']} failed: {e}")
+            call.update(state="failed", error=str(e), ended_at=time.time())
+
+    async def _dial_contact(self, patient: Dict[str, Any], call: Dict[str, Any], slots: asyncio.Semaphore):
+        request = self._call_request(patient)
+        while True:
+            await self._wait_for_calling_window(call)
+            await self._wait_for_number(call, request.contact_number)
+            async with slots:
+                provider = await self.router.acquire()
+                try:
+                    if not await self._reserve_dial(request.contact_number):
+                        # The window closed, or another call to this number went out, while this one waited for a slot
+                        if not tcpa.is_allowed(request.contact_number):
+                            call["not_before"] = tcpa.next_allowed_time(request.contact_number).timestamp()
+                        continue
+                    call.update(state="dialing", provider=provider.name, started_at=time.time())
+                    result = await provider.create_call(request)
+                    if result["status"] != 200:
+                        call.update(state="failed", error=result.get("error"), ended_at=time.time())
+                        return
+                    call.update(state="in_progress", call_id=result["call_id"])
+                    call["state"], source = await self.wait_for_completion(provider, call["call_id"])
+                    call["ended_at"] = time.time()
+                finally:
+                    await self.router.release(provider)
+            break
+        # Webhook completions were already logged by the API; only backfill ones detected by polling
+        if call["state"] == "completed" and source == "poll":
+            try:
+                await self.finish_call(provider, call)
+            except Exception as e:
+                logger.error(f"Failed to record call {call['call_id']}: {e}")
+
+    async def run(self, patients: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        patients = list(patients)
+        self._pacing_lock = asyncio.Lock()
+        self._started_at = time.monotonic()
+        not_before = tcpa.next_allowed_times([str(patient["contact_number"]) for patient in patients])
+        for patient, allowed_at in zip(patients, not_before):
+            self.calls[str(patient["resident_id"])] = {
+                "state": "queued",
+                "provider": None,
+                "call_id": None,
+                "contact_number": str(patient["contact_number"]),
+                "error": None,
+                "not_before": float(allowed_at),
+                "queued_at": time.time(),
+                "started_at": None,
+                "ended_at": None
+            }
+        deferred = int((not_before > time.time()).sum())
+        logger.info(f"Dialing {len(patients)} contacts with up to {self.max_concurrent_calls} concurrent calls "
+                    f"({deferred} outside their calling window until it opens)")
+        slots = asyncio.Semaphore(self.max_concurrent_calls)
+        await repository.open_pool()
+        await ensure_call_id_index()
+        await http_client.open_async_client()
+        self.tracker.start()
+        try:
+            await asyncio.gather(*(self._dial(patient, slots) for patient in patients))
+        finally:
+            self.tracker.stop()
+            # Completions found by polling are logged through the writer; flush them while the database is still up
+            await asyncio.to_thread(call_log_writer.close)
+            await http_client.aclose()
+            await asyncio.to_thread(http_client.close)
+            await repository.close_pool()
+        summary = self.summary()
+        logger.info(f"Campaign finished: {summary}")
+        return summary
+
+    def summary(self) -> Dict[str, Any]:
+        states = Counter(call["state"] for call in self.calls.values())
+        providers = Counter(call["provider"] for call in self.calls.values() if call["provider"])
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        done = sum(states[state] for state in FINAL_STATES)
+        return {
+            "total": len(self.calls),
+            "states": dict(states),
+            "providers": dict(providers),
+            "elapsed_seconds": round(elapsed, 1),
+            "calls_per_hour": round(done / elapsed * 3600, 1) if elapsed else 0.0
+        }
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run an outbound debt collection call campaign")
+    parser.add_argument("--facility-code", help="Only dial patients from this facility")
+    parser.add_argument("--limit", type=int, help="Maximum number of contacts to dial")
+    parser.add_argument("--max-concurrent-calls", type=int, default=DIALER_MAX_CONCURRENT_CALLS)
+    parser.add_argument("--dial-interval", type=float, default=DIALER_DIAL_INTERVAL)
+    parser.add_argument("--per-number-interval", type=float, default=DIALER_PER_NUMBER_INTERVAL)
+    parser.add_argument("--providers", default="retell",
+                        help="Comma-separated providers with optional capacity, e.g. retell:20,vapi:10")
+    args = parser.parse_args(argv)
+
+    names, capacities = [], {}
+    for spec in args.providers.split(","):
+        name, _, capacity = spec.strip().partition(":")
+        names.append(name)
+        if capacity:
+            capacities[name] = int(capacity)
+
+    patients = load_campaign_patients(args.facility_code, args.limit)
+    dialer = CampaignDialer(
+        providers=build_providers(names, capacities, default_capacity=args.max_concurrent_calls),
+        max_concurrent_calls=args.max_concurrent_calls,
+        dial_interval=args.dial_interval,
+        per_number_interval=args.per_number_interval
+    )
+    asyncio.run(dialer.run(patients))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Fast date-of-birth normalization for spoken and typed DOBs.
+
+Common shapes ("1986-03-25", "03/25/1986", "March 25th, 1986", "25 March, 1986",
+"twenty fifth of March 1986") are handled by precompiled regexes; anything else falls back to a
+memoized dateutil fuzzy parse. Compare the result directly with the `date` from the database.
+
+Run `python dob_normalizer.py` for a microbenchmark against dateutil.
+"""
+
+import datetime
+import re
+from functools import lru_cache
+from typing import Optional
+
+from dateutil.parser import parse
+
+_MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"),
+        ("may",), ("june", "jun"), ("july", "jul"), ("august", "aug"),
+        ("september", "sep", "sept"), ("october", "oct"), ("november", "nov"), ("december", "dec")
+    ], start=1)
+    for name in names
+}
+
+_ORDINAL_UNITS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7,
+    "eighth": 8, "ninth": 9
+}
+_DAY_WORDS = dict(_ORDINAL_UNITS)
+_DAY_WORDS.update({
+    "tenth": 10, "eleventh": 11, "twelfth": 12, "thirteenth": 13, "fourteenth": 14, "fifteenth": 15,
+    "sixteenth": 16, "seventeenth": 17, "eighteenth": 18, "nineteenth": 19, "twentieth": 20, "thirtieth": 30
+})
+for _tens_word, _tens in (("twenty", 20), ("thirty", 30)):
+    for _unit_word, _unit in _ORDINAL_UNITS.items():
+        if _tens + _unit <= 31:
+            _DAY_WORDS[f"{_tens_word} {_unit_word}"] = _tens + _unit
+
+_MONTH_RE = "|".join(sorted(_MONTHS, key=len, reverse=True))
+_DAY_WORD_RE = "|".join(sorted(_DAY_WORDS, key=len, reverse=True))
+
+_WORD_HYPHEN = re.compile(r"(?<=[a-z])-(?=[a-z])")  # "twenty-fifth" -> "twenty fifth"
+_ISO = re.compile(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})$")
+_US_NUMERIC = re.compile(r"^(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})$")
+_MONTH_FIRST = re.compile(rf"^({_MONTH_RE})\.?\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})$")
+_DAY_FIRST = re.compile(rf"^(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?({_MONTH_RE})\.?,?\s+(\d{{4}})$")
+_SPOKEN_DAY_FIRST = re.compile(rf"^(?:the\s+)?({_DAY_WORD_RE})\s+(?:of\s+)?({_MONTH_RE}),?\s+(\d{{4}})$")
+_SPOKEN_MONTH_FIRST = re.compile(rf"^({_MONTH_RE})\s+(?:the\s+)?({_DAY_WORD_RE}),?\s+(\d{{4}})$")
+
+
+def _make_date(year: int, month: int, day: int) -> Optional[datetime.date]:
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _fast_path(text: str) -> Optional[datetime.date]:
+    m = _ISO.match(text)
+    if m:
+        return _make_date(int(m[1]), int(m[2]), int(m[3]))
+    m = _US_NUMERIC.match(text)
+    if m:
+        return _make_date(int(m[3]), int(m[1]), int(m[2]))
+    m = _MONTH_FIRST.match(text)
+    if m:
+        return _make_date(int(m[3]), _MONTHS[m[1]], int(m[2]))
+    m = _DAY_FIRST.match(text)
+    if m:
+        return _make_date(int(m[3]), _MONTHS[m[2]], int(m[1]))
+    m = _SPOKEN_DAY_FIRST.match(text)
+    if m:
+        return _make_date(int(m[3]), _MONTHS[m[2]], _DAY_WORDS[m[1]])
+    m = _SPOKEN_MONTH_FIRST.match(text)
+    if m:
+        return _make_date(int(m[3]), _MONTHS[m[1]], _DAY_WORDS[m[2]])
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _slow_path(text: str) -> Optional[datetime.date]:
+    try:
+        return parse(text, fuzzy=True).date()
+    except (ValueError, OverflowError):
+        return None
+
+
+def normalize_dob(value: Optional[str]) -> Optional[datetime.date]:
+    """Parse a DOB string into a date, or None if it cannot be understood."""
+    if not value:
+        return None
+    text = _WORD_HYPHEN.sub(" ", " ".join(value.lower().split()))
+    return _fast_path(text) or _slow_path(text)
+
+
+def dob_matches(provided: Optional[str], stored: Optional[datetime.date]) -> bool:
+    if not stored:
+        return False
+    provided_date = normalize_dob(provided)
+    return provided_date is not None and provided_date == stored
+
+
+if __name__ == "__main__":
+    import timeit
+
+    samples = ["1986-03-25", "03/25/1986", "March 25th, 1986", "25 March, 1986", "twenty fifth of March 1986"]
+    for sample in samples:
+        assert normalize_dob(sample) == datetime.date(1986, 3, 25), sample
+    runs = 20000
+    fast = timeit.timeit(lambda: [normalize_dob(s) for s in samples], number=runs)
+    slow = timeit.timeit(lambda: [parse(s, fuzzy=True).date() for s in samples], number=runs)
+    per_call = runs * len(samples)
+    print(f"normalize_dob:          {fast / per_call * 1e6:.2f} us/call")
+    print(f"dateutil parse(fuzzy):  {slow / per_call * 1e6:.2f} us/call")
+    print(f"speedup:                {slow / fast:.1f}x")
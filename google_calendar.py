@@ -0,0 +1,156 @@
+"""
+Long-lived Google Calendar client.
+
+Credentials are loaded from token.json once and kept fresh by refresh_loop() (started in the app
+lifespan), which refreshes them CALENDAR_REFRESH_MARGIN seconds before they expire and writes the
+new token back. The Calendar API surface comes from the discovery document bundled with
+google-api-python-client, so nothing is fetched over the network when a service is built.
+
+googleapiclient service objects sit on httplib2, which is not thread-safe, so each thread gets
+its own service built from the shared, already-parsed discovery document and credentials.
+Use `await calendar.run(lambda service: ...)` to execute requests off the event loop.
+`await calendar.run_batch(...)` sends many requests per round trip as batch HTTP requests.
+"""
+
+import asyncio
+import datetime
+import json
+import os
+import threading
+from typing import Any, Callable, List, Optional, Tuple, TypeVar
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from loguru import logger
+
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+GOOGLE_CREDENTIALS_FILE = os.getenv("GOOGLE_CREDENTIALS_FILE", "credentials.json")
+GOOGLE_TOKEN_FILE = os.getenv("GOOGLE_TOKEN_FILE", "token.json")
+CALENDAR_REFRESH_MARGIN = float(os.getenv("CALENDAR_REFRESH_MARGIN", 300))  # seconds before expiry
+CALENDAR_BATCH_SIZE = int(os.getenv("CALENDAR_BATCH_SIZE", 50))  # calls per batch HTTP request
+
+T = TypeVar("T")
+
+
+class CalendarClient:
+    def __init__(self, token_file: str = GOOGLE_TOKEN_FILE, credentials_file: str = GOOGLE_CREDENTIALS_FILE):
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+        self._credentials: Optional[Credentials] = None
+        self._discovery_doc: Optional[Any] = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _load_credentials(self) -> Credentials:
+        creds = None
+        if os.path.exists(self.token_file):
+            creds = Credentials.from_authorized_user_file(self.token_file, SCOPES)
+        if creds and creds.expired and creds.refresh_token:
+            creds.refresh(Request())
+            self._save(creds)
+        elif not creds or not creds.valid:
+            # First-time consent only; afterwards the refresh token keeps the credentials alive
+            flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, SCOPES)
+            creds = flow.run_local_server(port=0)
+            self._save(creds)
+        return creds
+
+    def _save(self, creds: Credentials):
+        with open(self.token_file, 'w') as token:
+            token.write(creds.to_json())
+
+    @property
+    def credentials(self) -> Credentials:
+        if self._credentials is None:
+            with self._lock:
+                if self._credentials is None:
+                    self._credentials = self._load_credentials()
+        return self._credentials
+
+    def _discovery(self) -> Any:
+        if self._discovery_doc is None:
+            with self._lock:
+                if self._discovery_doc is None:
+                    doc = get_static_doc('calendar', 'v3')
+                    self._discovery_doc = json.loads(doc) if doc else None
+        return self._discovery_doc
+
+    def service(self):
+        """The calling thread's Calendar service (built once per thread, no network I/O)."""
+        service = getattr(self._local, "service", None)
+        if service is None:
+            doc = self._discovery()
+            if doc is not None:
+                service = build_from_document(doc, credentials=self.credentials)
+            else:
+                service = build('calendar', 'v3', credentials=self.credentials, static_discovery=True,
+                                cache_discovery=False)
+            self._local.service = service
+        return service
+
+    async def run(self, fn: Callable[[Any], T]) -> T:
+        """Run `fn(service)` (typically `...execute()`) on a worker thread."""
+        return await asyncio.to_thread(lambda: fn(self.service()))
+
+    def execute_batch(self, make_requests: Callable[[Any], List[Any]],
+                      batch_size: int = CALENDAR_BATCH_SIZE) -> List[Tuple[Optional[Any], Optional[Exception]]]:
+        """
+        Execute the HttpRequests returned by `make_requests(service)` as batch HTTP requests of up to
+        `batch_size` calls each. Returns one (response, exception) pair per request, in order. A chunk
+        that fails as a whole only fails its own requests; earlier and later chunks keep their results.
+        """
+        service = self.service()
+        requests = make_requests(service)
+        results: List[Tuple[Optional[Any], Optional[Exception]]] = [(None, None)] * len(requests)
+
+        def callback(request_id, response, exception):
+            results[int(request_id)] = (response, exception)
+
+        for offset in range(0, len(requests), batch_size):
+            batch = service.new_batch_http_request(callback=callback)
+            chunk = range(offset, min(offset + batch_size, len(requests)))
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+            try:
+                batch.execute()
+            except Exception as e:
+                logger.error(f"Google Calendar batch of {len(chunk)} requests failed: {e}")
+                for index in chunk:
+                    if results[index] == (None, None):
+                        results[index] = (None, e)
+        return results
+
+    async def run_batch(self, make_requests: Callable[[Any], List[Any]],
+                        batch_size: int = CALENDAR_BATCH_SIZE) -> List[Tuple[Optional[Any], Optional[Exception]]]:
+        return await asyncio.to_thread(self.execute_batch, make_requests, batch_size)
+
+    def refresh_if_needed(self, margin: float = CALENDAR_REFRESH_MARGIN) -> bool:
+        creds = self.credentials
+        expiry = creds.expiry  # naive UTC
+        if expiry is not None and expiry - datetime.datetime.utcnow() > datetime.timedelta(seconds=margin):
+            return False
+        with self._lock:
+            creds.refresh(Request())
+            self._save(creds)
+        logger.info(f"Google Calendar credentials refreshed (valid until {creds.expiry})")
+        return True
+
+    async def refresh_loop(self, margin: float = CALENDAR_REFRESH_MARGIN):
+        """Keep the credentials refreshed ahead of expiry so requests never pay for a token refresh."""
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh_if_needed, margin)
+                expiry = self.credentials.expiry
+                remaining = (expiry - datetime.datetime.utcnow()).total_seconds() if expiry else 3600
+                await asyncio.sleep(max(60.0, remaining - margin))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Google Calendar credential refresh failed: {e}")
+                await asyncio.sleep(60)
+
+
+calendar = CalendarClient()
@@ -0,0 +1,156 @@
+"""
+Shared HTTP clients for provider APIs (Vapi) and our own FastAPI tool endpoints.
+
+One process-wide httpx.Client and one httpx.AsyncClient keep connections alive between requests
+(no TLS handshake per call), use HTTP/2 when the optional `h2` package is installed, and apply the
+same timeouts and retry policy everywhere. Use request()/arequest() instead of bare `requests`.
+
+Retries: connection failures and 429/503 are retried for every method (the server did not act on
+the request); 502/504 and read timeouts are only retried for idempotent methods, so a payment POST
+is never sent twice. Retry-After is honoured up to HTTP_MAX_BACKOFF, otherwise backoff is exponential. request()/arequest()
+are the only retry layer; the transports themselves do not retry.
+
+The async client is bound to the event loop that created it: open it with open_async_client() at
+the start of a process's loop (the dialer's run, the app lifespan) and close() / aclose() it on teardown.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+from loguru import logger
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", 0.5))  # first retry delay; doubles each attempt
+HTTP_MAX_BACKOFF = float(os.getenv("HTTP_MAX_BACKOFF", 30))  # cap on any retry delay, including Retry-After
+
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+ALWAYS_RETRY_STATUSES = {429, 503}
+IDEMPOTENT_RETRY_STATUSES = {502, 504}
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_async_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+
+_TIMEOUT = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+_LIMITS = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+
+
+def get_client() -> httpx.Client:
+    global _client
+    if _client is None or _client.is_closed:
+        with _lock:
+            if _client is None or _client.is_closed:
+                transport = httpx.HTTPTransport(http2=HTTP2_AVAILABLE, limits=_LIMITS)
+                _client = httpx.Client(transport=transport, timeout=_TIMEOUT)
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """The async client for the running event loop (a client's pooled connections cannot cross loops)."""
+    global _async_client, _async_client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+        with _lock:
+            if _async_client is None or _async_client.is_closed or _async_client_loop is not loop:
+                if _async_client is not None and not _async_client.is_closed:
+                    _close_abandoned(_async_client, _async_client_loop)
+                transport = httpx.AsyncHTTPTransport(http2=HTTP2_AVAILABLE, limits=_LIMITS)
+                _async_client = httpx.AsyncClient(transport=transport, timeout=_TIMEOUT)
+                _async_client_loop = loop
+    return _async_client
+
+
+def _close_abandoned(client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]):
+    """Close a client left behind by another event loop: on that loop if it still runs, else on this one."""
+    if loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        return
+    task = asyncio.get_running_loop().create_task(client.aclose())
+    task.add_done_callback(lambda t: t.cancelled() or not t.exception() or
+                           logger.warning(f"Closing an abandoned HTTP client failed: {t.exception()}"))
+
+
+async def open_async_client() -> httpx.AsyncClient:
+    return get_async_client()
+
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), HTTP_MAX_BACKOFF)
+    return min(HTTP_BACKOFF * (2 ** attempt), HTTP_MAX_BACKOFF)
+
+
+def _should_retry(method: str, response: Optional[httpx.Response], error: Optional[Exception]) -> bool:
+    idempotent = method.upper() in IDEMPOTENT_METHODS
+    if error is not None:
+        # Connect errors mean the request never reached the server
+        return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)) or (
+            idempotent and isinstance(error, httpx.TransportError))
+    if response.status_code in ALWAYS_RETRY_STATUSES:
+        return True
+    return idempotent and response.status_code in IDEMPOTENT_RETRY_STATUSES
+
+
+def request(method: str, url: str, max_retries: int = HTTP_MAX_RETRIES, **kwargs) -> httpx.Response:
+    client = get_client()
+    for attempt in range(max_retries + 1):
+        response, error = None, None
+        try:
+            response = client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            error = e
+        if attempt == max_retries or not _should_retry(method, response, error):
+            if error is not None:
+                raise error
+            return response
+        delay = _retry_delay(response, attempt)
+        logger.warning(f"{method} {url} failed ({error or response.status_code}); retrying in {delay:.1f}s")
+        time.sleep(delay)
+
+
+async def arequest(method: str, url: str, max_retries: int = HTTP_MAX_RETRIES, **kwargs) -> httpx.Response:
+    client = get_async_client()
+    for attempt in range(max_retries + 1):
+        response, error = None, None
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError as e:
+            error = e
+        if attempt == max_retries or not _should_retry(method, response, error):
+            if error is not None:
+                raise error
+            return response
+        delay = _retry_delay(response, attempt)
+        logger.warning(f"{method} {url} failed ({error or response.status_code}); retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def close():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def aclose():
+    global _async_client, _async_client_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client, _async_client_loop = None, None
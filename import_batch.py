@@ -0,0 +1,124 @@
+"""
+Import a batch of facility spreadsheets in parallel.
+
+Each file is imported by import_excel.import_excel_to_db in its own worker process and its own
+transaction, so one bad file does not roll back the others.
+
+Usage:
+    python import_batch.py /data/facility_drop/
+    python import_batch.py "/data/facility_drop/**/*.xlsx" --workers 8 --max-db-connections 4
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List
+
+from loguru import logger
+
+SPREADSHEET_EXTENSIONS = (".xlsx", ".xlsm", ".csv")
+
+
+def collect_files(targets: List[str]) -> List[str]:
+    """Expand directories and glob patterns into a sorted, de-duplicated list of spreadsheet paths."""
+    files = set()
+    for target in targets:
+        if os.path.isdir(target):
+            for name in os.listdir(target):
+                if name.lower().endswith(SPREADSHEET_EXTENSIONS) and not name.startswith("~$"):
+                    files.add(os.path.join(target, name))
+        else:
+            files.update(path for path in glob.glob(target, recursive=True) if os.path.isfile(path))
+    return sorted(files)
+
+
+def _init_worker():
+    from db_pool import db_pool
+    # Each worker imports one file at a time and needs exactly one connection
+    db_pool.min_size = 1
+
+
+def _import_file(file_path: str) -> Dict[str, Any]:
+    from import_excel import import_excel_to_db
+
+    name = os.path.basename(file_path)
+
+    def progress(rows_copied: int, rows_per_sec: float):
+        logger.info(f"[{name}] copied {rows_copied} rows ({rows_per_sec:.0f} rows/sec)")
+
+    started_at = time.monotonic()
+    try:
+        summary = import_excel_to_db(file_path, progress=progress)
+        return {"file": file_path, "ok": True, **summary}
+    except Exception as e:
+        return {"file": file_path, "ok": False, "error": str(e), "seconds": round(time.monotonic() - started_at, 3)}
+
+
+def import_files(files: List[str], workers: int, max_db_connections: int) -> List[Dict[str, Any]]:
+    """
+    Import files across a process pool. Each worker holds one DB connection for the duration of
+    a file, so the pool size is capped at max_db_connections to bound load on Postgres.
+    """
+    pool_size = max(1, min(workers, max_db_connections, len(files)))
+    logger.info(f"Importing {len(files)} files with {pool_size} workers")
+    results = []
+    with ProcessPoolExecutor(max_workers=pool_size, initializer=_init_worker) as executor:
+        futures = {executor.submit(_import_file, path): path for path in files}
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if result["ok"]:
+                logger.success(
+                    f"{result['file']}: {result['rows']} rows in {result['seconds']}s "
+                    f"({result['inserted']} inserted, {result['updated']} updated, {result['unchanged']} unchanged)"
+                )
+            else:
+                logger.error(f"{result['file']}: failed - {result['error']}")
+    return results
+
+
+def log_summary(results: List[Dict[str, Any]], elapsed: float):
+    succeeded = [r for r in results if r["ok"]]
+    failed = [r for r in results if not r["ok"]]
+    rows = sum(r["rows"] for r in succeeded)
+    logger.info(
+        f"Batch import finished in {elapsed:.1f}s: {len(succeeded)} files ok, {len(failed)} failed, "
+        f"{rows} rows ({rows / elapsed if elapsed else 0:.0f} rows/sec overall), "
+        f"{sum(r['inserted'] for r in succeeded)} inserted, {sum(r['updated'] for r in succeeded)} updated, "
+        f"{sum(r['unchanged'] for r in succeeded)} unchanged, {sum(r['skipped'] for r in succeeded)} skipped"
+    )
+    for r in failed:
+        logger.error(f"  {r['file']}: {r['error']}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import facility spreadsheets into patients in parallel")
+    parser.add_argument("targets", nargs="+", help="Directories, files or glob patterns")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Worker processes")
+    parser.add_argument("--max-db-connections", type=int, default=int(os.getenv("IMPORT_MAX_DB_CONNECTIONS", 8)),
+                        help="Upper bound on files being written to Postgres at once")
+    args = parser.parse_args(argv)
+
+    files = collect_files(args.targets)
+    if not files:
+        logger.error(f"No spreadsheets found in {args.targets}")
+        return 1
+
+    from db_pool import db_pool
+    from import_excel import ensure_content_hash_column
+    # Run the schema check once up front; workers then never touch DDL. Close the parent's pool
+    # before forking so no connection is shared with the workers.
+    ensure_content_hash_column()
+    db_pool.close()
+
+    started_at = time.monotonic()
+    results = import_files(files, args.workers, args.max_db_connections)
+    log_summary(results, time.monotonic() - started_at)
+    return 0 if all(r["ok"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,65 +1,281 @@
 # Updated on July 1, 2025
 # This is updated code for excel proxy import part of poc
 
+import csv
+import datetime
+import hashlib
+import io
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import pandas as pd
-import psycopg2
+from openpyxl import load_workbook
 from loguru import logger
 from dotenv import load_dotenv
-import os
+from db_pool import db_pool, PATIENT_CHANGED_CHANNEL, PATIENT_CHANGED_MAX_PAYLOAD
 
 load_dotenv()
 
-db_config = {
-    "dbname": os.getenv("DB_NAME", "debt_collection"),
-    "user": os.getenv("DB_USER", "user"),
-    "password": os.getenv("DB_PASSWORD", "password"),
-    "host": os.getenv("DB_HOST", "localhost")
+# Spreadsheet column -> patients column, in COPY order
+COLUMN_MAP = {
+    "Resident ID": "resident_id",
+    "Resident First Name": "resident_first_name",
+    "Resident Last Name": "resident_last_name",
+    "Contact First Name": "contact_first_name",
+    "Contact Last Name": "contact_last_name",
+    "Contact Number": "contact_number",
+    "Date of Birth": "date_of_birth",
+    "Total": "balance",
+    "As Of Date": "due_date",
+    "Facility Name": "facility_name",
+    "Facility Code": "facility_code",
+    "Payer Desc": "payer_desc"
 }
+PATIENT_COLUMNS = list(COLUMN_MAP.values())
+DATE_COLUMNS = {"date_of_birth", "due_date"}
+COPY_BATCH_SIZE = 10000
+# Imports changing more residents than this notify "everything changed" (one full reload beats many lookups)
+IMPORT_NOTIFY_MAX_IDS = int(os.getenv("IMPORT_NOTIFY_MAX_IDS", 5000))
+
+ProgressCallback = Callable[[int, float], None]
+
+_content_hash_column_ready = False
+
+
+def _clean_value(column: str, value: Any) -> Any:
+    if value is None or value == "" or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if column == "contact_number":
+        return str(value)
+    if column in DATE_COLUMNS and isinstance(value, (datetime.datetime, datetime.date)):
+        return value.date().isoformat() if isinstance(value, datetime.datetime) else value.isoformat()
+    return value
+
+
+def _clean_row(values: Iterable[Any]) -> Tuple[Any, ...]:
+    return tuple(_clean_value(column, value) for column, value in zip(PATIENT_COLUMNS, values))
+
+
+def content_hash(row: Tuple[Any, ...]) -> str:
+    """Stable digest of a cleaned row, stored on patients.content_hash to detect unchanged rows."""
+    joined = "\x1f".join("" if v is None else str(v) for v in row)
+    return hashlib.blake2b(joined.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _column_positions(header: Iterable[Any], file_path: str) -> list:
+    header = [str(h).strip() if h is not None else "" for h in header]
+    missing = [column for column in COLUMN_MAP if column not in header]
+    if missing:
+        raise ValueError(f"{file_path} is missing required columns: {', '.join(missing)}")
+    return [header.index(column) for column in COLUMN_MAP]
+
+
+def _iter_xlsx_rows(file_path: str) -> Iterator[Tuple[Any, ...]]:
+    # read_only mode streams rows from the sheet XML instead of building the whole workbook in memory
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        positions = _column_positions(next(rows, ()), file_path)
+        for values in rows:
+            yield tuple(values[i] if i < len(values) else None for i in positions)
+    finally:
+        workbook.close()
+
+
+def _iter_csv_rows(file_path: str) -> Iterator[Tuple[Any, ...]]:
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        positions = _column_positions(next(reader, []), file_path)
+        for values in reader:
+            yield tuple(values[i] if i < len(values) else None for i in positions)
+
+
+def iter_spreadsheet_rows(file_path: str) -> Iterator[Tuple[Any, ...]]:
+    """Lazily yield raw rows (in COLUMN_MAP order) from an .xlsx/.xlsm or .csv file."""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in (".xlsx", ".xlsm"):
+        return _iter_xlsx_rows(file_path)
+    if extension == ".csv":
+        return _iter_csv_rows(file_path)
+    raise ValueError(f"Streaming import supports .xlsx, .xlsm and .csv files, not '{extension}'")
+
+
+def _validated_rows(raw_rows: Iterable[Tuple[Any, ...]], counts: Dict[str, int]) -> Iterator[Tuple[Any, ...]]:
+    # Blank rows (common at the end of exported sheets) and rows without a Resident ID cannot be upserted
+    for values in raw_rows:
+        row = _clean_row(values)
+        if row[0] is None:
+            counts["skipped"] += 1
+            continue
+        yield row
+
+
+def _copy_batch(cur, rows: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Empty unquoted fields are NULL in COPY's csv format
+    writer.writerows(["" if v is None else v for v in row] + [content_hash(row)] for row in rows)
+    buffer.seek(0)
+    cur.copy_expert(
+        f"COPY patients_staging ({', '.join(PATIENT_COLUMNS)}, content_hash) FROM STDIN WITH (FORMAT csv)",
+        buffer
+    )
+
+
+def _merge_staging(cur) -> Dict[str, Any]:
+    # DISTINCT ON keeps the last occurrence of a resident_id, matching the old row-by-row upsert order.
+    # Rows whose content_hash matches the stored one are left untouched (no WAL, no index churn).
+    columns = PATIENT_COLUMNS + ["content_hash"]
+    updates = ",\n                ".join(f"{c} = EXCLUDED.{c}" for c in columns if c != "resident_id")
+    cur.execute(f"""
+        WITH latest AS (
+            SELECT DISTINCT ON (resident_id) {', '.join(columns)}
+            FROM patients_staging
+            ORDER BY resident_id, row_num DESC
+        ), upserted AS (
+            INSERT INTO patients ({', '.join(columns)})
+            SELECT {', '.join(columns)} FROM latest
+            ON CONFLICT (resident_id) DO UPDATE SET
+                {updates}
+            WHERE patients.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+            RETURNING resident_id, (xmax = 0) AS inserted
+        )
+        SELECT
+            (SELECT count(*) FROM latest) AS total,
+            count(*) FILTER (WHERE inserted) AS inserted,
+            count(*) FILTER (WHERE NOT inserted) AS updated,
+            CASE WHEN count(*) <= %s THEN array_agg(resident_id::text) END AS changed_ids
+        FROM upserted
+    """, (IMPORT_NOTIFY_MAX_IDS,))
+    row = cur.fetchone()
+    return {
+        "inserted": row["inserted"],
+        "updated": row["updated"],
+        "unchanged": row["total"] - row["inserted"] - row["updated"],
+        "changed_ids": row["changed_ids"]
+    }
+
+
+def _notify_patients_changed(cur, resident_ids: Optional[List[str]]):
+    """
+    NOTIFY the changed resident_ids in as few payloads as fit (delivered on commit), or an empty payload
+    ("everything changed") when there are too many to list.
+    """
+    if resident_ids is None:
+        cur.execute("SELECT pg_notify(%s, '')", (PATIENT_CHANGED_CHANNEL,))
+        return
+    payload = []
+    size = 0
+    for resident_id in resident_ids:
+        length = len(resident_id.encode()) + 1
+        if payload and size + length > PATIENT_CHANGED_MAX_PAYLOAD:
+            cur.execute("SELECT pg_notify(%s, %s)", (PATIENT_CHANGED_CHANNEL, "\n".join(payload)))
+            payload, size = [], 0
+        payload.append(resident_id)
+        size += length
+    if payload:
+        cur.execute("SELECT pg_notify(%s, %s)", (PATIENT_CHANGED_CHANNEL, "\n".join(payload)))
+
+
+def ensure_content_hash_column():
+    """
+    One-time migration adding patients.content_hash. It runs in its own short transaction, never
+    inside an import, and only takes the ALTER TABLE lock when the column is actually missing.
+    """
+    global _content_hash_column_ready
+    if _content_hash_column_ready:
+        return
+    with db_pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'patients' AND column_name = 'content_hash'
+        """)
+        if cur.fetchone() is None:
+            cur.execute("ALTER TABLE patients ADD COLUMN IF NOT EXISTS content_hash TEXT")
+            logger.info("Added patients.content_hash")
+    _content_hash_column_ready = True
+
+
+def bulk_upsert_patients(rows: Iterable[Tuple[Any, ...]], progress: Optional[ProgressCallback] = None,
+                         batch_size: int = COPY_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Stream patient rows (tuples in PATIENT_COLUMNS order) into a temp staging table with
+    COPY FROM STDIN, then merge them into patients with one set-based upsert.
+    `progress(rows_copied, rows_per_sec)` is called after every COPY batch.
+    """
+    ensure_content_hash_column()
+    started_at = time.monotonic()
+    copied = 0
+    with db_pool.connection() as conn, conn.cursor() as cur:
+        cur.execute("SET LOCAL statement_timeout = 0")
+        cur.execute(f"""
+            CREATE TEMP TABLE patients_staging ON COMMIT DROP AS
+            SELECT {', '.join(PATIENT_COLUMNS)}, content_hash FROM patients WITH NO DATA
+        """)
+        cur.execute("ALTER TABLE patients_staging ADD COLUMN row_num BIGSERIAL")
+
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _copy_batch(cur, batch)
+                copied += len(batch)
+                batch = []
+                if progress:
+                    progress(copied, copied / (time.monotonic() - started_at))
+        if batch:
+            _copy_batch(cur, batch)
+            copied += len(batch)
+            if progress:
+                progress(copied, copied / (time.monotonic() - started_at))
+
+        merged = _merge_staging(cur)
+        changed_ids = merged.pop("changed_ids")
+        if merged["inserted"] or merged["updated"]:
+            # Imports run out of process, so tell the API workers which patient records to reload
+            _notify_patients_changed(cur, changed_ids)
+
+    elapsed = time.monotonic() - started_at
+    return {
+        "rows": copied,
+        **merged,
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(copied / elapsed, 1) if elapsed else 0.0
+    }
+
+
+def _log_progress(rows_copied: int, rows_per_sec: float):
+    logger.info(f"Copied {rows_copied} rows ({rows_per_sec:.0f} rows/sec)")
+
+
+def import_excel_to_db(file_path: str, progress: Optional[ProgressCallback] = _log_progress,
+                       streaming: bool = True, chunk_size: int = COPY_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Import a facility spreadsheet into patients.
 
-def import_excel_to_db(file_path: str):
+    With streaming=True (the default) .xlsx/.csv files are read row by row and copied in
+    chunk_size batches, so memory stays flat regardless of file size. streaming=False loads
+    the whole sheet with pandas, which is also the only option for legacy .xls files.
+    """
     try:
-        df = pd.read_excel(file_path)
-        conn = psycopg2.connect(**db_config)
-        cur = conn.cursor()
-        for _, row in df.iterrows():
-            cur.execute("""
-                INSERT INTO patients (
-                    resident_id, resident_first_name, resident_last_name, contact_first_name, contact_last_name,
-                    contact_number, date_of_birth, balance, due_date, facility_name, facility_code, payer_desc
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (resident_id) DO UPDATE SET
-                    resident_first_name = EXCLUDED.resident_first_name,
-                    resident_last_name = EXCLUDED.resident_last_name,
-                    contact_first_name = EXCLUDED.contact_first_name,
-                    contact_last_name = EXCLUDED.contact_last_name,
-                    contact_number = EXCLUDED.contact_number,
-                    date_of_birth = EXCLUDED.date_of_birth,
-                    balance = EXCLUDED.balance,
-                    due_date = EXCLUDED.due_date,
-                    facility_name = EXCLUDED.facility_name,
-                    facility_code = EXCLUDED.facility_code,
-                    payer_desc = EXCLUDED.payer_desc
-            """, (
-                row["Resident ID"],
-                row["Resident First Name"],
-                row["Resident Last Name"],
-                row["Contact First Name"],
-                row["Contact Last Name"],
-                str(row["Contact Number"]),
-                row["Date of Birth"] if pd.notna(row["Date of Birth"]) else None,
-                row["Total"],
-                row["As Of Date"],
-                row["Facility Name"],
-                row["Facility Code"],
-                row["Payer Desc"]
-            ))
-        conn.commit()
-        cur.close()
-        conn.close()
-        logger.info("Excel data imported successfully")
+        counts = {"skipped": 0}
+        if streaming:
+            raw_rows = iter_spreadsheet_rows(file_path)
+        else:
+            df = pd.read_excel(file_path)
+            raw_rows = df[list(COLUMN_MAP)].itertuples(index=False, name=None)
+        summary = bulk_upsert_patients(_validated_rows(raw_rows, counts), progress=progress, batch_size=chunk_size)
+        summary["skipped"] = counts["skipped"]
+        logger.info(
+            f"Excel data imported successfully: {summary['rows']} rows in {summary['seconds']}s "
+            f"({summary['rows_per_sec']} rows/sec): {summary['inserted']} inserted, "
+            f"{summary['updated']} updated, {summary['unchanged']} unchanged, {summary['skipped']} skipped"
+        )
+        return summary
     except Exception as e:
         logger.error(f"Excel import failed: {e}")
         raise
 
 if __name__ == "__main__":
-    import_excel_to_db("patients.xlsx")
\ No newline at end of file
+    import_excel_to_db("patients.xlsx")
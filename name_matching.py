@@ -0,0 +1,53 @@
+"""
+Name similarity scoring backed by rapidfuzz (C++), shared by the single verification endpoint
+and batch data-quality sweeps.
+
+Scores are on the same 0-100 scale as fuzzywuzzy's fuzz.ratio.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process, utils
+
+NAME_MATCH_THRESHOLD = 75
+
+
+def _prepare(names: Sequence[Optional[str]]) -> List[str]:
+    return [(name or "").strip().lower() for name in names]
+
+
+def name_score(provided: Optional[str], stored: Optional[str]) -> int:
+    provided, stored = _prepare([provided, stored])
+    if not provided or not stored:
+        return 0
+    return round(fuzz.ratio(provided, stored))
+
+
+def score_matrix(provided: Sequence[Optional[str]], stored: Sequence[Optional[str]], workers: int = -1) -> np.ndarray:
+    """Every provided name against every stored name: a len(provided) x len(stored) uint8 matrix."""
+    return process.cdist(_prepare(provided), _prepare(stored), scorer=fuzz.ratio,
+                         dtype=np.uint8, workers=workers)
+
+
+def score_pairs(provided: Sequence[Optional[str]], stored: Sequence[Optional[str]], workers: int = -1) -> np.ndarray:
+    """Element-wise scores for aligned arrays (provided[i] vs stored[i]); empty names score 0."""
+    provided, stored = _prepare(provided), _prepare(stored)
+    scores = process.cpdist(provided, stored, scorer=fuzz.ratio, dtype=np.uint8, workers=workers)
+    empty = np.array([not a or not b for a, b in zip(provided, stored)], dtype=bool)
+    scores[empty] = 0
+    return scores
+
+
+def best_matches(name: str, choices: Sequence[str], limit: int = 5,
+                 score_cutoff: int = NAME_MATCH_THRESHOLD) -> List[Tuple[str, float, int]]:
+    """Top `limit` (choice, score, index) tuples for one name."""
+    return process.extract(name, choices, scorer=fuzz.ratio, processor=utils.default_process,
+                           limit=limit, score_cutoff=score_cutoff)
+
+
+def is_name_match(fname_score: int, lname_score: int, stored_fname: Optional[str], stored_lname: Optional[str]) -> bool:
+    # Either name matching is enough; a patient with no stored names cannot fail the name check
+    if not (stored_fname or "").strip() and not (stored_lname or "").strip():
+        return True
+    return fname_score >= NAME_MATCH_THRESHOLD or lname_score >= NAME_MATCH_THRESHOLD
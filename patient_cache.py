@@ -0,0 +1,177 @@
+"""
+In-process TTL/LRU cache of the patient projection used by /verify_resident_tool.
+
+Entries are evicted locally on writes and, across processes, through Postgres NOTIFY on
+PATIENT_CHANGED_CHANNEL (payload = newline-separated resident_ids, e.g. the rows an import changed,
+or empty to drop everything).
+A row loaded on a miss is only stored if no invalidation arrived while it was being read, so a
+read that raced an update cannot put the old row back into the cache.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg
+from loguru import logger
+
+import repository
+import pronunciation
+from db_pool import db_config, PATIENT_CHANGED_CHANNEL
+
+PATIENT_CACHE_TTL = float(os.getenv("PATIENT_CACHE_TTL", 300))
+PATIENT_CACHE_MAX_SIZE = int(os.getenv("PATIENT_CACHE_MAX_SIZE", 10000))
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped by every invalidate()/clear(); set_if_current() refuses values read before a bump
+        self.generation = 0
+        self.stale_writes = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _store(self, key: str, value: Any):
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._store(key, value)
+
+    def set_if_current(self, key: str, value: Any, generation: int) -> bool:
+        """Store `value` only if nothing was invalidated since `generation` was read."""
+        with self._lock:
+            if generation != self.generation:
+                self.stale_writes += 1
+                return False
+            self._store(key, value)
+            return True
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self.generation += 1
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_writes": self.stale_writes
+            }
+
+
+verification_cache = TTLCache(PATIENT_CACHE_MAX_SIZE, PATIENT_CACHE_TTL)
+
+# Other in-memory views of patients (e.g. caller_index) subscribe here with the changed resident_ids;
+# None means "reload everything"
+_change_callbacks: List[Callable[[Optional[List[str]]], None]] = []
+
+
+def on_patient_changed(callback: Callable[[Optional[List[str]]], None]):
+    _change_callbacks.append(callback)
+
+
+def _notify_callbacks(resident_ids: Optional[List[str]]):
+    for callback in _change_callbacks:
+        try:
+            callback(resident_ids)
+        except Exception as e:
+            logger.error(f"Patient change callback failed: {e}")
+
+
+async def get_patient_for_verification(resident_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Cached wrapper around repository.get_patient_for_verification. Misses are not cached.
+    Spoken forms of due_date and balance are rendered once here, when the row is loaded.
+    """
+    patient = verification_cache.get(resident_id)
+    if patient is not None:
+        return patient
+    generation = verification_cache.generation
+    patient = await repository.get_patient_for_verification(resident_id)
+    if patient is not None:
+        patient["due_date_pronunciation"] = pronunciation.spoken_date(patient["due_date"])
+        patient["balance_pronunciation"] = pronunciation.spoken_amount(patient["balance"])
+        verification_cache.set_if_current(resident_id, patient, generation)
+    return patient
+
+
+def invalidate(resident_id: Optional[str] = None):
+    if resident_id:
+        verification_cache.invalidate(resident_id)
+    else:
+        verification_cache.clear()
+
+
+async def listen_for_invalidations():
+    """
+    Long-running task: LISTEN on PATIENT_CHANGED_CHANNEL, evict cache entries and notify subscribers.
+    Reconnects on failure; the cache is cleared on every (re)connect since notifications may have been missed.
+    """
+    reconnecting = False
+    while True:
+        try:
+            conn = await psycopg.AsyncConnection.connect(**db_config, autocommit=True)
+            async with conn:
+                await conn.execute(f"LISTEN {PATIENT_CHANGED_CHANNEL}")
+                verification_cache.clear()
+                if reconnecting:
+                    _notify_callbacks(None)
+                reconnecting = True
+                logger.info(f"Listening for patient cache invalidations on '{PATIENT_CHANGED_CHANNEL}'")
+                async for notify in conn.notifies():
+                    resident_ids = notify.payload.split("\n") if notify.payload else None
+                    if resident_ids is None:
+                        invalidate()
+                    for resident_id in resident_ids or ():
+                        invalidate(resident_id)
+                    _notify_callbacks(resident_ids)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Patient cache invalidation listener failed: {e}")
+            verification_cache.clear()
+            await asyncio.sleep(5)
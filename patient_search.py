@@ -0,0 +1,81 @@
+"""
+Index-backed patient search for /lookup_patient.
+
+Name filters use pg_trgm similarity against GIN expression indexes on the concatenated
+resident/contact names, DOB uses a B-tree on date_of_birth, and results are ranked by score.
+"""
+
+import datetime
+import os
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+import repository
+
+LOOKUP_SIMILARITY_THRESHOLD = float(os.getenv("LOOKUP_SIMILARITY_THRESHOLD", 0.3))
+
+RESIDENT_NAME_EXPR = "(resident_first_name || ' ' || resident_last_name)"
+CONTACT_NAME_EXPR = "(contact_first_name || ' ' || contact_last_name)"
+
+SEARCH_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS patients_resident_name_trgm_idx "
+    f"ON patients USING gin ({RESIDENT_NAME_EXPR} gin_trgm_ops)",
+    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS patients_contact_name_trgm_idx "
+    f"ON patients USING gin ({CONTACT_NAME_EXPR} gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS patients_date_of_birth_idx ON patients (date_of_birth)"
+]
+
+
+async def ensure_search_indexes():
+    """
+    Create the pg_trgm extension and search indexes if missing, rebuilding any index a previous
+    concurrent build left INVALID. Raises on failure: the similarity operators need pg_trgm.
+    """
+    await repository.apply_ddl(SEARCH_INDEX_DDL)
+    logger.info("Patient search indexes are in place")
+
+
+async def search_patients(resident_id: Optional[str] = None, resident_name: Optional[str] = None,
+                          date_of_birth: Optional[datetime.date] = None, contact_name: Optional[str] = None,
+                          limit: int = 5) -> List[Dict[str, Any]]:
+    """
+    Return up to `limit` candidates ranked by name similarity (0-1).
+    Only the provided filters are added to the WHERE clause so the planner can use each index.
+    """
+    conditions = []
+    scores = []
+    params: Dict[str, Any] = {"limit": limit}
+    if resident_id:
+        conditions.append("resident_id = %(resident_id)s")
+        params["resident_id"] = resident_id
+    if date_of_birth:
+        conditions.append("date_of_birth = %(date_of_birth)s")
+        params["date_of_birth"] = date_of_birth
+    if resident_name:
+        conditions.append(f"{RESIDENT_NAME_EXPR} %% %(resident_name)s")
+        scores.append(f"similarity({RESIDENT_NAME_EXPR}, %(resident_name)s)")
+        params["resident_name"] = resident_name
+    if contact_name:
+        conditions.append(f"{CONTACT_NAME_EXPR} %% %(contact_name)s")
+        scores.append(f"similarity({CONTACT_NAME_EXPR}, %(contact_name)s)")
+        params["contact_name"] = contact_name
+    if not conditions:
+        return []
+
+    score_expr = f"({' + '.join(scores)}) / {len(scores)}" if scores else "1.0"
+    query = f"""
+        SELECT resident_id, resident_first_name, resident_last_name, contact_first_name, contact_last_name, contact_number,
+               balance, due_date, facility_name, facility_code, payer_desc,
+               {score_expr} AS score
+        FROM patients
+        WHERE {' AND '.join(conditions)}
+        ORDER BY score DESC, resident_id
+        LIMIT %(limit)s
+    """
+    async with repository.connection() as conn:
+        await conn.execute("SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+                           (str(LOOKUP_SIMILARITY_THRESHOLD),))
+        cur = await conn.execute(query, params)
+        return await cur.fetchall()
@@ -0,0 +1,57 @@
+"""
+Spoken renderings of dates and dollar amounts for the voice agent.
+
+Day ordinals, month names and years in YEAR_RANGE are rendered once at import time, so
+formatting a due date on the request path is a few table lookups instead of inflect calls.
+"""
+
+import datetime
+from decimal import Decimal, ROUND_HALF_UP
+from functools import lru_cache
+from typing import Optional, Union
+
+import inflect
+
+YEAR_RANGE = range(1900, 2101)
+
+_engine = inflect.engine()
+
+
+def _words(number: Union[int, str]) -> str:
+    return _engine.number_to_words(number).replace("-", " ")
+
+
+_DAY_WORDS = {day: _words(_engine.ordinal(day)) for day in range(1, 32)}
+_MONTH_NAMES = {month: datetime.date(2000, month, 1).strftime("%B") for month in range(1, 13)}
+_YEAR_WORDS = {year: _words(year) for year in YEAR_RANGE}
+
+
+@lru_cache(maxsize=256)
+def _year_words(year: int) -> str:
+    return _YEAR_WORDS.get(year) or _words(year)
+
+
+def spoken_date(value: Optional[datetime.date]) -> str:
+    """e.g. date(2025, 5, 31) -> 'thirty first May, two thousand and twenty five'."""
+    if not value:
+        return ""
+    return f"{_DAY_WORDS[value.day]} {_MONTH_NAMES[value.month]}, {_year_words(value.year)}"
+
+
+@lru_cache(maxsize=4096)
+def _spoken_cents(cents: int) -> str:
+    dollars, cents = divmod(cents, 100)
+    spoken = f"{_words(dollars)} {'dollar' if dollars == 1 else 'dollars'}"
+    if cents:
+        spoken += f" and {_words(cents)} {'cent' if cents == 1 else 'cents'}"
+    return spoken
+
+
+def spoken_amount(amount: Optional[Union[Decimal, float, int]]) -> str:
+    """e.g. 40.26 -> 'forty dollars and twenty six cents'."""
+    if amount is None:
+        return ""
+    cents = int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    if cents < 0:
+        return f"minus {_spoken_cents(-cents)}"
+    return _spoken_cents(cents)
@@ -0,0 +1,162 @@
+"""
+Token-bucket rate limiting for outbound provider API calls (Retell, Vapi, Twilio).
+
+Each provider has a global bucket plus one bucket per from-number. Buckets live in a small SQLite
+file so every worker process (uvicorn workers, the dialer, import jobs) draws from the same tokens.
+A request that finds the bucket empty reserves the next token anyway and sleeps until it is due,
+so excess requests queue in arrival order instead of failing with a provider 429.
+
+A request takes its provider-wide and per-number tokens in one SQLite transaction, so a request
+refused by either bucket consumes neither.
+
+Limits are "rate/burst" strings, e.g. RATE_LIMIT_RETELL="5/10" (5 requests per second, bursts of
+10) and RATE_LIMIT_RETELL_PER_NUMBER="1/1". Wait statistics are kept in the same store; see stats().
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app_data import data_path
+
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB") or data_path("rate_limits.sqlite3")
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 300))  # seconds a request may queue before giving up
+RATE_LIMIT_LOG_WAIT = float(os.getenv("RATE_LIMIT_LOG_WAIT", 1.0))  # log waits longer than this
+
+DEFAULT_LIMITS = {
+    "retell": "5/10",
+    "retell_per_number": "1/1",
+    "vapi": "5/10",
+    "vapi_per_number": "1/1",
+    "twilio": "10/20",
+    "twilio_per_number": "1/1",  # long-code SMS throughput
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a request would have to queue longer than the allowed maximum wait."""
+
+
+def _parse_limit(value: str) -> Tuple[float, float]:
+    rate, _, burst = value.partition("/")
+    return float(rate), float(burst or rate)
+
+
+def _limit(name: str) -> Tuple[float, float]:
+    return _parse_limit(os.getenv(f"RATE_LIMIT_{name.upper()}", DEFAULT_LIMITS[name]))
+
+
+class TokenBucketStore:
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    requests INTEGER NOT NULL DEFAULT 0,
+                    waited INTEGER NOT NULL DEFAULT 0,
+                    total_wait REAL NOT NULL DEFAULT 0,
+                    max_wait REAL NOT NULL DEFAULT 0
+                )
+            """)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def reserve(self, buckets: List[Tuple[str, float, float]], max_wait: Optional[float] = None) -> float:
+        """
+        Take one token from each (key, rate, capacity) bucket, going into debt if a bucket is empty.
+        Returns how many seconds the caller must sleep before using them (the reservations run
+        concurrently in wall-clock time, so the longest wait wins). Raises RateLimitExceeded, reserving
+        nothing from any bucket, if that exceeds max_wait.
+        """
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            updates = []
+            for key, rate, capacity in buckets:
+                row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                tokens -= 1
+                wait = max(0.0, -tokens / rate)
+                if max_wait is not None and wait > max_wait:
+                    conn.execute("ROLLBACK")
+                    raise RateLimitExceeded(f"{key}: would wait {wait:.1f}s (max {max_wait:.1f}s)")
+                updates.append((key, tokens, now, int(wait > 0), wait, wait))
+            conn.executemany("""
+                INSERT INTO buckets (key, tokens, updated_at, requests, waited, total_wait, max_wait)
+                VALUES (?, ?, ?, 1, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = excluded.tokens,
+                    updated_at = excluded.updated_at,
+                    requests = requests + 1,
+                    waited = waited + excluded.waited,
+                    total_wait = total_wait + excluded.total_wait,
+                    max_wait = MAX(max_wait, excluded.max_wait)
+            """, updates)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return max((update[4] for update in updates), default=0.0)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        rows = self._connection().execute(
+            "SELECT key, tokens, requests, waited, total_wait, max_wait FROM buckets ORDER BY key"
+        ).fetchall()
+        return {
+            key: {
+                "tokens": round(tokens, 2),
+                "requests": requests,
+                "waited": waited,
+                "avg_wait_seconds": round(total_wait / requests, 3) if requests else 0.0,
+                "max_wait_seconds": round(max_wait, 3)
+            }
+            for key, tokens, requests, waited, total_wait, max_wait in rows
+        }
+
+
+store = TokenBucketStore()
+
+
+def _reserve(provider: str, from_number: Optional[str], max_wait: float) -> float:
+    buckets = [(provider, *_limit(provider))]
+    if from_number:
+        buckets.append((f"{provider}:{from_number}", *_limit(f"{provider}_per_number")))
+    wait = store.reserve(buckets, max_wait)
+    if wait >= RATE_LIMIT_LOG_WAIT:
+        logger.info(f"Rate limit: queued {provider} request from {from_number or '-'} for {wait:.1f}s")
+    return wait
+
+
+def throttle(provider: str, from_number: Optional[str] = None, max_wait: float = RATE_LIMIT_MAX_WAIT) -> float:
+    """Block until `provider` (and `from_number`, if given) may be called. Returns the seconds waited."""
+    wait = _reserve(provider, from_number, max_wait)
+    if wait > 0:
+        time.sleep(wait)
+    return wait
+
+
+async def throttle_async(provider: str, from_number: Optional[str] = None, max_wait: float = RATE_LIMIT_MAX_WAIT) -> float:
+    wait = await asyncio.to_thread(_reserve, provider, from_number, max_wait)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    return wait
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    return store.stats()
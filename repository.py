@@ -0,0 +1,271 @@
+"""
+Async PostgreSQL data access for the FastAPI handlers.
+
+Uses a psycopg 3 AsyncConnectionPool so queries never block the event loop, and keeps the
+same %s / %(name)s placeholders and dict rows the psycopg2 code used.
+"""
+
+import datetime
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from loguru import logger
+
+from db_pool import (
+    db_config,
+    DB_POOL_MIN_SIZE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_TIMEOUT,
+    DB_STATEMENT_TIMEOUT_MS
+)
+
+_pool: Optional[AsyncConnectionPool] = None
+_stats = {
+    "checkouts": 0,
+    "wait_time_total": 0.0,
+    "wait_time_max": 0.0,
+    "checkout_time_total": 0.0,
+    "checkout_time_max": 0.0
+}
+
+
+async def open_pool():
+    global _pool
+    if _pool is not None:
+        return
+    _pool = AsyncConnectionPool(
+        conninfo="",
+        kwargs={
+            **db_config,
+            "row_factory": dict_row,
+            "options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+        },
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=DB_POOL_TIMEOUT,
+        check=AsyncConnectionPool.check_connection,
+        open=False
+    )
+    await _pool.open()
+    logger.info(f"Async database pool opened (min={DB_POOL_MIN_SIZE}, max={DB_POOL_MAX_SIZE})")
+
+
+async def close_pool():
+    global _pool
+    if _pool is None:
+        return
+    await _pool.close()
+    _pool = None
+    logger.info("Async database pool closed")
+
+
+@asynccontextmanager
+async def connection() -> AsyncIterator[Any]:
+    """
+    Borrow a pooled async connection.
+    The transaction is committed on success and rolled back on error.
+    """
+    if _pool is None:
+        await open_pool()
+    requested_at = time.monotonic()
+    async with _pool.connection() as conn:
+        acquired_at = time.monotonic()
+        try:
+            yield conn
+        finally:
+            wait_time = acquired_at - requested_at
+            checkout_time = time.monotonic() - acquired_at
+            _stats["checkouts"] += 1
+            _stats["wait_time_total"] += wait_time
+            _stats["wait_time_max"] = max(_stats["wait_time_max"], wait_time)
+            _stats["checkout_time_total"] += checkout_time
+            _stats["checkout_time_max"] = max(_stats["checkout_time_max"], checkout_time)
+
+
+async def fetch_one(query: str, params: Any = None) -> Optional[Dict[str, Any]]:
+    async with connection() as conn:
+        cur = await conn.execute(query, params)
+        return await cur.fetchone()
+
+
+async def fetch_all(query: str, params: Any = None) -> List[Dict[str, Any]]:
+    async with connection() as conn:
+        cur = await conn.execute(query, params)
+        return await cur.fetchall()
+
+
+def pool_stats() -> Dict[str, Any]:
+    checkouts = _stats["checkouts"]
+    stats = {
+        "min_size": DB_POOL_MIN_SIZE,
+        "max_size": DB_POOL_MAX_SIZE,
+        "checkouts": checkouts,
+        "wait_ms_avg": round(_stats["wait_time_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+        "wait_ms_max": round(_stats["wait_time_max"] * 1000, 3),
+        "checkout_ms_avg": round(_stats["checkout_time_total"] / checkouts * 1000, 3) if checkouts else 0.0,
+        "checkout_ms_max": round(_stats["checkout_time_max"] * 1000, 3)
+    }
+    if _pool is not None:
+        stats["pool"] = _pool.get_stats()
+    return stats
+
+
+_CONCURRENT_INDEX = re.compile(r"CREATE (?:UNIQUE )?INDEX CONCURRENTLY IF NOT EXISTS (\w+)", re.IGNORECASE)
+
+
+async def apply_ddl(statements: List[str]):
+    """
+    Run startup DDL on a dedicated autocommit connection (CREATE INDEX CONCURRENTLY cannot run in a
+    transaction). A failed concurrent build leaves an INVALID index that IF NOT EXISTS would skip
+    forever, so such an index is dropped and rebuilt. Errors propagate so startup fails loudly.
+    """
+    async with await psycopg.AsyncConnection.connect(**db_config, autocommit=True) as conn:
+        for statement in statements:
+            match = _CONCURRENT_INDEX.search(statement)
+            if match:
+                cur = await conn.execute("""
+                    SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                    WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+                """, (match.group(1),))
+                row = await cur.fetchone()
+                if row is not None and not row[0]:
+                    logger.warning(f"Index {match.group(1)} is INVALID (failed concurrent build); rebuilding it")
+                    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {match.group(1)}")
+            await conn.execute(statement)
+
+
+# Patients
+
+async def get_patient_for_verification(resident_id: str) -> Optional[Dict[str, Any]]:
+    return await fetch_one("""
+        SELECT resident_first_name, resident_last_name, date_of_birth,
+               balance, due_date, payer_desc, facility_name
+        FROM patients
+        WHERE resident_id = %s
+    """, (resident_id,))
+
+
+async def get_patients_by_ids(resident_ids: List[str]) -> List[Dict[str, Any]]:
+    return await fetch_all("""
+        SELECT resident_id, resident_first_name, resident_last_name, contact_first_name, contact_last_name, contact_number,
+               date_of_birth, balance, due_date, facility_name, facility_code, payer_desc
+        FROM patients
+        WHERE resident_id = ANY(%s)
+    """, (resident_ids,))
+
+
+# Writes
+
+async def insert_payment(resident_id: str, amount: float, payment_method: str) -> int:
+    async with connection() as conn:
+        cur = await conn.execute("""
+            INSERT INTO payments (resident_id, amount, payment_method, payment_date)
+            VALUES (%s, %s, %s, %s)
+            RETURNING payment_id
+        """, (resident_id, amount, payment_method, datetime.datetime.now()))
+        row = await cur.fetchone()
+    return row["payment_id"]
+
+
+async def insert_reminder(contact_name: str, reminder_type: str, schedule_time: str,
+                          resident_id: Optional[str] = None) -> int:
+    row = await fetch_one("""
+        INSERT INTO reminders (resident_id, contact_name, reminder_type, schedule_time, created_at)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING reminder_id
+    """, (resident_id, contact_name, reminder_type, schedule_time, datetime.datetime.now()))
+    return row["reminder_id"]
+
+
+async def insert_conversation_note(call_id: str, resident_id: str, notes: str, phi_data: Optional[str]) -> int:
+    row = await fetch_one("""
+        INSERT INTO conversation_notes (call_id, resident_id, notes, phi_data, created_at)
+        VALUES (%s, %s, %s, %s, %s)
+        RETURNING note_id
+    """, (call_id, resident_id, notes, phi_data, datetime.datetime.now()))
+    return row["note_id"]
+
+
+async def insert_appointment(call_id: Optional[str], resident_id: str, google_event_id: str,
+                             start_time: datetime.datetime, end_time: datetime.datetime,
+                             title: str, description: Optional[str]) -> int:
+    row = await fetch_one("""
+        INSERT INTO appointments (call_id, resident_id, google_event_id, start_time, end_time, title, description, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING appointment_id
+    """, (call_id, resident_id, google_event_id, start_time, end_time, title, description, datetime.datetime.now()))
+    return row["appointment_id"]
+
+
+async def insert_appointments(appointments: List[Tuple[Optional[str], str, str, datetime.datetime, datetime.datetime, str, Optional[str]]]) -> List[int]:
+    """
+    Insert many (call_id, resident_id, google_event_id, start_time, end_time, title, description) rows in one
+    transaction. Returns the new appointment ids in input order.
+    """
+    if not appointments:
+        return []
+    now = datetime.datetime.now()
+    ids = []
+    async with connection() as conn, conn.cursor() as cur:
+        await cur.executemany("""
+            INSERT INTO appointments (call_id, resident_id, google_event_id, start_time, end_time, title, description, created_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING appointment_id
+        """, [(*appointment, now) for appointment in appointments], returning=True)
+        while True:
+            ids.append((await cur.fetchone())["appointment_id"])
+            if not cur.nextset():
+                break
+    return ids
+
+
+async def insert_call_events(events: List[Tuple[str, str, str, Optional[str], datetime.datetime, Optional[str]]]) -> Set[str]:
+    """
+    Insert many (call_id, event_type, safe_data, phi_data, received_at, event_key) rows in one transaction.
+    Rows whose event_key already exists are skipped; returns the event keys that were actually inserted.
+    """
+    if not events:
+        return set()
+    inserted = set()
+    async with connection() as conn, conn.cursor() as cur:
+        await cur.executemany("""
+            INSERT INTO call_events (call_id, event_type, safe_data, phi_data, received_at, event_key)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (event_key) DO NOTHING
+            RETURNING event_key
+        """, events, returning=True)
+        while True:
+            row = await cur.fetchone()
+            if row:
+                inserted.add(row["event_key"])
+            if not cur.nextset():
+                break
+    return inserted
+
+
+# Dashboard reads
+
+async def recent_call_logs(limit: int = 100) -> List[Dict[str, Any]]:
+    return await fetch_all(
+        "SELECT call_id, phone, type, cost, created_at FROM call_logs ORDER BY created_at DESC LIMIT %s",
+        (limit,)
+    )
+
+
+async def recent_reminders(limit: int = 100) -> List[Dict[str, Any]]:
+    return await fetch_all(
+        "SELECT reminder_id, contact_name, reminder_type, schedule_time, created_at FROM reminders ORDER BY created_at DESC LIMIT %s",
+        (limit,)
+    )
+
+
+async def recent_payments(limit: int = 100) -> List[Dict[str, Any]]:
+    return await fetch_all(
+        "SELECT payment_id, resident_id, amount, payment_method, payment_date FROM payments ORDER BY payment_date DESC LIMIT %s",
+        (limit,)
+    )
@@ -1,24 +1,27 @@
 import os
-from retell import Retell
-import requests
-import datetime
+from retell import Retell, AsyncRetell
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 from loguru import logger
-import psycopg2
-from twilio.rest import Client
-import pytz
-from dateutil.parser import parse
+
+# Shared modules live at the repo root; run as `python -m retell_interface.debt_collector_call_agent_or_workflow`
+from dob_normalizer import normalize_dob
+from call_completion import poll_until_final
+import rate_limiter
+import tcpa
+from call_log_writer import call_log_writer
+from api_tools import ApiToolsMixin
 
 load_dotenv()
 
-class RetellDebtCollector:
+class RetellDebtCollector(ApiToolsMixin):
     def __init__(self):
         self.api_key = os.getenv("RETELL_API_KEY")
         self.from_number = os.getenv("RETELL_FROM_NUMBER")
         if not self.api_key or not self.from_number:
             raise ValueError("RETELL_API_KEY and RETELL_FROM_NUMBER must be set in .env")
         self.client = Retell(api_key=self.api_key)
+        self.async_client = AsyncRetell(api_key=self.api_key)
         self.twilio_sid = os.getenv("TWILIO_SID")
         self.twilio_auth_token = os.getenv("TWILIO_AUTH_TOKEN")
         self.twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
@@ -41,9 +44,39 @@ class RetellDebtCollector:
         self.api_url = "https://your-fastapi-domain.com"  # Replace with your FastAPI URL
 
     def is_tcp_compliant(self, phone: str) -> bool:
-        now = datetime.datetime.now(pytz.timezone("US/Mountain"))
-        hour = now.hour
-        return 8 <= hour < 21
+        return tcpa.is_allowed(phone)
+
+    def _phone_call_params(self, contact_name: str, contact_number: str, resident_id: str,
+                           facility_name: str, resident_fname: str, resident_lname: str,
+                           balance: float, due_date: str, payer_desc: str,
+                           agent_id: Optional[str] = None,
+                           workflow_id: Optional[str] = None,
+                           agent_version: Optional[int] = None) -> Dict[str, Any]:
+        dynamic_variables = {
+            "resident_id": str(resident_id),
+            "resident_name": f"{resident_fname} {resident_lname}",
+            "contact_name": contact_name,
+            "facility_name": facility_name,
+            "balance": str(balance),
+            "due_date": due_date,
+            "payer_desc": payer_desc
+        }
+        call_params = {
+            "from_number": self.from_number,
+            "to_number": contact_number,
+            "retell_llm_dynamic_variables": dynamic_variables
+        }
+
+        # Apply agent/workflow override if provided
+        if agent_id:
+            call_params["override_agent_id"] = agent_id
+            if agent_version:
+                call_params["override_agent_version"] = agent_version
+            logger.info(f"Using override agent: {agent_id}")
+        elif workflow_id:
+            call_params["override_workflow_id"] = workflow_id
+            logger.info(f"Using override workflow: {workflow_id}")
+        return call_params
 
     def make_outbound_call_with_agent(self, contact_name: str, contact_number: str, resident_id: str, 
                            facility_name: str, resident_fname: str, resident_lname: str, 
@@ -75,37 +108,41 @@ class RetellDebtCollector:
         #     logger.error("Call blocked: Not TCPA compliant")
         #     return {"status": 403, "error": "Not TCPA compliant"}
 
-        dynamic_variables = {
-            "resident_id": str(resident_id),
-            "resident_name": f"{resident_fname} {resident_lname}",
-            "contact_name": contact_name,
-            "facility_name": facility_name,
-            "balance": str(balance),
-            "due_date": due_date,
-            "payer_desc": payer_desc
-        }
-
         try:
-            call_params = {
-                "from_number": self.from_number,
-                "to_number": contact_number,
-                "retell_llm_dynamic_variables": dynamic_variables
-            }
-            
-            # Apply agent/workflow override if provided
-            if agent_id:
-                call_params["override_agent_id"] = agent_id
-                if agent_version:
-                    call_params["override_agent_version"] = agent_version
-                logger.info(f"Using override agent: {agent_id}")
-            elif workflow_id:
-                call_params["override_workflow_id"] = workflow_id
-                logger.info(f"Using override workflow: {workflow_id}")
-
+            call_params = self._phone_call_params(contact_name, contact_number, resident_id, facility_name,
+                                                  resident_fname, resident_lname, balance, due_date, payer_desc,
+                                                  agent_id, workflow_id, agent_version)
+            rate_limiter.throttle("retell", self.from_number)
             phone_call_response = self.client.call.create_phone_call(**call_params)
             call_id = phone_call_response.call_id
             logger.success(f"Call initiated: {call_id}")
             return {"status": 200, "call_id": call_id}
+        except rate_limiter.RateLimitExceeded as e:
+            logger.error(f"Call not placed: {e}")
+            return {"status": 429, "error": str(e)}
+        except Exception as e:
+            logger.error(f"Call initiation failed: {e}")
+            return {"status": 500, "error": str(e)}
+
+    async def make_outbound_call_with_agent_async(self, contact_name: str, contact_number: str, resident_id: str,
+                                                  facility_name: str, resident_fname: str, resident_lname: str,
+                                                  balance: float, due_date: str, payer_desc: str,
+                                                  agent_id: Optional[str] = None,
+                                                  workflow_id: Optional[str] = None,
+                                                  agent_version: Optional[int] = None) -> Dict[str, Any]:
+        """Async variant of make_outbound_call_with_agent."""
+        try:
+            call_params = self._phone_call_params(contact_name, contact_number, resident_id, facility_name,
+                                                  resident_fname, resident_lname, balance, due_date, payer_desc,
+                                                  agent_id, workflow_id, agent_version)
+            await rate_limiter.throttle_async("retell", self.from_number)
+            phone_call_response = await self.async_client.call.create_phone_call(**call_params)
+            call_id = phone_call_response.call_id
+            logger.success(f"Call initiated: {call_id}")
+            return {"status": 200, "call_id": call_id}
+        except rate_limiter.RateLimitExceeded as e:
+            logger.error(f"Call not placed: {e}")
+            return {"status": 429, "error": str(e)}
         except Exception as e:
             logger.error(f"Call initiation failed: {e}")
             return {"status": 500, "error": str(e)}
@@ -144,6 +181,29 @@ class RetellDebtCollector:
             logger.error(f"Failed to fetch call details: {e}")
             return None
 
+    async def get_call_details_async(self, call_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = await self.async_client.call.retrieve(call_id)
+            return {
+                "call_id": response.call_id,
+                "transcript": getattr(response, "transcript", None),
+                "call_analysis": getattr(response, "call_analysis", None),
+                "recording_url": getattr(response, "recording_url", None),
+                "call_cost": getattr(response, "call_cost", None)
+            }
+        except Exception as e:
+            logger.error(f"Failed to fetch call details: {e}")
+            return None
+
+    def get_call_status(self, call_id: str) -> Optional[str]:
+        """"completed"/"failed" once the call has ended, None while it is still running."""
+        try:
+            status = getattr(self.client.call.retrieve(call_id), "call_status", None)
+        except Exception as e:
+            logger.warning(f"Status check failed for {call_id}: {e}")
+            return None
+        return {"ended": "completed", "error": "failed"}.get(status)
+
     def get_transcript(self, call_data: Dict[str, Any]) -> Optional[str]:
         return call_data.get("transcript")
 
@@ -154,23 +214,13 @@ class RetellDebtCollector:
         return call_data.get("recording_url")
 
     def log_call_to_db(self, call_id: str, phone: str, cost: Optional[float], transcript: Optional[str]):
-        try:
-            conn = psycopg2.connect(**self.db_config)
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO call_logs (call_id, phone, type, cost, transcript, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (call_id, phone, "outbound", cost, transcript, datetime.datetime.now()))
-            conn.commit()
-            cur.close()
-            conn.close()
-            logger.success(f"Logged call to DB: {call_id}")
-        except Exception as e:
-            logger.error(f"DB logging failed: {e}")
+        # Buffered and written in batches by a background thread; never blocks the call flow
+        call_log_writer.write(call_id, phone, cost, transcript)
 
     def run_call_with_specific_agent(self, agent_id: Optional[str] = None, 
                                     workflow_id: Optional[str] = None,
                                     agent_version: Optional[int] = None,
+                                    wait_for_completion: bool = False,
                                     **call_params) -> Dict[str, Any]:
         """
         Run a complete call flow with a specific agent or workflow.
@@ -179,6 +229,9 @@ class RetellDebtCollector:
             agent_id: The specific agent ID to use for this call
             workflow_id: The specific workflow ID to use for this call
             agent_version: Optional agent version to use
+            wait_for_completion: Block until the call ends (polling with backoff) and return its
+                transcript. By default this returns as soon as the call is placed; the
+                /webhook/retell handler logs transcript and cost when Retell reports call_ended.
             **call_params: All other parameters needed for the call
                 (contact_fname, contact_lname, contact_name_pronunciation, 
                 contact_number, resident_fname, resident_lname, resident_id,
@@ -187,9 +240,8 @@ class RetellDebtCollector:
         Returns:
             Dict with call status and details
         """
-        try:
-            dob_date = parse(call_params.get("resident_dob", ""), fuzzy=True).strftime("%Y-%m-%d")
-        except (ValueError, TypeError):
+        dob_date = normalize_dob(call_params.get("resident_dob"))
+        if dob_date is None:
             logger.error(f"Invalid DOB format: {call_params.get('resident_dob')}")
             return {"status": 400, "error": "Invalid DOB format"}
         
@@ -215,9 +267,15 @@ class RetellDebtCollector:
             return result
 
         call_id = result["call_id"]
+        if not wait_for_completion:
+            logger.info(f"Call {call_id} placed; completion will be recorded from the call_ended webhook")
+            return {"status": 200, "call_id": call_id}
+
         logger.info("Waiting for call to complete...")
-        import time
-        time.sleep(10)  # Temporary polling for PoC
+        final_status = poll_until_final(lambda: self.get_call_status(call_id))
+        if final_status != "completed":
+            logger.error(f"Call {call_id} did not complete: {final_status}")
+            return {"status": 500, "call_id": call_id, "error": f"Call {final_status}"}
 
         details = self.get_call_details(call_id)
         if not details:
@@ -268,82 +326,6 @@ class RetellDebtCollector:
             payer_desc=payer_desc
         )
 
-    def lookup_patient(self, resident_id: Optional[str] = None, resident_name: Optional[str] = None, 
-                      date_of_birth: Optional[str] = None, contact_name: Optional[str] = None) -> Dict[str, Any]:
-        payload = {
-            "resident_id": resident_id,
-            "resident_name": resident_name,
-            "date_of_birth": date_of_birth,
-            "contact_name": contact_name
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/lookup_patient", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"Patient lookup failed: {e}")
-            return {"status": 500, "error": str(e)}
-
-    def process_payment(self, resident_id: str, payment_method: str, amount: float) -> Dict[str, Any]:
-        payload = {
-            "resident_id": resident_id,
-            "payment_method": payment_method,
-            "amount": amount
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/process_payment", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"Payment processing failed: {e}")
-            return {"status": 500, "error": str(e)}
-
-    def schedule_reminder_call(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
-        payload = {
-            "contact_name": contact_name,
-            "resident_id": resident_id,
-            "schedule_time": schedule_time
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/reminder_call", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"Reminder call scheduling failed: {e}")
-            return {"status": 500, "error": str(e)}
-
-    def reschedule_call(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
-        payload = {
-            "contact_name": contact_name,
-            "resident_id": resident_id,
-            "schedule_time": schedule_time
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/reschedule_call", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"Call rescheduling failed: {e}")
-            return {"status": 500, "error": str(e)}
-
-    def send_sms(self, contact_number: str, contact_name: str, resident_name: str, 
-                 balance: float, due_date: str, facility_name: str) -> Dict[str, Any]:
-        payload = {
-            "contact_number": contact_number,
-            "contact_name": contact_name,
-            "resident_name": resident_name,
-            "balance": balance,
-            "due_date": due_date,
-            "facility_name": facility_name
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/send_sms", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"SMS sending failed: {e}")
-            return {"status": 500, "error": str(e)}
-
 if __name__ == "__main__":
     collector = RetellDebtCollector()
     
@@ -0,0 +1,55 @@
+"""
+Non-blocking Twilio SMS dispatch.
+
+The Twilio SDK is synchronous, so sends run on a dedicated thread pool (never on the event loop)
+and go through the shared "twilio" token buckets in rate_limiter, which set the throughput.
+Bulk sends are queued as background jobs and drained through send(); see sms_jobs.py.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, NamedTuple, Optional
+
+from loguru import logger
+
+import rate_limiter
+
+SMS_WORKERS = int(os.getenv("SMS_WORKERS", 16))
+
+
+class SmsMessage(NamedTuple):
+    to: str
+    body: str
+    contact_name: Optional[str] = None
+    resident_id: Optional[str] = None
+
+
+class SmsDispatcher:
+    def __init__(self, client, from_number: str, workers: int = SMS_WORKERS):
+        self.client = client
+        self.from_number = from_number
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sms")
+
+    async def send(self, message: SmsMessage) -> Dict[str, Any]:
+        """Send one SMS. Returns {"contact_number", "status": "sent"|"rate_limited"|"failed", "message_id", "error"}."""
+        result = {"contact_number": message.to, "status": "failed", "message_id": None, "error": None}
+        try:
+            await rate_limiter.throttle_async("twilio", self.from_number)
+            sent = await asyncio.get_running_loop().run_in_executor(
+                self._executor,
+                lambda: self.client.messages.create(body=message.body, from_=self.from_number, to=message.to)
+            )
+            result.update(status="sent", message_id=sent.sid)
+            logger.info(f"SMS sent to {message.to}, ID: {sent.sid}")
+        except rate_limiter.RateLimitExceeded as e:
+            result.update(status="rate_limited", error=str(e))
+            logger.error(f"SMS not sent to {message.to}: {e}")
+        except Exception as e:
+            result["error"] = str(e)
+            logger.error(f"SMS to {message.to} failed: {e}")
+        return result
+
+    def close(self):
+        self._executor.shutdown(wait=False)
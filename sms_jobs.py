@@ -0,0 +1,235 @@
+"""
+Durable background jobs for bulk SMS.
+
+/send_sms_bulk only writes the recipients of a job into a SQLite store (one transaction) and answers
+202 with the job id; an SmsJobRunner started in the app lifespan drains queued messages through the
+SmsDispatcher, so the shared Twilio token buckets set the pace however large the job is. Each message
+is claimed on its own, re-checked against the TCPA calling window, sent, and its result (and
+reminder, via the on_sent handler) recorded as soon as it goes out. Messages the rate limiter refuses
+go back to the queue. A claim held by a crashed worker expires after SMS_JOB_VISIBILITY_TIMEOUT and
+the message is sent again, so delivery is at-least-once.
+
+Several uvicorn workers can share the store file (under APP_DATA_DIR, see app_data.py); claiming
+is atomic and any worker can answer a job status lookup.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from loguru import logger
+
+import tcpa
+from app_data import data_path
+from sms_dispatch import SMS_WORKERS, SmsDispatcher, SmsMessage
+
+SMS_JOBS_DB = os.getenv("SMS_JOBS_DB") or data_path("sms_jobs.sqlite3")
+SMS_JOB_POLL_INTERVAL = float(os.getenv("SMS_JOB_POLL_INTERVAL", 1.0))  # seconds an idle sender waits
+SMS_JOB_VISIBILITY_TIMEOUT = float(os.getenv("SMS_JOB_VISIBILITY_TIMEOUT", 900))  # > RATE_LIMIT_MAX_WAIT + send time
+SMS_JOB_RETRY_DELAY = float(os.getenv("SMS_JOB_RETRY_DELAY", 5.0))  # back-off after the rate limiter refuses a send
+
+FINAL_MESSAGE_STATUSES = ("sent", "failed", "blocked")
+
+
+class QueuedSms(NamedTuple):
+    id: int
+    job_id: str
+    message: SmsMessage
+
+
+class SmsJobStore:
+    def __init__(self, path: str = SMS_JOBS_DB, visibility_timeout: float = SMS_JOB_VISIBILITY_TIMEOUT):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: an accepted job must survive power loss, not just a process crash
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    total INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    contact_number TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    contact_name TEXT,
+                    resident_id TEXT,
+                    status TEXT NOT NULL,
+                    message_id TEXT,
+                    error TEXT,
+                    claimed_at REAL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS messages_queued ON messages (status, claimed_at, id);
+                CREATE INDEX IF NOT EXISTS messages_job ON messages (job_id, position);
+            """)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def create(self, messages: List[SmsMessage], blocked: Dict[int, str]) -> str:
+        """Queue `messages` as one job; positions in `blocked` are recorded as blocked with that error. Returns the job id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT INTO jobs (id, total, created_at) VALUES (?, ?, ?)", (job_id, len(messages), now))
+            conn.executemany("""
+                INSERT INTO messages (job_id, position, contact_number, body, contact_name, resident_id, status, error, finished_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(job_id, position, message.to, message.body, message.contact_name, message.resident_id,
+                   "blocked" if position in blocked else "queued", blocked.get(position),
+                   now if position in blocked else None)
+                  for position, message in enumerate(messages)])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id
+
+    def claim(self) -> Optional[QueuedSms]:
+        conn = self._connection()
+        now = time.time()
+        expired = now - self.visibility_timeout
+        # Idle senders poll; only take the write lock when a plain read finds work
+        if conn.execute("SELECT 1 FROM messages WHERE status = 'queued' AND (claimed_at IS NULL OR claimed_at < ?) LIMIT 1",
+                        (expired,)).fetchone() is None:
+            return None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("""
+                SELECT id, job_id, contact_number, body, contact_name, resident_id FROM messages
+                WHERE status = 'queued' AND (claimed_at IS NULL OR claimed_at < ?)
+                ORDER BY id LIMIT 1
+            """, (expired,)).fetchone()
+            if row:
+                conn.execute("UPDATE messages SET claimed_at = ? WHERE id = ?", (now, row[0]))
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        id, job_id, to, body, contact_name, resident_id = row
+        return QueuedSms(id, job_id, SmsMessage(to, body, contact_name, resident_id))
+
+    def finish(self, sms: QueuedSms, status: str, message_id: Optional[str] = None, error: Optional[str] = None):
+        self._connection().execute(
+            "UPDATE messages SET status = ?, message_id = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, message_id, error, time.time(), sms.id)
+        )
+
+    def release(self, sms: QueuedSms):
+        """Put a claimed message back in the queue."""
+        self._connection().execute("UPDATE messages SET claimed_at = NULL WHERE id = ?", (sms.id,))
+
+    def job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        job = conn.execute("SELECT total, created_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        rows = conn.execute("""
+            SELECT contact_number, status, message_id, error FROM messages WHERE job_id = ? ORDER BY position
+        """, (job_id,)).fetchall()
+        counts = Counter(status for _, status, _, _ in rows)
+        return {
+            "job_id": job_id,
+            "total": job[0],
+            "created_at": job[1],
+            "done": all(status in FINAL_MESSAGE_STATUSES for _, status, _, _ in rows),
+            "counts": dict(counts),
+            "results": [
+                {"contact_number": contact_number, "status": status, "message_id": message_id, "error": error}
+                for contact_number, status, message_id, error in rows
+            ]
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        queued, in_flight = conn.execute(
+            "SELECT COUNT(*), COUNT(claimed_at) FROM messages WHERE status = 'queued'"
+        ).fetchone()
+        jobs = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return {"jobs": jobs, "queued": queued, "in_flight": in_flight}
+
+
+class SmsJobRunner:
+    def __init__(self, store: SmsJobStore, dispatcher: SmsDispatcher,
+                 on_sent: Callable[[SmsMessage, str], Awaitable[None]],
+                 senders: int = SMS_WORKERS, poll_interval: float = SMS_JOB_POLL_INTERVAL):
+        self.store = store
+        self.dispatcher = dispatcher
+        self.on_sent = on_sent
+        self.senders = senders
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._drain(n)) for n in range(self.senders)]
+        logger.info(f"Started {self.senders} bulk SMS senders")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _drain(self, n: int):
+        while True:
+            try:
+                sms = await asyncio.to_thread(self.store.claim)
+            except Exception as e:
+                logger.error(f"SMS sender {n} failed to claim a message: {e}")
+                await asyncio.sleep(1)
+                continue
+            if sms is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self._send(sms)
+            except asyncio.CancelledError:
+                # The claim expires, so the message is picked up again after the visibility timeout
+                raise
+            except Exception as e:
+                logger.error(f"SMS sender {n} failed on message {sms.id} of job {sms.job_id}: {e}")
+
+    async def _send(self, sms: QueuedSms):
+        # The job may drain long after it was accepted, so the calling window is checked again at send time
+        if not tcpa.is_allowed(sms.message.to):
+            await asyncio.to_thread(self.store.finish, sms, "blocked", error="Not TCPA compliant")
+            return
+        result = await self.dispatcher.send(sms.message)
+        if result["status"] == "rate_limited":
+            await asyncio.to_thread(self.store.release, sms)
+            await asyncio.sleep(SMS_JOB_RETRY_DELAY)
+            return
+        await asyncio.to_thread(self.store.finish, sms, result["status"], result["message_id"], result["error"])
+        if result["status"] == "sent":
+            try:
+                await self.on_sent(sms.message, result["message_id"])
+            except Exception as e:
+                # The message is already out; report the bookkeeping failure rather than sending it again
+                logger.error(f"SMS {result['message_id']} sent but its reminder was not recorded: {e}")
+
+    async def stats(self) -> Dict[str, Any]:
+        return {**await asyncio.to_thread(self.store.stats), "senders": len(self._tasks)}
+
+
+store = SmsJobStore()
@@ -0,0 +1,229 @@
+"""
+TCPA calling-window checks: calls and texts only between TCPA_WINDOW_START and TCPA_WINDOW_END
+(8am-9pm) local time at the called party's location.
+
+The recipient's timezone comes from in-memory tables keyed by NANP area code and by 3-digit ZIP
+prefix (when a ZIP is known). Area codes and ZIP prefixes that span several zones map to all of
+them, a number whose area code and ZIP disagree gets both, and a contact is only callable while
+the window is open in every candidate zone. Numbers we cannot place (unknown or non-US area codes)
+fall back to TCPA_UNKNOWN_TIMEZONES, the four contiguous US zones, i.e. the narrowest window.
+
+allowed_mask() and next_allowed_times() score a whole campaign list at once: recipients are grouped
+by their zone set and the window math runs once per group, not once per number.
+"""
+
+import datetime
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pytz
+
+TCPA_WINDOW_START = int(os.getenv("TCPA_WINDOW_START", 8))  # local hour, inclusive
+TCPA_WINDOW_END = int(os.getenv("TCPA_WINDOW_END", 21))  # local hour, exclusive
+TCPA_UNKNOWN_TIMEZONES = tuple(os.getenv(
+    "TCPA_UNKNOWN_TIMEZONES", "America/New_York,America/Chicago,America/Denver,America/Los_Angeles"
+).split(","))
+BUSINESS_TIMEZONE = pytz.timezone(os.getenv("BUSINESS_TIMEZONE", "US/Mountain"))  # for naive datetimes
+
+EASTERN = ("America/New_York",)
+CENTRAL = ("America/Chicago",)
+MOUNTAIN = ("America/Denver",)
+ARIZONA = ("America/Phoenix",)
+PACIFIC = ("America/Los_Angeles",)
+CENTRAL_EASTERN = CENTRAL + EASTERN
+CENTRAL_MOUNTAIN = CENTRAL + MOUNTAIN
+MOUNTAIN_PACIFIC = MOUNTAIN + PACIFIC
+ARIZONA_MOUNTAIN = ARIZONA + MOUNTAIN  # Navajo Nation observes DST
+
+_AREA_CODES: Dict[Tuple[str, ...], str] = {
+    EASTERN: """
+        203 475 860 959 302 202 771 239 305 321 324 352 386 407 448 561 645 656 689 727 728 754 772 786
+        813 863 904 941 954 229 404 470 478 678 706 762 770 912 943 260 317 463 574 765 502 606 859 207
+        227 240 301 410 443 667 339 351 413 508 617 774 781 857 978 231 248 269 313 517 586 616 679 734
+        810 947 989 603 201 551 609 640 732 848 856 862 908 973 212 315 329 332 347 363 516 518 585 607
+        624 631 646 680 716 718 838 845 914 917 929 934 252 336 472 704 743 828 910 919 980 984 216 220
+        234 283 326 330 380 419 436 440 513 567 614 740 937 215 223 267 272 412 445 484 570 582 610 717
+        724 814 835 878 401 803 821 839 843 854 864 423 865 802 276 434 540 571 686 703 757 804 826 948
+        304 681
+    """,
+    CENTRAL: """
+        205 251 256 334 659 938 327 479 501 870 217 224 309 312 331 447 464 618 630 708 730 773 779 815
+        847 861 872 219 319 515 563 641 712 316 913 225 318 337 504 985 218 320 507 612 651 763 924 952
+        228 601 662 769 235 314 417 557 573 636 660 816 975 402 531 405 539 572 580 918 615 629 731 901
+        931 210 214 254 281 325 346 361 409 430 432 469 512 682 713 726 737 806 817 830 832 903 936 940
+        945 956 972 979 262 274 353 414 534 608 715 920
+    """,
+    CENTRAL_EASTERN: "270 364 812 930 850 906",
+    CENTRAL_MOUNTAIN: "308 605 620 785 701",
+    MOUNTAIN: "303 719 720 970 983 406 505 575 385 435 801 307 915",
+    ("America/Boise", "America/Los_Angeles"): "208 986",
+    ARIZONA: "480 520 602 623",
+    ARIZONA_MOUNTAIN: "928",
+    PACIFIC: """
+        209 213 279 310 323 341 350 357 369 408 415 424 442 510 530 559 562 619 626 628 650 657 661 669
+        707 714 738 747 760 805 818 820 831 840 858 909 916 925 949 951 206 253 360 425 509 564 702 725
+        775 503 971
+    """,
+    MOUNTAIN_PACIFIC: "458 541",
+    ("America/Anchorage",): "907",
+    ("Pacific/Honolulu",): "808",
+    ("America/Puerto_Rico",): "787 939",
+    ("America/St_Thomas",): "340",
+    ("Pacific/Guam",): "671",
+    ("Pacific/Saipan",): "670",
+    ("Pacific/Pago_Pago",): "684",
+}
+
+AREA_CODE_TIMEZONES: Dict[int, Tuple[str, ...]] = {
+    int(code): zones for zones, codes in _AREA_CODES.items() for code in codes.split()
+}
+
+# (first, last) 3-digit ZIP prefix ranges; later entries override earlier ones
+_ZIP3_RANGES: List[Tuple[int, int, Tuple[str, ...]]] = [
+    (5, 5, EASTERN), (6, 7, ("America/Puerto_Rico",)), (8, 8, ("America/St_Thomas",)), (9, 9, ("America/Puerto_Rico",)),
+    (10, 89, EASTERN),                         # New England, NJ
+    (100, 339, EASTERN), (341, 349, EASTERN),  # NY to FL
+    (324, 325, CENTRAL),                       # Florida panhandle
+    (350, 372, CENTRAL), (373, 374, EASTERN), (375, 375, CENTRAL), (376, 379, EASTERN), (380, 397, CENTRAL),
+    (398, 399, EASTERN),                       # GA
+    (400, 427, EASTERN), (420, 424, CENTRAL),  # KY
+    (430, 462, EASTERN), (463, 464, CENTRAL), (465, 475, EASTERN), (476, 477, CENTRAL), (478, 479, EASTERN),
+    (480, 497, EASTERN), (498, 499, CENTRAL_EASTERN),  # MI, Upper Peninsula
+    (500, 568, CENTRAL),                       # IA, WI, MN
+    (570, 575, CENTRAL), (576, 576, CENTRAL_MOUNTAIN), (577, 577, MOUNTAIN),  # SD
+    (580, 588, CENTRAL), (586, 586, MOUNTAIN),  # ND
+    (590, 599, MOUNTAIN),                      # MT
+    (600, 676, CENTRAL), (677, 679, CENTRAL_MOUNTAIN),  # IL, MO, KS
+    (680, 691, CENTRAL), (692, 692, CENTRAL_MOUNTAIN), (693, 693, MOUNTAIN),  # NE
+    (700, 797, CENTRAL), (798, 799, MOUNTAIN),  # LA, AR, OK, TX; El Paso
+    (800, 831, MOUNTAIN),                      # CO, WY
+    (832, 837, ("America/Boise",)), (838, 838, PACIFIC),  # ID
+    (840, 847, MOUNTAIN), (850, 864, ARIZONA), (865, 865, ARIZONA_MOUNTAIN),
+    (870, 884, MOUNTAIN), (885, 885, MOUNTAIN),  # NM; El Paso
+    (889, 898, PACIFIC), (900, 961, PACIFIC),  # NV, CA
+    (967, 968, ("Pacific/Honolulu",)), (969, 969, ("Pacific/Guam",)),
+    (970, 978, PACIFIC), (979, 979, MOUNTAIN_PACIFIC), (980, 994, PACIFIC),  # OR, WA
+    (995, 999, ("America/Anchorage",)),
+]
+
+ZIP3_TIMEZONES: Dict[int, Tuple[str, ...]] = {
+    prefix: zones for first, last, zones in _ZIP3_RANGES for prefix in range(first, last + 1)
+}
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def area_code(phone: Optional[str]) -> Optional[int]:
+    digits = _NON_DIGITS.sub("", str(phone or ""))
+    if len(digits) == 11 and digits[0] == "1":
+        digits = digits[1:]
+    return int(digits[:3]) if len(digits) == 10 else None
+
+
+def _zip3(zip_code: Optional[str]) -> Optional[int]:
+    digits = _NON_DIGITS.sub("", str(zip_code or ""))
+    return int(digits[:3]) if len(digits) in (5, 9) else None
+
+
+def timezones_for(phone: Optional[str], zip_code: Optional[str] = None) -> Tuple[str, ...]:
+    """Every timezone the recipient may be in (see module docstring)."""
+    return _timezones(area_code(phone), _zip3(zip_code))
+
+
+@lru_cache(maxsize=None)
+def _timezones(code: Optional[int], zip3: Optional[int]) -> Tuple[str, ...]:
+    zones = set(AREA_CODE_TIMEZONES.get(code, ())) | set(ZIP3_TIMEZONES.get(zip3, ()))
+    return tuple(sorted(zones)) or TCPA_UNKNOWN_TIMEZONES
+
+
+@lru_cache(maxsize=None)
+def _tz(zone: str):
+    return pytz.timezone(zone)
+
+
+def _as_utc(value: Optional[datetime.datetime]) -> datetime.datetime:
+    if value is None:
+        return datetime.datetime.now(pytz.utc)
+    if value.tzinfo is None:
+        value = BUSINESS_TIMEZONE.localize(value)
+    return value.astimezone(pytz.utc)
+
+
+def _window_open_at(tz, day: datetime.date) -> datetime.datetime:
+    return tz.localize(datetime.datetime.combine(day, datetime.time(TCPA_WINDOW_START))).astimezone(pytz.utc)
+
+
+def _next_open_in_zone(zone: str, at: datetime.datetime) -> datetime.datetime:
+    tz = _tz(zone)
+    local = at.astimezone(tz)
+    if TCPA_WINDOW_START <= local.hour < TCPA_WINDOW_END:
+        return at
+    day = local.date() if local.hour < TCPA_WINDOW_START else local.date() + datetime.timedelta(days=1)
+    return _window_open_at(tz, day)
+
+
+def _next_allowed(zones: Tuple[str, ...], at: datetime.datetime) -> datetime.datetime:
+    candidate = at
+    for _ in range(8):
+        later = max(_next_open_in_zone(zone, candidate) for zone in zones)
+        if later == candidate:
+            return candidate
+        candidate = later
+    raise ValueError(f"No common calling window for timezones {zones}")
+
+
+def next_allowed_time(phone: Optional[str], after: Optional[datetime.datetime] = None,
+                      zip_code: Optional[str] = None) -> datetime.datetime:
+    """Earliest moment at or after `after` (default now) when the recipient may be called, as aware UTC."""
+    return _next_allowed(timezones_for(phone, zip_code), _as_utc(after))
+
+
+def is_allowed(phone: Optional[str], at: Optional[datetime.datetime] = None,
+               zip_code: Optional[str] = None) -> bool:
+    at = _as_utc(at)
+    return _next_allowed(timezones_for(phone, zip_code), at) == at
+
+
+def calling_window(phone: Optional[str], at: Optional[datetime.datetime] = None,
+                   zip_code: Optional[str] = None) -> Tuple[datetime.datetime, datetime.datetime]:
+    """The current (or next) allowed window [open, close) for the recipient, as aware UTC datetimes."""
+    zones = timezones_for(phone, zip_code)
+    opens = _next_allowed(zones, _as_utc(at))
+    closes = []
+    for zone in zones:
+        tz = _tz(zone)
+        local_day = opens.astimezone(tz).date()
+        closes.append(tz.localize(datetime.datetime.combine(local_day, datetime.time(TCPA_WINDOW_END))).astimezone(pytz.utc))
+    return opens, min(closes)
+
+
+def _zone_groups(phones: Sequence[Optional[str]],
+                 zip_codes: Optional[Sequence[Optional[str]]]) -> Tuple[List[Tuple[str, ...]], np.ndarray]:
+    """Unique zone sets and, for each recipient, the index of its zone set."""
+    if zip_codes is None:
+        zip_codes = [None] * len(phones)
+    groups: Dict[Tuple[str, ...], int] = {}
+    inverse = np.fromiter(
+        (groups.setdefault(timezones_for(phone, zip_code), len(groups)) for phone, zip_code in zip(phones, zip_codes)),
+        dtype=np.intp, count=len(phones)
+    )
+    return list(groups), inverse
+
+
+def next_allowed_times(phones: Sequence[Optional[str]], after: Optional[datetime.datetime] = None,
+                       zip_codes: Optional[Sequence[Optional[str]]] = None) -> np.ndarray:
+    """next_allowed_time() for a whole list at once, as a float64 array of Unix timestamps."""
+    after = _as_utc(after)
+    groups, inverse = _zone_groups(phones, zip_codes)
+    group_times = np.array([_next_allowed(zones, after).timestamp() for zones in groups], dtype=np.float64)
+    return group_times[inverse] if len(groups) else np.empty(0, dtype=np.float64)
+
+
+def allowed_mask(phones: Sequence[Optional[str]], at: Optional[datetime.datetime] = None,
+                 zip_codes: Optional[Sequence[Optional[str]]] = None) -> np.ndarray:
+    """Boolean array: which recipients may be called at `at` (default now)."""
+    at = _as_utc(at)
+    return next_allowed_times(phones, at, zip_codes) <= at.timestamp()
@@ -6,18 +6,20 @@ To have the updated version use updated code.
 """
 
 import os
-import requests
-import datetime
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 from loguru import logger
-import psycopg2
-import pytz
 from dateutil.parser import parse
+from call_completion import poll_until_final
+import rate_limiter
+import tcpa
+from call_log_writer import call_log_writer
+import http_client
+from api_tools import ApiToolsMixin
 
 load_dotenv()
 
-class VapiDebtCollector:
+class VapiDebtCollector(ApiToolsMixin):
     def __init__(self):
         self.api_key = os.getenv("VAPI_API_KEY")
         self.workflow_id = os.getenv("DEBT_COLLECTION_WORKFLOW_ID")
@@ -39,9 +41,23 @@ class VapiDebtCollector:
         }
 
     def is_tcp_compliant(self, phone: str) -> bool:
-        now = datetime.datetime.now(pytz.timezone("US/Mountain"))
-        hour = now.hour
-        return 8 <= hour < 21
+        return tcpa.is_allowed(phone)
+
+    def _call_payload(self, contact_name: str, contact_number: str, resident_id: str) -> Dict[str, Any]:
+        return {
+            "workflowId": self.workflow_id,
+            "phoneNumberId": self.phone_number_id,
+            "customer": {
+                "number": contact_number,
+                "name": contact_name,
+                "externalId":resident_id
+            },
+            "name": f"Debt Call {resident_id}",
+            # "metadata": {
+            #     "resident_id": resident_id,
+            #     "facility_name": facility_name
+            # }
+        }
 
     def make_outbound_call(self, contact_name: str, contact_number: str, resident_id: str, 
                        facility_name: str) -> Dict[str, Any]:
@@ -61,118 +77,68 @@ class VapiDebtCollector:
         #     logger.error("Call blocked: Not TCPA compliant")
         #     return {"status": 403, "error": "Not TCPA compliant"}
 
-        payload = {
-            "workflowId": self.workflow_id,
-            "phoneNumberId": self.phone_number_id,
-            "customer": {
-                "number": contact_number,
-                "name": contact_name,
-                "externalId":resident_id
-            },
-            "name": f"Debt Call {resident_id}",
-            # "metadata": {
-            #     "resident_id": resident_id,
-            #     "facility_name": facility_name
-            # }
-        }
+        payload = self._call_payload(contact_name, contact_number, resident_id)
 
         try:
-            resp = requests.post(f"{self.base_url}/call", json=payload, headers=self.headers)
+            rate_limiter.throttle("vapi", self.phone_number_id)
+            resp = http_client.request("POST", f"{self.base_url}/call", json=payload, headers=self.headers)
             if resp.status_code not in (200, 201):
                 logger.error(f"Call failed: {resp.status_code} {resp.text}")
                 return {"status": resp.status_code, "error": resp.text}
             call_id = resp.json().get("id")
             logger.success(f"Call initiated: {call_id}")
             return {"status": 200, "call_id": call_id}
+        except rate_limiter.RateLimitExceeded as e:
+            logger.error(f"Call not placed: {e}")
+            return {"status": 429, "error": str(e)}
         except Exception as e:
             logger.error(f"Call initiation failed: {e}")
             return {"status": 500, "error": str(e)}
 
-    def lookup_patient(self, resident_id: Optional[str] = None, resident_name: Optional[str] = None, 
-                      date_of_birth: Optional[str] = None, contact_name: Optional[str] = None) -> Dict[str, Any]:
-        payload = {
-            "resident_id": resident_id,
-            "resident_name": resident_name,
-            "date_of_birth": date_of_birth,
-            "contact_name": contact_name
-        }
+    async def make_outbound_call_async(self, contact_name: str, contact_number: str, resident_id: str,
+                                       facility_name: str) -> Dict[str, Any]:
+        payload = self._call_payload(contact_name, contact_number, resident_id)
         try:
-            resp = requests.post(f"{self.api_url}/lookup_patient", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"Patient lookup failed: {e}")
-            return {"status": 500, "error": str(e)}
-
-    def process_payment(self, resident_id: str, payment_method: str, amount: float) -> Dict[str, Any]:
-        payload = {
-            "resident_id": resident_id,
-            "payment_method": payment_method,
-            "amount": amount
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/process_payment", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"Payment processing failed: {e}")
-            return {"status": 500, "error": str(e)}
-
-    def schedule_reminder_call(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
-        payload = {
-            "contact_name": contact_name,
-            "resident_id": resident_id,
-            "schedule_time": schedule_time
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/reminder_call", json=payload)
-            resp.raise_for_status()
-            return resp.json()
-        except Exception as e:
-            logger.error(f"Reminder call scheduling failed: {e}")
-            return {"status": 500, "error": str(e)}
-
-    def reschedule_call(self, contact_name: str, resident_id: str, schedule_time: str) -> Dict[str, Any]:
-        payload = {
-            "contact_name": contact_name,
-            "resident_id": resident_id,
-            "schedule_time": schedule_time
-        }
-        try:
-            resp = requests.post(f"{self.api_url}/reschedule_call", json=payload)
-            resp.raise_for_status()
-            return resp.json()
+            await rate_limiter.throttle_async("vapi", self.phone_number_id)
+            resp = await http_client.arequest("POST", f"{self.base_url}/call", json=payload, headers=self.headers)
+            if resp.status_code not in (200, 201):
+                logger.error(f"Call failed: {resp.status_code} {resp.text}")
+                return {"status": resp.status_code, "error": resp.text}
+            call_id = resp.json().get("id")
+            logger.success(f"Call initiated: {call_id}")
+            return {"status": 200, "call_id": call_id}
+        except rate_limiter.RateLimitExceeded as e:
+            logger.error(f"Call not placed: {e}")
+            return {"status": 429, "error": str(e)}
         except Exception as e:
-            logger.error(f"Call rescheduling failed: {e}")
+            logger.error(f"Call initiation failed: {e}")
             return {"status": 500, "error": str(e)}
 
-    def send_sms(self, contact_number: str, contact_name: str, resident_name: str, 
-                 balance: float, due_date: str, facility_name: str) -> Dict[str, Any]:
-        payload = {
-            "contact_number": contact_number,
-            "contact_name": contact_name,
-            "resident_name": resident_name,
-            "balance": balance,
-            "due_date": due_date,
-            "facility_name": facility_name
-        }
+    def get_call_details(self, call_id: str) -> Optional[Dict[str, Any]]:
         try:
-            resp = requests.post(f"{self.api_url}/send_sms", json=payload)
-            resp.raise_for_status()
-            return resp.json()
+            response = http_client.request("GET", f"{self.base_url}/call/{call_id}", headers=self.headers)
+            response.raise_for_status()
+            return response.json()
         except Exception as e:
-            logger.error(f"SMS sending failed: {e}")
-            return {"status": 500, "error": str(e)}
+            logger.error(f"Failed to fetch call details: {e}")
+            return None
 
-    def get_call_details(self, call_id: str) -> Optional[Dict[str, Any]]:
+    async def get_call_details_async(self, call_id: str) -> Optional[Dict[str, Any]]:
         try:
-            response = requests.get(f"{self.base_url}/call/{call_id}", headers=self.headers)
+            response = await http_client.arequest("GET", f"{self.base_url}/call/{call_id}", headers=self.headers)
             response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Failed to fetch call details: {e}")
             return None
 
+    def get_call_status(self, call_id: str) -> Optional[str]:
+        """"completed" once the call has ended, None while it is still running."""
+        details = self.get_call_details(call_id)
+        if details and details.get("status") == "ended":
+            return "completed"
+        return None
+
     def get_transcript(self, call_data: Dict[str, Any]) -> Optional[str]:
         return call_data.get("artifact", {}).get("transcript")
 
@@ -184,24 +150,13 @@ class VapiDebtCollector:
         return rec.get("stereoUrl") or rec.get("mono", {}).get("combinedUrl")
 
     def log_call_to_db(self, call_id: str, phone: str, cost: Optional[float], transcript: Optional[str]):
-        try:
-            conn = psycopg2.connect(**self.db_config)
-            cur = conn.cursor()
-            cur.execute("""
-                INSERT INTO call_logs (call_id, phone, type, cost, transcript, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (call_id, phone, "outbound", cost, transcript, datetime.datetime.now()))
-            conn.commit()
-            cur.close()
-            conn.close()
-            logger.success(f"Logged call to DB: {call_id}")
-        except Exception as e:
-            logger.error(f"DB logging failed: {e}")
+        # Buffered and written in batches by a background thread; never blocks the call flow
+        call_log_writer.write(call_id, phone, cost, transcript)
 
     def run_full_call_flow(self, contact_fname: str, contact_lname: str, contact_name_pronunciation: str, 
                        contact_number: str, resident_fname: str, resident_lname: str, 
                        resident_id: str, resident_dob: str, balance: float, due_date: str, 
-                       facility_name: str, payer_desc: str):
+                       facility_name: str, payer_desc: str, wait_for_completion: bool = False):
         """
         Initiate a debt collection call with contact and resident details.
         Normalizes DOB and passes minimal data to Vapi API.
@@ -219,6 +174,9 @@ class VapiDebtCollector:
             due_date: Payment due date
             facility_name: Facility name
             payer_desc: Payer description
+            wait_for_completion: Block until the call ends (polling with backoff) and log it here.
+                By default this returns the call_id immediately and /webhook/vapi logs the
+                end-of-call-report.
         """
         # Normalize DOB to YYYY-MM-DD
         try:
@@ -240,9 +198,15 @@ class VapiDebtCollector:
             return
 
         call_id = result["call_id"]
-        logger.info("Waiting for webhook or polling call status...")
-        import time
-        time.sleep(10)  # Temporary polling for PoC
+        if not wait_for_completion:
+            logger.info(f"Call {call_id} placed; completion will be recorded from the end-of-call-report webhook")
+            return call_id
+
+        logger.info("Polling call status...")
+        final_status = poll_until_final(lambda: self.get_call_status(call_id))
+        if final_status != "completed":
+            logger.error(f"Call {call_id} did not complete: {final_status}")
+            return call_id
 
         details = self.get_call_details(call_id)
         if not details:
@@ -258,6 +222,7 @@ class VapiDebtCollector:
         logger.info(f"[Recording URL]: {recording_url}")
 
         self.log_call_to_db(call_id, contact_number, details.get("cost", 0.0), transcript)
+        return call_id
 
 
 if __name__ == "__main__":
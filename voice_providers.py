@@ -0,0 +1,209 @@
+"""
+Provider-agnostic interface for outbound voice calls.
+
+VoiceProvider wraps one backend (RetellProvider, VapiProvider) behind the same async API:
+create_call / create_calls_batch, fetch_call_details / fetch_call_details_batch, get_call_status,
+and stream_completions, which yields calls as they finish (webhook first, backoff polling as fallback).
+ProviderRouter spreads a campaign across several providers, handing each new call to whichever one
+has the most free capacity.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from loguru import logger
+
+import call_completion
+
+
+class CallRequest(NamedTuple):
+    contact_name: str
+    contact_number: str
+    resident_id: str
+    facility_name: str = ""
+    resident_fname: str = ""
+    resident_lname: str = ""
+    balance: float = 0.0
+    due_date: str = ""
+    payer_desc: str = ""
+
+
+class CallDetails(NamedTuple):
+    call_id: str
+    provider: str
+    transcript: Optional[str]
+    analysis: Optional[Any]
+    recording_url: Optional[str]
+    cost: float
+
+
+class VoiceProvider(ABC):
+    name: str
+
+    def __init__(self, max_concurrent_calls: int = 20, batch_concurrency: int = 10):
+        self.max_concurrent_calls = max_concurrent_calls
+        self.batch_concurrency = batch_concurrency
+
+    @abstractmethod
+    async def create_call(self, call: CallRequest) -> Dict[str, Any]:
+        """Place one call. Returns {"status": 200, "call_id": ...} or {"status": <code>, "error": ...}."""
+
+    @abstractmethod
+    async def fetch_call_details(self, call_id: str) -> Optional[CallDetails]:
+        ...
+
+    @abstractmethod
+    async def get_call_status(self, call_id: str) -> Optional[str]:
+        """"completed"/"failed" once the call has ended, None while it is still running."""
+
+    async def _bounded(self, coros: Iterable) -> List[Any]:
+        gate = asyncio.Semaphore(self.batch_concurrency)
+
+        async def run(coro):
+            async with gate:
+                return await coro
+
+        return await asyncio.gather(*(run(coro) for coro in coros))
+
+    async def create_calls_batch(self, calls: Sequence[CallRequest]) -> List[Dict[str, Any]]:
+        """Place several calls concurrently (at most `batch_concurrency` requests in flight); results keep input order."""
+        return await self._bounded(self.create_call(call) for call in calls)
+
+    async def fetch_call_details_batch(self, call_ids: Sequence[str]) -> Dict[str, Optional[CallDetails]]:
+        details = await self._bounded(self.fetch_call_details(call_id) for call_id in call_ids)
+        return dict(zip(call_ids, details))
+
+    async def stream_completions(self, call_ids: Iterable[str], tracker: call_completion.CompletionTracker,
+                                 timeout: float = 1800) -> AsyncIterator[Tuple[str, str, str]]:
+        """Yield (call_id, status, source) for each call as it finishes, in completion order."""
+        async def wait(call_id):
+            status, source = await tracker.wait(call_id, lambda: self.get_call_status(call_id), timeout=timeout)
+            return call_id, status, source
+
+        for finished in asyncio.as_completed([wait(call_id) for call_id in call_ids]):
+            yield await finished
+
+
+class RetellProvider(VoiceProvider):
+    name = "retell"
+
+    def __init__(self, collector=None, agent_id: Optional[str] = None, workflow_id: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        if collector is None:
+            from retell_interface.debt_collector_call_agent_or_workflow import RetellDebtCollector
+            collector = RetellDebtCollector()
+        self.collector = collector
+        self.agent_id = agent_id or (None if workflow_id else collector.debt_collection_agent_id)
+        self.workflow_id = workflow_id
+
+    async def create_call(self, call: CallRequest) -> Dict[str, Any]:
+        return await self.collector.make_outbound_call_with_agent_async(
+            **call._asdict(), agent_id=self.agent_id, workflow_id=self.workflow_id
+        )
+
+    async def fetch_call_details(self, call_id: str) -> Optional[CallDetails]:
+        details = await self.collector.get_call_details_async(call_id)
+        if not details:
+            return None
+        return CallDetails(
+            call_id=call_id,
+            provider=self.name,
+            transcript=details.get("transcript"),
+            analysis=details.get("call_analysis"),
+            recording_url=details.get("recording_url"),
+            cost=details["call_cost"].combined_cost if details.get("call_cost") else 0.0
+        )
+
+    async def get_call_status(self, call_id: str) -> Optional[str]:
+        return await asyncio.to_thread(self.collector.get_call_status, call_id)
+
+
+class VapiProvider(VoiceProvider):
+    name = "vapi"
+
+    def __init__(self, collector=None, **kwargs):
+        super().__init__(**kwargs)
+        if collector is None:
+            from vapi_interface.vapi_debt_collector_call_phone_number import VapiDebtCollector
+            collector = VapiDebtCollector()
+        self.collector = collector
+
+    async def create_call(self, call: CallRequest) -> Dict[str, Any]:
+        return await self.collector.make_outbound_call_async(
+            call.contact_name, call.contact_number, call.resident_id, call.facility_name
+        )
+
+    async def fetch_call_details(self, call_id: str) -> Optional[CallDetails]:
+        details = await self.collector.get_call_details_async(call_id)
+        if not details:
+            return None
+        return CallDetails(
+            call_id=call_id,
+            provider=self.name,
+            transcript=self.collector.get_transcript(details),
+            analysis=self.collector.get_analysis(details),
+            recording_url=self.collector.get_recording_url(details),
+            cost=details.get("cost") or 0.0
+        )
+
+    async def get_call_status(self, call_id: str) -> Optional[str]:
+        details = await self.collector.get_call_details_async(call_id)
+        if details and details.get("status") == "ended":
+            return "completed"
+        return None
+
+
+PROVIDERS = {"retell": RetellProvider, "vapi": VapiProvider}
+
+
+class ProviderRouter:
+    """Hands out providers by free capacity; callers must release() what they acquire()."""
+
+    def __init__(self, providers: Sequence[VoiceProvider]):
+        if not providers:
+            raise ValueError("At least one voice provider is required")
+        self.providers = list(providers)
+        self.in_flight: Dict[str, int] = {provider.name: 0 for provider in self.providers}
+        self._available: Optional[asyncio.Condition] = None
+
+    @property
+    def capacity(self) -> int:
+        return sum(provider.max_concurrent_calls for provider in self.providers)
+
+    def _free(self, provider: VoiceProvider) -> int:
+        return provider.max_concurrent_calls - self.in_flight[provider.name]
+
+    async def acquire(self) -> VoiceProvider:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        async with self._available:
+            await self._available.wait_for(lambda: any(self._free(p) > 0 for p in self.providers))
+            provider = max(self.providers, key=self._free)
+            self.in_flight[provider.name] += 1
+            return provider
+
+    async def release(self, provider: VoiceProvider):
+        async with self._available:
+            self.in_flight[provider.name] -= 1
+            self._available.notify()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            provider.name: {"in_flight": self.in_flight[provider.name], "capacity": provider.max_concurrent_calls}
+            for provider in self.providers
+        }
+
+
+def build_providers(names: Iterable[str], capacities: Optional[Dict[str, int]] = None,
+                    default_capacity: Optional[int] = None) -> List[VoiceProvider]:
+    """Providers by name; capacity comes from `capacities`, else `default_capacity`, else the provider default."""
+    providers = []
+    for name in names:
+        if name not in PROVIDERS:
+            raise ValueError(f"Unknown voice provider: {name}")
+        capacity = (capacities or {}).get(name, default_capacity)
+        kwargs = {"max_concurrent_calls": capacity} if capacity else {}
+        providers.append(PROVIDERS[name](**kwargs))
+        logger.info(f"Voice provider {name} enabled ({providers[-1].max_concurrent_calls} concurrent calls)")
+    return providers
@@ -0,0 +1,82 @@
+"""
+Idempotency for provider webhook retries.
+
+Every webhook gets an event key built from (call_id, event_type, provider event id), falling back
+to a hash of the payload when the provider sends no event id (a retried delivery has an identical
+body). Two layers reject duplicates:
+
+* `seen_keys`, an in-process LRU of recent keys, drops most retries at the endpoint in O(1)
+  without touching the database or the outbox.
+* A unique index on call_events.event_key catches everything else (other workers, restarts): the
+  consumer inserts with ON CONFLICT DO NOTHING and only processes events whose row was new.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from loguru import logger
+
+import repository
+
+WEBHOOK_DEDUP_CACHE_SIZE = int(os.getenv("WEBHOOK_DEDUP_CACHE_SIZE", 100000))
+
+EVENT_KEY_DDL = [
+    "ALTER TABLE call_events ADD COLUMN IF NOT EXISTS event_key TEXT",
+    "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS call_events_event_key_idx ON call_events (event_key)"
+]
+
+
+async def ensure_event_key_index():
+    """
+    Add call_events.event_key and its unique index if missing (rebuilding it if a previous concurrent
+    build left it INVALID). Raises on failure: without the index every batch insert's
+    ON CONFLICT (event_key) fails and all webhooks would end up dead-lettered.
+    """
+    await repository.apply_ddl(EVENT_KEY_DDL)
+    logger.info("Webhook dedup index is in place")
+
+
+def event_key(call_id: str, event_type: str, event_id: Optional[str] = None,
+              payload: Optional[Dict[str, Any]] = None) -> str:
+    if not event_id:
+        body = json.dumps(payload, sort_keys=True, default=str).encode()
+        event_id = hashlib.blake2b(body, digest_size=12).hexdigest()
+    return f"{call_id}:{event_type}:{event_id}"
+
+
+class SeenKeys:
+    """Bounded LRU set of recently accepted event keys."""
+
+    def __init__(self, max_size: int = WEBHOOK_DEDUP_CACHE_SIZE):
+        self.max_size = max_size
+        self._keys: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def add(self, key: str) -> bool:
+        """Record `key`; returns False if it was already seen (a duplicate delivery)."""
+        with self._lock:
+            if key in self._keys:
+                self._keys.move_to_end(key)
+                self.duplicates += 1
+                return False
+            self._keys[key] = None
+            if len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+            return True
+
+    def discard(self, key: str):
+        """Forget a key whose event was not accepted, so the provider's retry goes through."""
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._keys), "max_size": self.max_size, "duplicates_rejected": self.duplicates}
+
+
+seen_keys = SeenKeys()
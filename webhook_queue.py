@@ -0,0 +1,242 @@
+"""
+Durable local outbox for incoming webhooks.
+
+Webhook endpoints only validate the request and enqueue() it into a SQLite outbox (WAL mode, one
+small insert), then respond. A WebhookConsumerPool started in the app lifespan claims events in
+batches and hands them to a handler (batch insert into call_events, outcome processing). Events
+are deleted only after the handler succeeds. A failed batch is retried one event at a time; events
+that still fail are released for retry and moved to dead_letters after WEBHOOK_MAX_ATTEMPTS.
+Claims expire after WEBHOOK_VISIBILITY_TIMEOUT, so events held by a crashed worker are picked up again.
+
+Several uvicorn workers can share the outbox file; claiming is atomic. The file lives under
+APP_DATA_DIR (see app_data.py) and is written with synchronous=FULL.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from loguru import logger
+
+from app_data import data_path
+
+WEBHOOK_QUEUE_DB = os.getenv("WEBHOOK_QUEUE_DB") or data_path("webhook_outbox.sqlite3")
+WEBHOOK_CONSUMERS = int(os.getenv("WEBHOOK_CONSUMERS", 4))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 100))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 0.2))  # seconds an idle consumer waits
+WEBHOOK_VISIBILITY_TIMEOUT = float(os.getenv("WEBHOOK_VISIBILITY_TIMEOUT", 300))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 5))
+
+
+class QueuedEvent(NamedTuple):
+    id: int
+    source: str
+    call_id: Optional[str]
+    event_type: Optional[str]
+    payload: Dict[str, Any]
+    received_at: float
+    attempts: int
+
+
+class WebhookOutbox:
+    def __init__(self, path: str = WEBHOOK_QUEUE_DB, visibility_timeout: float = WEBHOOK_VISIBILITY_TIMEOUT,
+                 max_attempts: int = WEBHOOK_MAX_ATTEMPTS):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread and per process (connections must not cross a fork)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # FULL: an accepted webhook must survive power loss, not just a process crash
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    call_id TEXT,
+                    event_type TEXT,
+                    payload TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    claimed_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS outbox_claimed_at ON outbox (claimed_at, id);
+                CREATE TABLE IF NOT EXISTS dead_letters (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    call_id TEXT,
+                    event_type TEXT,
+                    payload TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    failed_at REAL NOT NULL
+                );
+            """)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def enqueue(self, source: str, call_id: Optional[str], event_type: Optional[str], payload: Dict[str, Any]) -> int:
+        cur = self._connection().execute(
+            "INSERT INTO outbox (source, call_id, event_type, payload, received_at) VALUES (?, ?, ?, ?, ?)",
+            (source, call_id, event_type, json.dumps(payload, default=str), time.time())
+        )
+        return cur.lastrowid
+
+    def claim(self, limit: int) -> List[QueuedEvent]:
+        conn = self._connection()
+        now = time.time()
+        # Idle consumers poll often; only take the write lock (which blocks enqueue) when a plain read finds work
+        if conn.execute("SELECT 1 FROM outbox WHERE claimed_at IS NULL OR claimed_at < ? LIMIT 1",
+                        (now - self.visibility_timeout,)).fetchone() is None:
+            return []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("""
+                SELECT id, source, call_id, event_type, payload, received_at, attempts FROM outbox
+                WHERE claimed_at IS NULL OR claimed_at < ?
+                ORDER BY id LIMIT ?
+            """, (now - self.visibility_timeout, limit)).fetchall()
+            if rows:
+                conn.executemany("UPDATE outbox SET claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                                 [(now, row[0]) for row in rows])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return [QueuedEvent(id, source, call_id, event_type, json.loads(payload), received_at, attempts + 1)
+                for id, source, call_id, event_type, payload, received_at, attempts in rows]
+
+    def ack(self, events: List[QueuedEvent]):
+        self._connection().executemany("DELETE FROM outbox WHERE id = ?", [(event.id,) for event in events])
+
+    def release(self, events: List[QueuedEvent]) -> int:
+        """Make failed events claimable again; events out of attempts go to dead_letters. Returns how many were dead-lettered."""
+        conn = self._connection()
+        dead = [event for event in events if event.attempts >= self.max_attempts]
+        retry = [event for event in events if event.attempts < self.max_attempts]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("UPDATE outbox SET claimed_at = NULL WHERE id = ?", [(event.id,) for event in retry])
+            if dead:
+                now = time.time()
+                conn.executemany("""
+                    INSERT OR REPLACE INTO dead_letters (id, source, call_id, event_type, payload, received_at, attempts, failed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, [(e.id, e.source, e.call_id, e.event_type, json.dumps(e.payload, default=str), e.received_at,
+                       e.attempts, now) for e in dead])
+                conn.executemany("DELETE FROM outbox WHERE id = ?", [(event.id,) for event in dead])
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return len(dead)
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._connection()
+        depth, in_flight, oldest = conn.execute(
+            "SELECT COUNT(*), COUNT(claimed_at), MIN(received_at) FROM outbox"
+        ).fetchone()
+        dead = conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+        return {
+            "depth": depth,
+            "in_flight": in_flight,
+            "oldest_age_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "dead_letters": dead
+        }
+
+
+class WebhookConsumerPool:
+    def __init__(self, outbox: WebhookOutbox, handler: Callable[[List[QueuedEvent]], Awaitable[None]],
+                 consumers: int = WEBHOOK_CONSUMERS, batch_size: int = WEBHOOK_BATCH_SIZE,
+                 poll_interval: float = WEBHOOK_POLL_INTERVAL):
+        self.outbox = outbox
+        self.handler = handler
+        self.consumers = consumers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._stats = {"processed": 0, "batches": 0, "failed_batches": 0, "dead_lettered": 0,
+                       "lag_total": 0.0, "lag_max": 0.0}
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._consume(n)) for n in range(self.consumers)]
+        logger.info(f"Started {self.consumers} webhook consumers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _consume(self, n: int):
+        while True:
+            try:
+                events = await asyncio.to_thread(self.outbox.claim, self.batch_size)
+            except Exception as e:
+                logger.error(f"Webhook consumer {n} failed to claim events: {e}")
+                await asyncio.sleep(1)
+                continue
+            if not events:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self.handler(events)
+            except asyncio.CancelledError:
+                # Claims expire, so unfinished events are retried after the visibility timeout
+                raise
+            except Exception as e:
+                logger.error(f"Webhook consumer {n} failed on a batch of {len(events)}: {e}")
+                self._stats["failed_batches"] += 1
+                events = await self._process_individually(events)
+                if not events:
+                    continue
+            await asyncio.to_thread(self.outbox.ack, events)
+            self._record(events)
+
+    async def _process_individually(self, events: List[QueuedEvent]) -> List[QueuedEvent]:
+        """Retry a failed batch one event at a time so a single bad event doesn't hold back the rest."""
+        succeeded, failed = [], []
+        for event in events:
+            try:
+                await self.handler([event])
+                succeeded.append(event)
+            except Exception as e:
+                logger.error(f"Webhook event {event.id} ({event.source} {event.event_type}) failed: {e}")
+                failed.append(event)
+        if failed:
+            self._stats["dead_lettered"] += await asyncio.to_thread(self.outbox.release, failed)
+        return succeeded
+
+    def _record(self, events: List[QueuedEvent]):
+        now = time.time()
+        lags = [now - event.received_at for event in events]
+        self._stats["processed"] += len(events)
+        self._stats["batches"] += 1
+        self._stats["lag_total"] += sum(lags)
+        self._stats["lag_max"] = max(self._stats["lag_max"], max(lags))
+
+    async def stats(self) -> Dict[str, Any]:
+        processed = self._stats["processed"]
+        return {
+            **await asyncio.to_thread(self.outbox.stats),
+            "consumers": len(self._tasks),
+            "processed": processed,
+            "batches": self._stats["batches"],
+            "failed_batches": self._stats["failed_batches"],
+            "dead_lettered": self._stats["dead_lettered"],
+            "lag_seconds_avg": round(self._stats["lag_total"] / processed, 3) if processed else 0.0,
+            "lag_seconds_max": round(self._stats["lag_max"], 3)
+        }
+
+
+outbox = WebhookOutbox()